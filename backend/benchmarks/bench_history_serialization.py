@@ -0,0 +1,102 @@
+"""
+Benchmark — serving a 50-version generation history.
+
+Every path starts from the BSON bytes the driver receives:
+
+  models: decode → _serialize → GenerationResult per version → FastAPI
+          response_model validation + serialization → JSONResponse
+  raw:    RawBSONDocument → _generation_view → iter_json_array (orjson),
+          streamed one version at a time as the history route does
+
+Reports mean wall time and tracemalloc peak per request.
+
+Run from backend/:  python -m benchmarks.bench_history_serialization
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models.generation import GenerationResult
+from routers.generation import _generation_view
+from services.db_service import _serialize
+from services.llm_service import _generate_template
+from services.serialization import iter_json_array
+
+VERSIONS = 50
+ROUNDS = 20
+FIELD = create_response_field(name="history", type_=List[GenerationResult])
+
+
+def _history() -> List[bytes]:
+    package = _generate_template("A lighthouse keeper finds a message in a bottle. " * 40)
+    package["screenplay"] = package["screenplay"] * 20  # ~full-length script
+    return [
+        bson.encode({
+            "_id": ObjectId(),
+            "project_id": "p1",
+            "story_input": "A lighthouse keeper finds a message in a bottle.",
+            **package,
+            "provider": "gemini",
+            "created_at": datetime(2025, 1, 1, 12, 0, i),
+        })
+        for i in range(VERSIONS)
+    ]
+
+
+def models(history: List[bytes]) -> bytes:
+    generations = [_serialize(bson.decode(b)) for b in history]
+    results = [
+        GenerationResult(
+            id=g["id"], project_id="p1", story_input=g.get("story_input", ""),
+            screenplay=g.get("screenplay", ""), shot_design=g.get("shot_design", []),
+            sound_design=g.get("sound_design", []), provider=g.get("provider", "unknown"),
+            created_at=g.get("created_at"),
+        )
+        for g in generations
+    ]
+    content = asyncio.run(serialize_response(field=FIELD, response_content=results, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def raw(history: List[bytes]) -> int:
+    # Chunks go to the socket as they are produced; only their size is kept
+    return sum(map(len, iter_json_array(_generation_view(RawBSONDocument(b), "p1") for b in history)))
+
+
+def _time(fn, history) -> float:
+    fn(history)  # warm-up
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(history)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def _peak(fn, history) -> float:
+    tracemalloc.start()
+    fn(history)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+if __name__ == "__main__":
+    history = _history()
+    size = raw(history)
+    print(f"{VERSIONS} versions, {sum(map(len, history)) / 1024:.0f} KiB BSON → {size / 1024:.0f} KiB JSON")
+    t_models, t_raw = _time(models, history), _time(raw, history)
+    m_models, m_raw = _peak(models, history), _peak(raw, history)
+    print(f"models: {t_models:8.2f} ms   peak {m_models:6.1f} MiB")
+    print(f"raw:    {t_raw:8.2f} ms   peak {m_raw:6.1f} MiB   ({t_models / t_raw:.1f}x faster)")
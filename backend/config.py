@@ -14,9 +14,19 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
+    # ── Storage ───────────────────────────────────────────────
+    storage_backend: str = "mongodb"  # mongodb | sqlite (embedded, single node)
+    sqlite_path: str = "cineforge.db"
+
     # ── MongoDB ──────────────────────────────────────────────
     mongodb_uri: str = "mongodb://localhost:27017"
     mongodb_db_name: str = "cineforge"
+    mongodb_timeout_ms: int = 5000  # server selection; bounds how long a request waits on a down Mongo
+    mongodb_slow_command_ms: float = 100.0   # slower commands are logged with their filter shape
+    mongodb_request_query_limit: int = 25    # requests issuing more commands are flagged (N+1)
+    migrations_enabled: bool = True
+    migrations_batch_size: int = 500
+    migrations_batch_interval_ms: int = 200  # pause between batches
 
     # ── HuggingFace (primary LLM) ─────────────────────────────
     hf_api_token: str = ""
@@ -27,16 +37,97 @@ class Settings(BaseSettings):
     gemini_api_key: str = ""
     gemini_model: str = "gemini-1.5-flash"
 
+    # ── LLM client pool ───────────────────────────────────────
+    llm_pool_size: int = 64        # open connections across all providers
+    llm_pool_per_host: int = 32
+    llm_keepalive_s: float = 60.0
+    llm_sdk_workers: int = 8       # threads for the blocking Gemini SDK
+
+    # ── Generation mode ───────────────────────────────────────
+    generation_mode: str = "single"      # single: one call per package | pipeline: outline, then one call per scene
+    pipeline_scene_concurrency: int = 4  # scene calls in flight per generation
+
+    # ── Script editing ────────────────────────────────────────
+    edit_scene_concurrency: int = 4  # scenes of one script edited at once
+
+    # ── LLM request hedging ───────────────────────────────────
+    llm_hedge_enabled: bool = True
+    llm_hedge_percentile: float = 95.0  # of recent primary latencies
+    llm_hedge_min_delay_s: float = 5.0
+    llm_hedge_max_delay_s: float = 60.0  # also used until enough latencies are seen
+    llm_hedge_window: int = 200         # latencies kept per task
+
+    # ── LLM circuit breakers and retries ──────────────────────
+    llm_breaker_window_s: float = 60.0
+    llm_breaker_min_calls: int = 5         # before rates are judged
+    llm_breaker_failure_rate: float = 0.5
+    llm_breaker_slow_call_s: float = 90.0
+    llm_breaker_slow_rate: float = 0.8
+    llm_breaker_open_s: float = 30.0       # doubled after each failed half-open probe
+    llm_breaker_max_open_s: float = 600.0
+    llm_retry_attempts: int = 3            # per call, including the first
+    llm_retry_base_s: float = 0.5
+    llm_retry_max_s: float = 8.0           # longer Retry-After values open the breaker instead
+
+    # ── LLM response cache ────────────────────────────────────
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_s: int = 604800                 # 7 days
+    llm_cache_memory_bytes: int = 64 * 1024 * 1024
+    llm_cache_max_entries: int = 10000            # persistent store
+
+    # ── Generation job queue ──────────────────────────────────
+    job_workers: int = 4              # concurrent generations per process; 0 = submit only
+    job_queue_max: int = 500          # queued jobs before submissions get 503
+    job_lease_s: int = 120            # renewed every third of this while a job runs
+    job_max_attempts: int = 3
+    job_poll_interval_s: float = 1.0  # idle workers and SSE subscribers
+    job_retention_s: int = 86400      # finished jobs are kept this long
+
     # ── Security ──────────────────────────────────────────────
     jwt_secret: str = "dev-secret-change-in-production"
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 1440  # 24 hours
+    admin_emails: str = ""  # comma-separated; these users may call /admin/*
 
     # ── CORS ──────────────────────────────────────────────────
     allowed_origins: str = "http://localhost:5173,http://localhost:3000"
 
     # ── Rate limiting ─────────────────────────────────────────
     rate_limit_per_minute: int = 60
+    rate_limit_llm_tokens_per_minute: int = 32768  # ≈ 4 full generations
+    rate_limit_backend: str = "memory"  # memory | shm | redis
+    rate_limit_shm_path: str = "/dev/shm/cineforge-ratelimit"
+    rate_limit_shm_slots: int = 65536
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    rate_limit_redis_timeout_s: float = 0.5  # connect / reply; slower and the request is let through
+
+    # ── Health probes ─────────────────────────────────────────
+    health_probe_interval_s: float = 15.0
+    health_probe_timeout_s: float = 5.0
+
+    # ── Response compression ──────────────────────────────────
+    compression_min_size: int = 1024         # bytes; smaller bodies are sent as-is
+    compression_offload_size: int = 262144   # bytes; larger bodies compress in a thread
+
+    # ── Access log ────────────────────────────────────────────
+    access_log_sample_rate: float = 1.0  # fraction of successful requests logged
+    access_log_slow_ms: float = 1000.0   # slower requests are always logged
+
+    # ── Tracing ───────────────────────────────────────────────
+    trace_exporter: str = ""  # file | otlp — empty disables tracing
+    trace_file_path: str = "traces.jsonl"
+    trace_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    trace_sample_rate: float = 1.0
+
+    # ── Event-loop monitor ────────────────────────────────────
+    loop_monitor_enabled: bool = True
+    loop_monitor_interval_ms: float = 100.0
+    loop_stall_threshold_ms: float = 250.0  # stalls longer than this log the blocking stack
+
+    # ── Profiling ─────────────────────────────────────────────
+    profile_sample_rate: float = 0.0  # fraction of requests profiled; admins can force one with X-Profile: 1
+    profile_interval_ms: float = 5.0
+    profile_keep: int = 50            # finished profiles kept in memory
 
     # ── App ───────────────────────────────────────────────────
     app_env: str = "development"
@@ -46,6 +137,10 @@ class Settings(BaseSettings):
     def origins_list(self) -> list[str]:
         return [o.strip() for o in self.allowed_origins.split(",")]
 
+    @property
+    def admin_emails_list(self) -> list[str]:
+        return [e.strip().lower() for e in self.admin_emails.split(",") if e.strip()]
+
     @property
     def mongodb_configured(self) -> bool:
         return bool(self.mongodb_uri)
@@ -6,12 +6,25 @@ import logging
 import logging.config
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import get_settings
-from middleware import AuthMiddleware, LoggingMiddleware, RateLimitMiddleware
-from routers import auth_router, projects_router, generation_router, callsheet_router, budget_router, shot_design_router, contacts_router
-from services.db_service import ensure_indexes
+from middleware import (
+    AuthMiddleware, CompressionMiddleware, LoggingMiddleware, ProfilingMiddleware, RateLimitMiddleware,
+    TracingMiddleware,
+)
+from middleware.logging_middleware import start_access_log, stop_access_log
+from middleware.rate_limit import load_route_costs
+from routers import auth_router, projects_router, generation_router, callsheet_router, budget_router, shot_design_router, contacts_router, admin_router
+from services.health import health_report, readiness, start_background_checks, stop_background_checks
+from services.llm_clients import close_llm_clients, start_llm_clients
+from services.job_queue import start_job_workers, stop_job_workers
+from services.loop_monitor import start_loop_monitor, stop_loop_monitor
+from services.metrics import render as render_metrics
+from services.migrations import start_migrations, stop_migrations
+from services.rate_limit_store import get_rate_limit_store
+from services.tracing import start_exporter, stop_exporter
 
 # ── Logging setup ─────────────────────────────────────────────
 logging.basicConfig(
@@ -36,7 +49,10 @@ app = FastAPI(
 )
 
 # ── Middleware (order matters — outermost is first to run) ────
-# 1. CORS  (must be first so preflight OPTIONS returns 200)
+# 1. Request profiler  (innermost, directly above the route handler; admin/sampled only)
+app.add_middleware(ProfilingMiddleware)
+
+# 2. CORS  (registered ahead of auth so preflight OPTIONS returns 200)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.origins_list,
@@ -45,15 +61,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 2. Request logger
+# 3. Response compression  (zstd / br / gzip, streams included)
+app.add_middleware(CompressionMiddleware)
+
+# 4. Request logger  (JSON access log, sampled, written by a background thread)
 app.add_middleware(LoggingMiddleware)
 
-# 3. Rate limiter  (per IP, sliding window)
+# 5. Rate limiter  (per IP, sliding window, per-route cost weights)
 app.add_middleware(RateLimitMiddleware)
 
-# 4. JWT auth guard  (skips /auth/*, /health, /docs, /redoc)
+# 6. JWT auth guard  (skips /auth/*, /health, /docs, /redoc)
 app.add_middleware(AuthMiddleware)
 
+# 7. Tracing  (registered last, so Starlette makes it the outermost layer and
+#    its root span covers every middleware above)
+app.add_middleware(TracingMiddleware)
+
 # ── Routers ───────────────────────────────────────────────────
 app.include_router(auth_router)
 app.include_router(projects_router)
@@ -62,25 +85,50 @@ app.include_router(callsheet_router)
 app.include_router(budget_router)
 app.include_router(shot_design_router)
 app.include_router(contacts_router)
+app.include_router(admin_router)
 
 
 # ── Health check ──────────────────────────────────────────────
 @app.on_event("startup")
-def startup_event():
-    """Create MongoDB indexes on first startup."""
-    try:
-        ensure_indexes()
-        logger.info("MongoDB indexes ensured.")
-    except Exception as exc:
-        logger.warning("Could not ensure MongoDB indexes: %s", exc)
+async def startup_event():
+    """
+    Start log/trace writers and resolve rate-limit route costs. Anything that
+    talks to MongoDB (index reconciliation, migrations, job workers) runs in the background,
+    so the worker boots immediately; /ready reports when it has finished.
+    """
+    start_access_log()
+    start_exporter()
+    start_loop_monitor()
+    await start_llm_clients()
+    load_route_costs(app.routes)
+    start_background_checks()
+    start_migrations()
+    start_job_workers()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared resources held by this worker."""
+    await stop_job_workers()
+    stop_loop_monitor()
+    stop_background_checks()
+    stop_migrations()
+    await get_rate_limit_store().close()
+    await close_llm_clients()
+    stop_access_log()
+    stop_exporter()
 
 
 @app.get("/health", tags=["Health"], summary="Health check")
 async def health():
+    """Served from cached background probe results — cheap at any probe rate."""
+    report = health_report()
     return {
-        "status": "ok",
+        "status": report["status"],
+        "checks": report["checks"],
+        "circuits": report["circuits"],
         "env":    settings.app_env,
-        "database": "MongoDB",
+        "database": "SQLite" if settings.storage_backend == "sqlite" else "MongoDB",
         "llm":    {
             "primary":  f"HuggingFace ({settings.hf_model})" if settings.hf_api_token else "not configured",
             "fallback": f"Gemini ({settings.gemini_model})"  if settings.gemini_api_key else "not configured",
@@ -88,6 +136,18 @@ async def health():
     }
 
 
+@app.get("/ready", tags=["Health"], summary="Readiness check")
+async def ready():
+    state = readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
+# ── Metrics ───────────────────────────────────────────────────
+@app.get("/metrics", tags=["Health"], summary="Prometheus metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # ── Root ──────────────────────────────────────────────────────
 @app.get("/", include_in_schema=False)
 async def root():
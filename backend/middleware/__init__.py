@@ -1,5 +1,9 @@
 from middleware.auth_middleware import AuthMiddleware
+from middleware.compression import CompressionMiddleware
 from middleware.logging_middleware import LoggingMiddleware
+from middleware.profiling import ProfilingMiddleware
 from middleware.rate_limit import RateLimitMiddleware
+from middleware.tracing_middleware import TracingMiddleware
 
-__all__ = ["AuthMiddleware", "LoggingMiddleware", "RateLimitMiddleware"]
+__all__ = ["AuthMiddleware", "CompressionMiddleware", "LoggingMiddleware", "ProfilingMiddleware",
+           "RateLimitMiddleware", "TracingMiddleware"]
@@ -1,20 +1,22 @@
 """
 Auth middleware — validates Bearer JWT on every protected route.
 Attaches user info to request.state.user.
-Skips: /auth/*, /health, /docs, /openapi.json, /redoc
+Skips: /auth/*, /health, /ready, /metrics, /docs, /openapi.json, /redoc
 """
 import logging
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import JSONResponse
 from services.auth_service import get_user
+from services.tracing import traced
 
 logger = logging.getLogger(__name__)
 
-SKIP_PREFIXES = ("/auth", "/health", "/docs", "/openapi.json", "/redoc", "/favicon.ico")
+SKIP_PREFIXES = ("/auth", "/health", "/ready", "/metrics", "/docs", "/openapi.json", "/redoc", "/favicon.ico")
 
 
 class AuthMiddleware(BaseHTTPMiddleware):
+    @traced("middleware.auth")
     async def dispatch(self, request: Request, call_next):
         # Always allow preflight
         if request.method == "OPTIONS":
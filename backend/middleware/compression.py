@@ -0,0 +1,184 @@
+"""
+Compression middleware — zstd / brotli / gzip negotiated via Accept-Encoding.
+
+Pure ASGI (not BaseHTTPMiddleware) so streaming responses are compressed
+chunk by chunk and flushed as they go instead of being buffered.
+
+  - bodies under COMPRESSION_MIN_SIZE are sent as-is
+  - levels are tuned per route template (ROUTE_LEVELS); event streams use fast levels
+  - bodies over COMPRESSION_OFFLOAD_SIZE are compressed in a worker thread
+  - zstd and brotli are used only when their packages are installed
+"""
+import asyncio
+import gzip
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from config import get_settings
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+settings = get_settings()
+
+# Server preference when the client ranks encodings equally
+AVAILABLE = [e for e, mod in (("zstd", zstandard), ("br", brotli), ("gzip", gzip)) if mod is not None]
+
+DEFAULT_LEVELS: Dict[str, int] = {"zstd": 3, "br": 4, "gzip": 6}
+# Large, repetitive generation payloads are worth a little more CPU
+ROUTE_LEVELS: Dict[str, Dict[str, int]] = {
+    "/generate":                      {"zstd": 6, "br": 5, "gzip": 6},
+    "/generate/{project_id}/latest":  {"zstd": 6, "br": 5, "gzip": 6},
+    "/generate/{project_id}/history": {"zstd": 9, "br": 6, "gzip": 9},
+}
+# Event streams favour latency: every chunk is flushed immediately
+STREAM_LEVELS: Dict[str, int] = {"zstd": 1, "br": 1, "gzip": 1}
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "+json")
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick the best available encoding for an Accept-Encoding header, or None."""
+    prefs: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            prefs[token] = q
+    wildcard = prefs.get("*", 0.0)
+    ranked = [(prefs.get(e, wildcard), -i, e) for i, e in enumerate(AVAILABLE)]
+    q, _, encoding = max(ranked)
+    return encoding if q > 0 else None
+
+
+def _compress(encoding: str, level: int, body: bytes) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _stream_compressor(encoding: str, level: int) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """Return (compress-and-flush chunk, finish) for incremental compression."""
+    if encoding == "zstd":
+        z = zstandard.ZstdCompressor(level=level).compressobj()
+        return (lambda chunk: z.compress(chunk) + z.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)), z.flush
+    if encoding == "br":
+        b = brotli.Compressor(quality=level)
+        return (lambda chunk: b.process(chunk) + b.flush()), b.finish
+    g = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 → gzip container
+    return (lambda chunk: g.compress(chunk) + g.flush(zlib.Z_SYNC_FLUSH)), g.flush
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int | None = None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else settings.compression_min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        responder = _CompressingSender(scope, send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder)
+
+
+class _CompressingSender:
+    def __init__(self, scope, send, encoding: str, minimum_size: int):
+        self.scope = scope
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[dict] = None
+        self.mode = ""  # "" until decided, then identity | stream
+        self.compress_chunk: Optional[Callable[[bytes], bytes]] = None
+        self.finish: Optional[Callable[[], bytes]] = None
+
+    async def __call__(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            if (
+                "content-encoding" in headers
+                or message["status"] in (204, 304)
+                or not any(t in headers.get("content-type", "") for t in COMPRESSIBLE_TYPES)
+            ):
+                self.mode = "identity"
+                await self.send(message)
+            else:
+                self.start = message  # held until we see the body
+            return
+
+        if message["type"] != "http.response.body" or self.mode == "identity":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.mode == "stream":
+            data = await self._offload(self.compress_chunk, body)
+            if not more_body:
+                data += self.finish()
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        headers = MutableHeaders(raw=list(self.start["headers"]))
+        headers.add_vary_header("Accept-Encoding")
+        self.start["headers"] = headers.raw
+
+        if not more_body:
+            # Whole body in one message
+            if len(body) < self.minimum_size:
+                self.mode = "identity"
+                await self.send(self.start)
+                await self.send(message)
+                return
+            level = self._levels().get(self.encoding, DEFAULT_LEVELS[self.encoding])
+            compressed = await self._offload(_compress, self.encoding, level, body)
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(compressed))
+            self.mode = "identity"
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": compressed})
+            return
+
+        # Streaming response: compress and flush every chunk
+        self.mode = "stream"
+        is_event_stream = "text/event-stream" in headers.get("content-type", "")
+        levels = STREAM_LEVELS if is_event_stream else self._levels()
+        self.compress_chunk, self.finish = _stream_compressor(
+            self.encoding, levels.get(self.encoding, DEFAULT_LEVELS[self.encoding])
+        )
+        headers["Content-Encoding"] = self.encoding
+        if "content-length" in headers:
+            del headers["content-length"]
+        await self.send(self.start)
+        await self.send({"type": "http.response.body", "body": self.compress_chunk(body), "more_body": True})
+
+    def _levels(self) -> Dict[str, int]:
+        route = self.scope.get("route")
+        return ROUTE_LEVELS.get(getattr(route, "path", ""), DEFAULT_LEVELS)
+
+    @staticmethod
+    async def _offload(fn, *args) -> bytes:
+        body = args[-1]
+        if len(body) >= settings.compression_offload_size:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
@@ -1,27 +1,129 @@
 """
-Logging middleware — logs method, path, status code, and latency for every request.
+Logging middleware — structured JSON access log, written off the event loop,
+plus the per-route latency histogram served by /metrics.
+
+Each request becomes one JSON record (method, path template, status, latency,
+user id, provider, Mongo command count and time) handed to a QueueHandler; a QueueListener thread does the
+formatting and the I/O. Successful requests are sampled at
+ACCESS_LOG_SAMPLE_RATE, while errors (status >= 400) and slow requests
+(>= ACCESS_LOG_SLOW_MS) are always kept, as are requests flagged for issuing
+too many Mongo commands.
 """
+import json
 import logging
+import queue
+import random
+import sys
 import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from config import get_settings
+from services.metrics import http_request_duration
+from services.mongo_monitor import begin_request, finish_request
+from services.tracing import traced
+
+settings = get_settings()
+logger = logging.getLogger("cineforge.access")
+logger.propagate = False
+
+_queue: queue.Queue = queue.Queue(maxsize=10_000)
+_listener: QueueListener | None = None
+_handler: QueueHandler | None = None
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread and never blocks."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DeferredQueueHandler.dropped += 1
 
-logger = logging.getLogger("cineforge.request")
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            **getattr(record, "access", {}),
+        }
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+def start_access_log() -> None:
+    """Attach the queue handler and start the background writer thread."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JSONFormatter())
+    _handler = _DeferredQueueHandler(_queue)
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    _listener = QueueListener(_queue, stream, respect_handler_level=False)
+    _listener.start()
+
+
+def stop_access_log() -> None:
+    """Flush pending records and stop the writer thread."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    logger.removeHandler(_handler)
+    _listener.stop()
+    _listener = _handler = None
 
 
 class LoggingMiddleware(BaseHTTPMiddleware):
+    @traced("middleware.logging")
     async def dispatch(self, request: Request, call_next):
         start = time.perf_counter()
-        response = await call_next(request)
-        latency_ms = (time.perf_counter() - start) * 1000
-
-        logger.info(
-            "%s %s → %d  (%.1f ms)",
-            request.method,
-            request.url.path,
-            response.status_code,
-            latency_ms,
-        )
-        # Attach latency header for debugging
-        response.headers["X-Response-Time"] = f"{latency_ms:.1f}ms"
-        return response
+        queries = begin_request()
+        status = 500  # what the client gets if the app raises
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            # Attach latency header for debugging
+            response.headers["X-Response-Time"] = f"{(time.perf_counter() - start) * 1000:.1f}ms"
+            return response
+        finally:
+            latency_ms = (time.perf_counter() - start) * 1000
+            route_path = getattr(request.scope.get("route"), "path", "unmatched")
+            http_request_duration.observe(latency_ms / 1000, request.method, route_path, str(status))
+            finish_request(queries, request.method, route_path)
+            _log_access(request, status, latency_ms, queries)
+
+
+def _log_access(request: Request, status: int, latency_ms: float, queries) -> None:
+    query_heavy = queries.count > settings.mongodb_request_query_limit
+    if (
+        status < 400
+        and latency_ms < settings.access_log_slow_ms
+        and not query_heavy
+        and random.random() >= settings.access_log_sample_rate
+    ):
+        return
+
+    user = getattr(request.state, "user", None)
+    logger.info(
+        "access",
+        extra={"access": {
+            "method": request.method,
+            "path": getattr(request.scope.get("route"), "path", request.url.path),
+            "status": status,
+            "latency_ms": round(latency_ms, 1),
+            "user_id": user.id if user else None,
+            "provider": getattr(request.state, "provider", None),
+            "slow": latency_ms >= settings.access_log_slow_ms,
+            "mongo_queries": queries.count,
+            "mongo_ms": round(queries.total_ms, 1),
+        }},
+    )
@@ -0,0 +1,53 @@
+"""
+Profiling middleware — samples a request's call stacks on demand.
+
+A request is profiled when an admin sends `X-Profile: 1`, or at random at
+PROFILE_SAMPLE_RATE. The profile id is returned in `X-Profile-Id`; the
+collapsed stacks are served at /admin/profiles/{id}.
+
+Pure ASGI and registered innermost, so this frame sits on the loop's stack
+directly above the route handler for the whole request (see services.profiler).
+"""
+import random
+import sys
+
+from starlette.datastructures import MutableHeaders
+
+from config import get_settings
+from services.profiler import finish_profile, start_profile
+
+settings = get_settings()
+
+
+def _requested(scope) -> bool:
+    if settings.profile_sample_rate and random.random() < settings.profile_sample_rate:
+        return True
+    if (b"x-profile", b"1") not in scope.get("headers", []):
+        return False
+    user = scope.get("state", {}).get("user")
+    return bool(user and user.email.lower() in settings.admin_emails_list)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _requested(scope):
+            return await self.app(scope, receive, send)
+
+        marker = sys._getframe()
+        profile = start_profile(scope["method"], scope["path"], marker)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile.id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            route = scope.get("route")
+            profile.path = getattr(route, "path", profile.path)
+            finish_profile(profile, marker, profile.status)
@@ -1,48 +1,113 @@
 """
-Sliding-window rate limiter — in-memory, per client IP.
-Returns 429 Too Many Requests when a client exceeds RATE_LIMIT_PER_MINUTE.
+Sliding-window rate limiter — per user (or client IP), with per-route cost weights.
+Returns 429 Too Many Requests when a client exceeds any of its budgets.
+
+Every request is charged against one or more budgets:
+  requests    — RATE_LIMIT_PER_MINUTE, weighted per route (default weight 1)
+  llm_tokens  — RATE_LIMIT_LLM_TOKENS_PER_MINUTE, charged by LLM-backed routes
+                at their worst-case output size
+
+Counters live in a pluggable store (see services/rate_limit_store.py) so the
+limit can be enforced per process, across workers on one host, or cluster-wide.
 """
+import logging
+import re
 import time
-from collections import defaultdict, deque
+from typing import Dict, List, Tuple
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import JSONResponse
 from config import get_settings
+from services.metrics import rate_limit_rejections
+from services.rate_limit_store import RateLimitStore, get_rate_limit_store
+from services.tracing import traced
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# ip → deque of timestamps (seconds)
-_windows: dict[str, deque] = defaultdict(deque)
+# (method, route path template) → {budget: cost}. Unlisted routes cost one request.
+ROUTE_COSTS: Dict[Tuple[str, str], Dict[str, int]] = {
+    ("POST", "/generate"):             {"requests": 5, "llm_tokens": 8192},
+    ("POST", "/generate/stream"):      {"requests": 5, "llm_tokens": 8192},
+    ("POST", "/generate/jobs"):        {"requests": 5, "llm_tokens": 8192},
+    ("POST", "/generate/edit-script"): {"requests": 2, "llm_tokens": 8192},
+}
+DEFAULT_COST: Dict[str, int] = {"requests": 1}
+
+# Resolved from the app's route table at startup: (method, path regex, costs)
+_route_table: List[Tuple[str, re.Pattern, Dict[str, int]]] = []
+
+
+def load_route_costs(routes) -> None:
+    """Match ROUTE_COSTS against the mounted routes; call once at startup."""
+    table, matched = [], set()
+    for route in routes:
+        for method in getattr(route, "methods", None) or ():
+            costs = ROUTE_COSTS.get((method, getattr(route, "path", "")))
+            if costs:
+                table.append((method, route.path_regex, costs))
+                matched.add((method, route.path))
+    for method, path in ROUTE_COSTS.keys() - matched:
+        logger.warning("Rate-limit cost configured for unknown route %s %s", method, path)
+    _route_table[:] = table
+
+
+def route_cost(method: str, path: str) -> Dict[str, int]:
+    for route_method, regex, costs in _route_table:
+        if route_method == method and regex.match(path):
+            return costs
+    return DEFAULT_COST
 
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, limit: int | None = None):
+    def __init__(self, app, limit: int | None = None, store: RateLimitStore | None = None):
         super().__init__(app)
         self.limit = limit or settings.rate_limit_per_minute
+        self.budgets = {
+            "requests":   self.limit,
+            "llm_tokens": settings.rate_limit_llm_tokens_per_minute,
+        }
         self.window = 60  # seconds
+        self.store = store or get_rate_limit_store()
 
+    @traced("middleware.rate_limit")
     async def dispatch(self, request: Request, call_next):
-        ip = request.client.host if request.client else "unknown"
-        now = time.time()
-        q = _windows[ip]
+        # AuthMiddleware wraps this one, so authenticated callers are keyed by user
+        user = getattr(request.state, "user", None)
+        client = f"user:{user.id}" if user else (request.client.host if request.client else "unknown")
+        costs = route_cost(request.method, request.url.path)
+        buckets = list(costs)
 
-        # Evict timestamps older than the window
-        while q and q[0] < now - self.window:
-            q.popleft()
+        try:
+            allowed, used = await self.store.hit(
+                [(f"{b}:{client}", costs[b], self.budgets[b]) for b in buckets], self.window,
+            )
+        except Exception as exc:
+            # Fail open — a store outage must not take the API down with it.
+            logger.warning("Rate-limit store unavailable, allowing request: %s", exc)
+            return await call_next(request)
 
-        if len(q) >= self.limit:
-            retry_after = int(self.window - (now - q[0])) + 1
+        if not allowed:
+            retry_after = int(self.window - time.time() % self.window) + 1
+            exceeded = next(
+                (b for b, u in zip(buckets, used) if u + costs[b] > self.budgets[b]), buckets[0]
+            )
+            rate_limit_rejections.inc(exceeded)
             return JSONResponse(
                 status_code=429,
                 content={
-                    "detail": f"Rate limit exceeded. Max {self.limit} requests/minute.",
+                    "detail": f"Rate limit exceeded. Max {self.budgets[exceeded]} {exceeded.replace('_', ' ')}/minute.",
                     "retry_after_seconds": retry_after,
                 },
                 headers={"Retry-After": str(retry_after)},
             )
 
-        q.append(now)
         response = await call_next(request)
+        used_by = dict(zip(buckets, used))
         response.headers["X-RateLimit-Limit"]     = str(self.limit)
-        response.headers["X-RateLimit-Remaining"] = str(max(0, self.limit - len(q)))
+        response.headers["X-RateLimit-Remaining"] = str(max(0, self.limit - used_by.get("requests", 0)))
+        if "llm_tokens" in used_by:
+            response.headers["X-RateLimit-Tokens-Remaining"] = str(
+                max(0, self.budgets["llm_tokens"] - used_by["llm_tokens"])
+            )
         return response
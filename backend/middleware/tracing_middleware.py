@@ -0,0 +1,34 @@
+"""
+Tracing middleware — opens the root span for every HTTP request.
+
+Registered last so it is the outermost layer and its span covers every other
+middleware. Continues an incoming W3C `traceparent` and returns one so callers
+can find the trace.
+"""
+from services import tracing
+
+
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracing.enabled():
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        parent = tracing.parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+
+        with tracing.span("http.request", parent=parent, method=scope["method"], path=scope["path"]) as root:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    root.set(status=message["status"])
+                    if root.traceparent:
+                        message.setdefault("headers", [])
+                        message["headers"] = [*message["headers"], (b"traceparent", root.traceparent.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
+            route = scope.get("route")
+            if route is not None:
+                root.set(route=route.path)
@@ -6,6 +6,7 @@ from pydantic import BaseModel, Field
 class StoryInput(BaseModel):
     project_id: str
     story: str = Field(..., min_length=20, description="Story premise or synopsis")
+    bypass_cache: bool = Field(False, description="Regenerate even if this premise was generated before")
 
 
 class Shot(BaseModel):
@@ -60,3 +61,15 @@ class GenerationResult(BaseModel):
     sound_design: List[SoundScene]
     provider: str
     created_at: Optional[datetime] = None
+
+
+class GenerationJob(BaseModel):
+    id: str
+    project_id: str
+    status: str  # queued | running | done | failed
+    attempts: int = 0
+    provider: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    result: Optional[GenerationResult] = None  # once done
@@ -0,0 +1,98 @@
+"""
+Admin router — /admin/*
+Runtime diagnostics for operators: request CPU profiles, tracemalloc
+snapshots and diffs, and recent event-loop stalls. Restricted to ADMIN_EMAILS.
+"""
+import asyncio
+import logging
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from config import get_settings
+from services.loop_monitor import recent_stalls
+from services.profiler import (
+    MAX_TRACE_FRAMES, get_profile, list_profiles, memory_diff, memory_snapshot, memory_start, memory_status,
+    memory_stop,
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+GroupBy = Literal["lineno", "filename", "traceback"]
+
+
+def _admin(request: Request) -> str:
+    user = getattr(request.state, "user", None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated.")
+    if user.email.lower() not in settings.admin_emails_list:
+        raise HTTPException(status_code=403, detail="Admin access required.")
+    return user.id
+
+
+# ── CPU profiles ──────────────────────────────────────────────
+
+@router.get("/profiles")
+async def profiles(request: Request):
+    _admin(request)
+    return {"profiles": list_profiles()}
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def profile_stacks(profile_id: str, request: Request):
+    """Collapsed stacks (`a;b;c count` per line) for flamegraph.pl / speedscope."""
+    _admin(request)
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return PlainTextResponse(profile.collapsed())
+
+
+# ── Memory ────────────────────────────────────────────────────
+
+@router.get("/memory")
+async def memory(request: Request):
+    _admin(request)
+    return memory_status()
+
+
+@router.post("/memory/start")
+async def start_memory(request: Request, frames: int = Query(10, ge=1, le=MAX_TRACE_FRAMES)):
+    _admin(request)
+    return memory_start(frames)
+
+
+@router.post("/memory/stop")
+async def stop_memory(request: Request):
+    _admin(request)
+    return memory_stop()
+
+
+@router.post("/memory/snapshots")
+async def take_snapshot(request: Request, group_by: GroupBy = "lineno", limit: int = 25):
+    """Snapshotting walks every traced allocation, so it runs off the event loop."""
+    _admin(request)
+    try:
+        return await asyncio.to_thread(memory_snapshot, group_by, limit)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
+@router.get("/memory/diff")
+async def diff_snapshots(base: str, target: str, request: Request, group_by: GroupBy = "lineno", limit: int = 25):
+    _admin(request)
+    try:
+        return {"base": base, "target": target, "top": await asyncio.to_thread(memory_diff, base, target, group_by, limit)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found.")
+
+
+# ── Event loop ────────────────────────────────────────────────
+
+@router.get("/loop/stalls")
+async def loop_stalls(request: Request):
+    _admin(request)
+    return {"stalls": recent_stalls()}
@@ -2,18 +2,33 @@
 Generation router — /generate/*
 Routes:
   POST /generate                         — story → screenplay + shots + sound
+  POST /generate/stream                  — same, streamed as server-sent events
+  POST /generate/jobs                    — same, queued for a background worker
+  GET  /generate/jobs/{job_id}           — job status (and result once done)
+  GET  /generate/jobs/{job_id}/events    — job status as server-sent events
   GET  /generate/{project_id}/latest     — fetch most recent generation for a project
 """
+import asyncio
+import itertools
 import logging
 from fastapi import APIRouter, HTTPException, Request, status, BackgroundTasks
-
-from models.generation import StoryInput, GenerationResult
-from services.llm_service import generate_production, edit_script
-from services.db_service import save_generation, get_latest_generation, get_project, get_project_generations, update_generation_screenplay
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from config import get_settings
+from models.generation import StoryInput, GenerationJob, GenerationResult
+from services.llm_service import generate_production, edit_script, stream_production
+from services.db_service import (
+    save_generation, get_project, update_generation_screenplay,
+    get_latest_generation_raw, get_project_generations_raw, get_generation, get_job,
+)
+from services.job_queue import QueueFull, submit
+from services.serialization import FastJSONResponse, dumps, iter_json_array
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Iterable, Iterator, Optional, List
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 router = APIRouter(prefix="/generate", tags=["Generation"])
 
 
@@ -24,6 +39,24 @@ def _user_id(request: Request) -> str:
     return user.id
 
 
+def _generation_view(g, project_id: str) -> dict:
+    """
+    Shape a stored generation (dict or RawBSONDocument) like GenerationResult,
+    without re-validating it. `_id` is renamed to `id`; nested values are left
+    as they are for the JSON encoder.
+    """
+    return {
+        "id":           g["_id"],
+        "project_id":   project_id,
+        "story_input":  g.get("story_input", ""),
+        "screenplay":   g.get("screenplay", ""),
+        "shot_design":  g.get("shot_design", []),
+        "sound_design": g.get("sound_design", []),
+        "provider":     g.get("provider", "unknown"),
+        "created_at":   g.get("created_at"),
+    }
+
+
 @router.post("", response_model=GenerationResult, status_code=status.HTTP_201_CREATED)
 async def generate_route(request: Request, body: StoryInput):
     """
@@ -39,14 +72,64 @@ async def generate_route(request: Request, body: StoryInput):
 
     # Generate
     try:
-        result_dict, provider = await generate_production(body.story)
+        result_dict, provider = await generate_production(body.story, bypass_cache=body.bypass_cache)
     except RuntimeError as exc:
         raise HTTPException(status_code=503, detail=str(exc))
     except Exception as exc:
         logger.error("Generation error: %s", exc)
         raise HTTPException(status_code=500, detail="Generation failed. Please try again.")
+    request.state.provider = provider  # picked up by the access log
+
+    return _persist(body, result_dict, provider)
+
+
+@router.post("/stream", status_code=status.HTTP_200_OK)
+async def generate_stream_route(request: Request, body: StoryInput):
+    """
+    Like POST /generate, but streams server-sent events while the model writes:
+    `provider`, `screenplay` ({"delta": text}) as the script grows, one
+    `shot_design` / `sound_design` event per finished scene, then `done` with
+    the persisted GenerationResult — or `error` if generation fails.
+    """
+    uid = _user_id(request)
+
+    project = get_project(body.project_id, uid)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found or access denied.")
 
-    # Persist to MongoDB
+    return StreamingResponse(
+        _generation_events(request, body),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+async def _generation_events(request: Request, body: StoryInput):
+    try:
+        async for event, value in stream_production(body.story, bypass_cache=body.bypass_cache):
+            if event == "result":
+                result_dict, provider = value
+            elif event == "provider":
+                request.state.provider = value
+                yield _sse(event, {"provider": value})
+            elif event == "screenplay":
+                yield _sse(event, {"delta": value})
+            else:
+                yield _sse(event, value)
+    except Exception as exc:
+        logger.error("Streaming generation error: %s", exc)
+        yield _sse("error", {"detail": "Generation failed. Please try again."})
+        return
+
+    yield _sse("done", _persist(body, result_dict, provider).model_dump())
+
+
+def _persist(body: StoryInput, result_dict: dict, provider: str) -> GenerationResult:
+    """Save a generation and shape it for the response; a failed save still returns the result."""
     try:
         saved = save_generation(
             project_id=body.project_id,
@@ -62,7 +145,6 @@ async def generate_route(request: Request, body: StoryInput):
         logger.warning("Could not persist generation: %s", exc)
         saved = {}
 
-    # Build and return response
     return GenerationResult(
         id=saved.get("id"),
         project_id=body.project_id,
@@ -75,6 +157,101 @@ async def generate_route(request: Request, body: StoryInput):
     )
 
 
+# ─── Background jobs ──────────────────────────────────────────────────────────
+
+@router.post("/jobs", response_model=GenerationJob, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job_route(request: Request, body: StoryInput):
+    """
+    Queue a generation and return at once. Poll GET /generate/jobs/{id} or
+    subscribe to its /events stream for the result.
+    """
+    uid = _user_id(request)
+
+    project = get_project(body.project_id, uid)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found or access denied.")
+
+    try:
+        job = submit(uid, body.project_id, body.story, body.bypass_cache)
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Generation queue is full. Try again shortly.",
+                            headers={"Retry-After": "30"})
+    return _job_view(job)
+
+
+@router.get("/jobs/{job_id}", response_model=GenerationJob)
+async def get_job_route(job_id: str, request: Request):
+    """Status of a queued generation, with its result once done."""
+    uid = _user_id(request)
+    job = get_job(job_id, uid)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return _job_view(job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events_route(job_id: str, request: Request):
+    """
+    Server-sent events for a queued generation: `status` whenever it changes,
+    then `done` with the job and its result, or `error` if it failed.
+    """
+    uid = _user_id(request)
+    if not get_job(job_id, uid):
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return StreamingResponse(
+        _job_events(request, job_id, uid),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _job_events(request: Request, job_id: str, uid: str):
+    last = None
+    while True:
+        job = await asyncio.to_thread(get_job, job_id, uid)
+        if job is None:
+            yield _sse("error", {"detail": "Job not found."})
+            return
+        if (job["status"], job["attempts"]) != last:
+            last = (job["status"], job["attempts"])
+            yield _sse("status", {"id": job["id"], "status": job["status"], "attempts": job["attempts"]})
+        if job["status"] in ("done", "failed"):
+            view = await asyncio.to_thread(_job_view, job)
+            yield _sse("done" if job["status"] == "done" else "error", view.model_dump())
+            return
+        if await request.is_disconnected():
+            return
+        await asyncio.sleep(settings.job_poll_interval_s)
+
+
+def _job_view(job: dict) -> GenerationJob:
+    result = None
+    if job["status"] == "done":
+        g = get_generation(job["generation_id"])
+        if g:
+            result = GenerationResult(
+                id=g["id"],
+                project_id=job["project_id"],
+                story_input=g.get("story_input", ""),
+                screenplay=g.get("screenplay", ""),
+                shot_design=g.get("shot_design", []),
+                sound_design=g.get("sound_design", []),
+                provider=g.get("provider", "unknown"),
+                created_at=g.get("created_at"),
+            )
+    return GenerationJob(
+        id=job["id"],
+        project_id=job["project_id"],
+        status=job["status"],
+        attempts=job.get("attempts", 0),
+        provider=job.get("provider"),
+        error=job.get("error"),
+        created_at=job.get("created_at"),
+        updated_at=job.get("updated_at"),
+        result=result,
+    )
+
+
 @router.get("/{project_id}/latest", response_model=GenerationResult)
 async def get_latest_route(project_id: str, request: Request):
     """Return the most recent generation for a given project."""
@@ -85,20 +262,12 @@ async def get_latest_route(project_id: str, request: Request):
     if not project:
         raise HTTPException(status_code=404, detail="Project not found or access denied.")
 
-    generation = get_latest_generation(project_id)
-    if not generation:
+    generation = get_latest_generation_raw(project_id)
+    if generation is None:
         raise HTTPException(status_code=404, detail="No generations found for this project.")
 
-    return GenerationResult(
-        id=generation["id"],
-        project_id=project_id,
-        story_input=generation["story_input"],
-        screenplay=generation.get("screenplay", ""),
-        shot_design=generation.get("shot_design", []),
-        sound_design=generation.get("sound_design", []),
-        provider=generation.get("provider", "unknown"),
-        created_at=generation["created_at"],
-    )
+    # Stored data was validated on write — serialize it directly
+    return FastJSONResponse(_generation_view(generation, project_id))
 
 
 @router.get("/{project_id}/history", response_model=List[GenerationResult])
@@ -110,20 +279,24 @@ async def get_history_route(project_id: str, request: Request):
     if not project:
         raise HTTPException(status_code=404, detail="Project not found or access denied.")
 
-    generations = get_project_generations(project_id)
-    return [
-        GenerationResult(
-            id=g["id"],
-            project_id=project_id,
-            story_input=g.get("story_input", ""),
-            screenplay=g.get("screenplay", ""),
-            shot_design=g.get("shot_design", []),
-            sound_design=g.get("sound_design", []),
-            provider=g.get("provider", "unknown"),
-            created_at=g.get("created_at"),
-        )
-        for g in generations
-    ]
+    # The first version is fetched before the 200 goes out, so a failing query is
+    # still a 500; the rest are streamed, the cursor drained in Starlette's threadpool
+    generations = get_project_generations_raw(project_id)
+    first = await run_in_threadpool(next, generations, None)
+    versions = generations if first is None else itertools.chain([first], generations)
+    return StreamingResponse(_history_body(versions, project_id), media_type="application/json")
+
+
+def _history_body(generations: Iterable, project_id: str) -> Iterator[bytes]:
+    """
+    The history as a JSON array. An error once the response has started is
+    logged and the array is left unclosed, so the client fails to parse it
+    instead of taking it for a complete, shorter history.
+    """
+    try:
+        yield from iter_json_array(_generation_view(g, project_id) for g in generations)
+    except Exception:
+        logger.exception("Streaming the history of project %s failed; the response is cut short.", project_id)
 
 
 # ─── Script Editing ───────────────────────────────────────────────────────────
@@ -132,6 +305,7 @@ class ScriptEditRequest(BaseModel):
     script: str
     action: str  # expand | compress | rewrite | tone
     tone: Optional[str] = None
+    bypass_cache: bool = False
 
 
 class ScriptEditResponse(BaseModel):
@@ -151,7 +325,7 @@ async def edit_script_route(request: Request, body: ScriptEditRequest):
         raise HTTPException(status_code=400, detail="Tone is required for tone action.")
 
     try:
-        result = await edit_script(body.script, body.action, body.tone or "")
+        result = await edit_script(body.script, body.action, body.tone or "", bypass_cache=body.bypass_cache)
     except Exception as exc:
         logger.error("Script edit error: %s", exc)
         raise HTTPException(status_code=500, detail="Script editing failed.")
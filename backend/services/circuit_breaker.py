@@ -0,0 +1,166 @@
+"""
+Per-provider circuit breakers and retry backoff for LLM calls.
+
+Each provider's breaker keeps the outcomes of its calls over the last
+LLM_BREAKER_WINDOW_S. Once there are LLM_BREAKER_MIN_CALLS of them, it opens
+when the failure rate reaches LLM_BREAKER_FAILURE_RATE, or when the share of
+calls slower than LLM_BREAKER_SLOW_CALL_S reaches LLM_BREAKER_SLOW_RATE. A 429
+whose Retry-After is too long to wait out opens it for that long.
+
+While open, `allow()` raises ProviderUnavailable at once, so callers move to
+the next provider without touching the network. After the open period one
+probe call is let through (half-open): success closes the breaker, failure
+re-opens it for twice as long as before (jittered, capped at
+LLM_BREAKER_MAX_OPEN_S).
+
+`backoff()` decides whether and how long to wait before retrying a failed
+attempt: Retry-After when the provider sent one, otherwise full-jitter
+exponential backoff.
+"""
+import logging
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from config import get_settings
+from services.metrics import llm_breaker_rejections, llm_breaker_state, llm_breaker_transitions
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class ProviderUnavailable(RuntimeError):
+    """The provider's breaker is open; the call was not attempted."""
+
+
+class ProviderError(RuntimeError):
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.state = CLOSED
+        self._calls: deque = deque()  # (finished_at, ok, slow)
+        self._open_until = 0.0
+        self._open_for = settings.llm_breaker_open_s
+        self._probing = False
+        llm_breaker_state.set(STATE_VALUES[CLOSED], provider)
+
+    def allow(self) -> None:
+        """Raise ProviderUnavailable unless a call may go out now."""
+        if self.state == OPEN and time.monotonic() >= self._open_until:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED or (self.state == HALF_OPEN and not self._probing):
+            self._probing = self.state == HALF_OPEN
+            return
+        llm_breaker_rejections.inc(self.provider)
+        raise ProviderUnavailable(f"{self.provider} circuit is {self.state}.")
+
+    def record(self, ok: bool, latency_s: float) -> None:
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if ok and latency_s < settings.llm_breaker_slow_call_s:
+                self._calls.clear()
+                self._open_for = settings.llm_breaker_open_s
+                self._transition(CLOSED)
+            else:
+                self._open_for = min(self._open_for * 2, settings.llm_breaker_max_open_s)
+                self._open(self._open_for)
+            return
+        if self.state == OPEN:
+            return  # a call that started before the breaker opened
+
+        self._calls.append((now, ok, latency_s >= settings.llm_breaker_slow_call_s))
+        while self._calls and self._calls[0][0] < now - settings.llm_breaker_window_s:
+            self._calls.popleft()
+        total = len(self._calls)
+        if total < settings.llm_breaker_min_calls:
+            return
+        failures = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+        slow = sum(1 for _, _, call_slow in self._calls if call_slow)
+        if failures / total >= settings.llm_breaker_failure_rate or slow / total >= settings.llm_breaker_slow_rate:
+            logger.warning("%s circuit opening: %d failed and %d slow of the last %d calls.",
+                           self.provider, failures, slow, total)
+            self._open(self._open_for)
+
+    def release(self) -> None:
+        """The call was abandoned (cancelled) before it had an outcome."""
+        if self.state == HALF_OPEN:
+            self._probing = False
+
+    def trip(self, seconds: float) -> None:
+        """Open for at least `seconds`, e.g. a provider's Retry-After."""
+        logger.warning("%s circuit opening for %.0fs (provider asked us to back off).", self.provider, seconds)
+        self._probing = False
+        self._open(max(seconds, self._open_for), jitter=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        report: Dict[str, Any] = {"state": self.state, "recent_calls": len(self._calls), "recent_failures": failures}
+        if self.state == OPEN:
+            report["retry_in_s"] = round(max(self._open_until - time.monotonic(), 0.0), 1)
+        return report
+
+    def _open(self, seconds: float, jitter: bool = True) -> None:
+        # Jitter keeps workers that opened together from probing together
+        self._open_until = time.monotonic() + seconds * (random.uniform(0.8, 1.2) if jitter else 1)
+        self._calls.clear()
+        self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            llm_breaker_state.set(STATE_VALUES[state], self.provider)
+            llm_breaker_transitions.inc(self.provider, state)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = _breakers[provider] = CircuitBreaker(provider)
+    return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of every provider's breaker, for /health."""
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+def retry_after(headers) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt: int, error: ProviderError) -> Optional[float]:
+    """Seconds to wait before retry number `attempt` + 1, or None to give up."""
+    if attempt + 1 >= settings.llm_retry_attempts:
+        return None
+    if error.status is not None and error.status not in RETRYABLE_STATUS:
+        return None
+    if error.retry_after is not None:
+        return error.retry_after if error.retry_after <= settings.llm_retry_max_s else None
+    return random.uniform(0, min(settings.llm_retry_max_s, settings.llm_retry_base_s * 2 ** attempt))
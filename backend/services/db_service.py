@@ -1,22 +1,86 @@
 """
-MongoDB service — handles connection and CRUD for projects and generations.
+Database service — handles connection and CRUD for projects and generations.
+
+STORAGE_BACKEND picks the engine behind `get_db()`: a MongoDB database
+(default) or the embedded SQLite store in services.sqlite_store, which
+implements the same collection API. Every function below works on either.
 """
-from functools import lru_cache
-from typing import Optional, List
-from datetime import datetime, timezone
+import logging
+import time
+from functools import lru_cache, wraps
+from typing import Iterable, Iterator, List, Optional
+from datetime import datetime, timedelta, timezone
 from bson import ObjectId
-from pymongo import MongoClient, DESCENDING
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import MongoClient, ASCENDING, DESCENDING, IndexModel
 from config import get_settings
+from services.metrics import mongo_operation_duration
+from services.mongo_monitor import CommandMonitor
+from services.sqlite_store import SQLiteDatabase
+from services.tracing import span
+
+logger = logging.getLogger(__name__)
 
 
 @lru_cache()
 def get_db():
-    """Singleton MongoDB database connection."""
+    """Singleton database handle for the configured storage backend."""
     s = get_settings()
-    client = MongoClient(s.mongodb_uri)
+    if s.storage_backend == "sqlite":
+        return SQLiteDatabase(s.sqlite_path)
+    client = MongoClient(
+        s.mongodb_uri,
+        serverSelectionTimeoutMS=s.mongodb_timeout_ms,
+        event_listeners=[CommandMonitor()],
+    )
     return client[s.mongodb_db_name]
 
 
+def _timed(fn):
+    """Trace each call and record its latency in mongo_operation_duration_seconds."""
+    name = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            with span(f"db.{name}"):
+                result = fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            mongo_operation_duration.observe(time.perf_counter() - start, name, outcome)
+    return wrapper
+
+
+def _timed_iter(name: str, items: Iterable) -> Iterator:
+    """
+    `_timed` for lazy cursors, whose queries run as the caller iterates. Only
+    the time spent fetching is recorded, not the caller's work in between.
+    No span: iteration may hop between threadpool threads.
+    """
+    items = iter(items)
+    elapsed, outcome = 0.0, "error"
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                outcome = "ok"
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    except GeneratorExit:
+        outcome = "ok"  # the caller stopped early, e.g. the client went away
+        raise
+    finally:
+        mongo_operation_duration.observe(elapsed, name, outcome)
+
+
 def _serialize(doc: dict) -> dict:
     """Convert MongoDB doc to JSON-serializable dict (ObjectId → str)."""
     if doc is None:
@@ -31,20 +95,31 @@ def _serialize(doc: dict) -> dict:
     return doc
 
 
+# Read-only views hand documents straight to the JSON encoder: fields are only
+# decoded from the wire bytes when the encoder reaches them.
+_RAW = CodecOptions(document_class=RawBSONDocument)
+
+# Fields a GenerationResult needs — anything else stored on the document stays on the server
+GENERATION_FIELDS = {f: 1 for f in ("story_input", "screenplay", "shot_design", "sound_design", "provider", "created_at")}
+
+
 # ── Users ─────────────────────────────────────────────────────
 
+@_timed
 def find_user_by_email(email: str) -> Optional[dict]:
     db = get_db()
     user = db.users.find_one({"email": email.lower()})
     return _serialize(user)
 
 
+@_timed
 def find_user_by_id(user_id: str) -> Optional[dict]:
     db = get_db()
     user = db.users.find_one({"_id": ObjectId(user_id)})
     return _serialize(user)
 
 
+@_timed
 def create_user(email: str, hashed_password: str, name: str) -> dict:
     db = get_db()
     now = datetime.now(timezone.utc)
@@ -62,12 +137,14 @@ def create_user(email: str, hashed_password: str, name: str) -> dict:
 
 # ── Projects ──────────────────────────────────────────────────
 
+@_timed
 def list_projects(user_id: str) -> List[dict]:
     db = get_db()
     cursor = db.projects.find({"user_id": user_id}).sort("created_at", DESCENDING)
     return [_serialize(doc) for doc in cursor]
 
 
+@_timed
 def get_project(project_id: str, user_id: str) -> Optional[dict]:
     db = get_db()
     try:
@@ -77,6 +154,7 @@ def get_project(project_id: str, user_id: str) -> Optional[dict]:
     return _serialize(doc)
 
 
+@_timed
 def create_project(user_id: str, data: dict) -> dict:
     db = get_db()
     now = datetime.now(timezone.utc)
@@ -91,6 +169,7 @@ def create_project(user_id: str, data: dict) -> dict:
     return _serialize(doc)
 
 
+@_timed
 def update_project(project_id: str, user_id: str, data: dict) -> Optional[dict]:
     db = get_db()
     data["updated_at"] = datetime.now(timezone.utc)
@@ -105,6 +184,7 @@ def update_project(project_id: str, user_id: str, data: dict) -> Optional[dict]:
     return _serialize(result)
 
 
+@_timed
 def delete_project(project_id: str, user_id: str) -> bool:
     db = get_db()
     try:
@@ -120,6 +200,7 @@ def delete_project(project_id: str, user_id: str) -> bool:
 
 # ── Generations ───────────────────────────────────────────────
 
+@_timed
 def save_generation(project_id: str, payload: dict) -> dict:
     db = get_db()
     now = datetime.now(timezone.utc)
@@ -133,6 +214,17 @@ def save_generation(project_id: str, payload: dict) -> dict:
     return _serialize(doc)
 
 
+@_timed
+def get_generation(generation_id: str) -> Optional[dict]:
+    db = get_db()
+    try:
+        doc = db.generations.find_one({"_id": ObjectId(generation_id)})
+    except Exception:
+        return None
+    return _serialize(doc)
+
+
+@_timed
 def get_latest_generation(project_id: str) -> Optional[dict]:
     db = get_db()
     doc = db.generations.find_one(
@@ -142,6 +234,7 @@ def get_latest_generation(project_id: str) -> Optional[dict]:
     return _serialize(doc)
 
 
+@_timed
 def get_project_generations(project_id: str) -> List[dict]:
     """Return all generations for a project, newest first."""
     db = get_db()
@@ -151,6 +244,30 @@ def get_project_generations(project_id: str) -> List[dict]:
     return [_serialize(doc) for doc in cursor]
 
 
+@_timed
+def get_latest_generation_raw(project_id: str) -> Optional[RawBSONDocument]:
+    """Like get_latest_generation, but returns the undecoded BSON document."""
+    db = get_db()
+    return db.generations.with_options(codec_options=_RAW).find_one(
+        {"project_id": project_id},
+        GENERATION_FIELDS,
+        sort=[("created_at", DESCENDING)],
+    )
+
+
+def get_project_generations_raw(project_id: str) -> Iterator[RawBSONDocument]:
+    """
+    Like get_project_generations, but yields undecoded BSON documents lazily,
+    so callers can stream them without holding the whole history in memory.
+    """
+    db = get_db()
+    cursor = db.generations.with_options(codec_options=_RAW).find(
+        {"project_id": project_id}, GENERATION_FIELDS,
+    ).sort("created_at", DESCENDING)
+    return _timed_iter("get_project_generations_raw", cursor)
+
+
+@_timed
 def update_generation_screenplay(generation_id: str, screenplay: str) -> Optional[dict]:
     """Overwrite the screenplay field of an existing generation."""
     db = get_db()
@@ -162,8 +279,95 @@ def update_generation_screenplay(generation_id: str, screenplay: str) -> Optiona
     return _serialize(result)
 
 
+# ── Generation jobs ───────────────────────────────────────────
+# status: queued → running → done | failed. A running job is leased to one
+# worker; a lease that runs out puts it back up for claiming.
+
+@_timed
+def create_job(user_id: str, project_id: str, story: str, bypass_cache: bool) -> dict:
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    doc = {
+        "user_id": user_id,
+        "project_id": project_id,
+        "story": story,
+        "bypass_cache": bypass_cache,
+        "status": "queued",
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+    result = db.generation_jobs.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    return _serialize(doc)
+
+
+@_timed
+def get_job(job_id: str, user_id: str) -> Optional[dict]:
+    db = get_db()
+    try:
+        doc = db.generation_jobs.find_one({"_id": ObjectId(job_id), "user_id": user_id})
+    except Exception:
+        return None
+    return _serialize(doc)
+
+
+@_timed
+def count_jobs(status: str) -> int:
+    return get_db().generation_jobs.count_documents({"status": status})
+
+
+@_timed
+def claim_job(owner: str, lease: timedelta) -> Optional[dict]:
+    """Lease the oldest queued job (or one whose lease ran out) to `owner`."""
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    doc = db.generation_jobs.find_one_and_update(
+        {"$or": [{"status": "queued"}, {"status": "running", "lease_until": {"$lt": now}}]},
+        {"$set": {"status": "running", "lease_owner": owner, "lease_until": now + lease,
+                  "started_at": now, "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("created_at", ASCENDING)],
+        return_document=True,
+    )
+    return _serialize(doc)
+
+
+@_timed
+def renew_job_lease(job_id: str, owner: str, lease: timedelta) -> bool:
+    db = get_db()
+    result = db.generation_jobs.update_one(
+        {"_id": ObjectId(job_id), "status": "running", "lease_owner": owner},
+        {"$set": {"lease_until": datetime.now(timezone.utc) + lease}},
+    )
+    return result.matched_count == 1
+
+
+@_timed
+def finish_job(job_id: str, owner: str, fields: dict, retention: Optional[timedelta] = None) -> bool:
+    """Set the outcome of a leased job and release the lease; False if the lease was lost."""
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    update = {**fields, "updated_at": now}
+    if retention is not None:
+        update["expires_at"] = now + retention
+    result = db.generation_jobs.update_one(
+        {"_id": ObjectId(job_id), "lease_owner": owner},
+        {"$set": update, "$unset": {"lease_owner": "", "lease_until": ""}},
+    )
+    return result.matched_count == 1
+
+
+@_timed
+def purge_expired_jobs() -> int:
+    """Mongo's TTL index does this on its own; the SQLite store needs it done."""
+    db = get_db()
+    return db.generation_jobs.delete_many({"expires_at": {"$lt": datetime.now(timezone.utc)}}).deleted_count
+
+
 # ── Call Sheet ────────────────────────────────────────────────
 
+@_timed
 def create_callsheet_entry(project_id: str, data: dict) -> dict:
     """Add an actor / crew member entry to a project's call sheet."""
     db = get_db()
@@ -175,13 +379,14 @@ def create_callsheet_entry(project_id: str, data: dict) -> dict:
         "email": data.get("email", ""),
         "notes": data.get("notes", ""),
         "available_dates": data.get("available_dates", []),   # list of ISO date strings
-        "created_at": datetime.utcnow().isoformat(),
+        "created_at": datetime.now(timezone.utc),
     }
     result = db.callsheet.insert_one(doc)
     doc["_id"] = result.inserted_id
     return _serialize(doc)
 
 
+@_timed
 def get_callsheet(project_id: str) -> list:
     """Return all call sheet entries for a project."""
     db = get_db()
@@ -189,6 +394,7 @@ def get_callsheet(project_id: str) -> list:
     return [_serialize(doc) for doc in cursor]
 
 
+@_timed
 def update_callsheet_entry(entry_id: str, data: dict) -> dict | None:
     """Update a call sheet entry by its id."""
     db = get_db()
@@ -198,11 +404,13 @@ def update_callsheet_entry(entry_id: str, data: dict) -> dict | None:
             update_fields[key] = data[key]
     if not update_fields:
         return None
-    db.callsheet.update_one({"_id": ObjectId(entry_id)}, {"$set": update_fields})
-    doc = db.callsheet.find_one({"_id": ObjectId(entry_id)})
+    doc = db.callsheet.find_one_and_update(
+        {"_id": ObjectId(entry_id)}, {"$set": update_fields}, return_document=True,
+    )
     return _serialize(doc) if doc else None
 
 
+@_timed
 def delete_callsheet_entry(entry_id: str) -> bool:
     """Delete a call sheet entry."""
     db = get_db()
@@ -212,6 +420,7 @@ def delete_callsheet_entry(entry_id: str) -> bool:
 
 # ── Budget ────────────────────────────────────────────────────
 
+@_timed
 def create_budget_item(project_id: str, data: dict) -> dict:
     """Add a budget line item to a project."""
     db = get_db()
@@ -228,13 +437,14 @@ def create_budget_item(project_id: str, data: dict) -> dict:
         "estimated": data.get("estimated", 0),
         "actual": data.get("actual", 0),
         "paid": data.get("paid", 0),
-        "created_at": datetime.utcnow().isoformat(),
+        "created_at": datetime.now(timezone.utc),
     }
     result = db.budget.insert_one(doc)
     doc["_id"] = result.inserted_id
     return _serialize(doc)
 
 
+@_timed
 def get_budget(project_id: str) -> list:
     """Return all budget items for a project."""
     db = get_db()
@@ -242,6 +452,7 @@ def get_budget(project_id: str) -> list:
     return [_serialize(doc) for doc in cursor]
 
 
+@_timed
 def update_budget_item(item_id: str, data: dict) -> dict | None:
     """Update a budget item by its id."""
     db = get_db()
@@ -252,11 +463,13 @@ def update_budget_item(item_id: str, data: dict) -> dict | None:
             update_fields[key] = data[key]
     if not update_fields:
         return None
-    db.budget.update_one({"_id": ObjectId(item_id)}, {"$set": update_fields})
-    doc = db.budget.find_one({"_id": ObjectId(item_id)})
+    doc = db.budget.find_one_and_update(
+        {"_id": ObjectId(item_id)}, {"$set": update_fields}, return_document=True,
+    )
     return _serialize(doc) if doc else None
 
 
+@_timed
 def delete_budget_item(item_id: str) -> bool:
     """Delete a budget item."""
     db = get_db()
@@ -266,6 +479,7 @@ def delete_budget_item(item_id: str) -> bool:
 
 # ── Shot Design CRUD ─────────────────────────────────────────
 
+@_timed
 def create_shot_design(project_id: str, data: dict) -> dict:
     """Create a new shot design for a project."""
     db = get_db()
@@ -284,6 +498,7 @@ def create_shot_design(project_id: str, data: dict) -> dict:
     return _serialize(doc)
 
 
+@_timed
 def get_shot_designs(project_id: str) -> List[dict]:
     """Get all shot designs for a project."""
     db = get_db()
@@ -291,6 +506,7 @@ def get_shot_designs(project_id: str) -> List[dict]:
     return [_serialize(d) for d in docs]
 
 
+@_timed
 def get_shot_design(design_id: str) -> Optional[dict]:
     """Get a single shot design by its ID."""
     db = get_db()
@@ -298,6 +514,7 @@ def get_shot_design(design_id: str) -> Optional[dict]:
     return _serialize(doc) if doc else None
 
 
+@_timed
 def update_shot_design(design_id: str, data: dict) -> Optional[dict]:
     """Update fields of a shot design."""
     db = get_db()
@@ -305,11 +522,13 @@ def update_shot_design(design_id: str, data: dict) -> Optional[dict]:
     for key in ("scene_name", "shot_label", "canvas_width", "canvas_height", "elements"):
         if key in data:
             update_fields[key] = data[key]
-    db.shot_designs.update_one({"_id": ObjectId(design_id)}, {"$set": update_fields})
-    doc = db.shot_designs.find_one({"_id": ObjectId(design_id)})
+    doc = db.shot_designs.find_one_and_update(
+        {"_id": ObjectId(design_id)}, {"$set": update_fields}, return_document=True,
+    )
     return _serialize(doc) if doc else None
 
 
+@_timed
 def delete_shot_design(design_id: str) -> bool:
     """Delete a shot design."""
     db = get_db()
@@ -319,6 +538,7 @@ def delete_shot_design(design_id: str) -> bool:
 
 # ── Contact CRUD ─────────────────────────────────────────────
 
+@_timed
 def create_contact(project_id: str, data: dict) -> dict:
     """Create a new contact for a project."""
     db = get_db()
@@ -341,6 +561,7 @@ def create_contact(project_id: str, data: dict) -> dict:
     return _serialize(doc)
 
 
+@_timed
 def get_contacts(project_id: str) -> List[dict]:
     """Get all contacts for a project."""
     db = get_db()
@@ -348,6 +569,7 @@ def get_contacts(project_id: str) -> List[dict]:
     return [_serialize(d) for d in docs]
 
 
+@_timed
 def update_contact(contact_id: str, data: dict) -> Optional[dict]:
     """Update fields of a contact."""
     db = get_db()
@@ -358,11 +580,13 @@ def update_contact(contact_id: str, data: dict) -> Optional[dict]:
             update_fields[key] = data[key]
     if len(update_fields) <= 1:
         return None
-    db.contacts.update_one({"_id": ObjectId(contact_id)}, {"$set": update_fields})
-    doc = db.contacts.find_one({"_id": ObjectId(contact_id)})
+    doc = db.contacts.find_one_and_update(
+        {"_id": ObjectId(contact_id)}, {"$set": update_fields}, return_document=True,
+    )
     return _serialize(doc) if doc else None
 
 
+@_timed
 def delete_contact(contact_id: str) -> bool:
     """Delete a contact."""
     db = get_db()
@@ -370,16 +594,48 @@ def delete_contact(contact_id: str) -> bool:
     return result.deleted_count > 0
 
 
-# ── Indexes (called once on startup) ─────────────────────────
+# ── Indexes (reconciled in the background on startup) ──────
+
+# collection → [(keys, options)]. Compound keys follow each query's filter + sort.
+INDEXES = {
+    "users":        [([("email", 1)], {"unique": True})],
+    "projects":     [([("user_id", 1), ("created_at", -1)], {})],
+    "generations":  [([("project_id", 1), ("created_at", -1)], {})],
+    "callsheet":    [([("project_id", 1), ("created_at", 1)], {})],
+    "budget":       [([("project_id", 1), ("created_at", 1)], {})],
+    "shot_designs": [([("project_id", 1), ("created_at", 1)], {})],
+    "contacts":     [([("project_id", 1), ("name", 1)], {})],
+    "llm_cache":    [([("expires_at", 1)], {"expireAfterSeconds": 0}), ([("created_at", -1)], {})],
+    "generation_jobs": [([("status", 1), ("created_at", 1)], {}), ([("expires_at", 1)], {"expireAfterSeconds": 0})],
+}
 
-def ensure_indexes():
-    db = get_db()
-    db.users.create_index("email", unique=True)
-    db.projects.create_index("user_id")
-    db.generations.create_index([("project_id", 1), ("created_at", -1)])
-    db.callsheet.create_index("project_id")
-    db.budget.create_index("project_id")
-    db.shot_designs.create_index("project_id")
-    db.contacts.create_index("project_id")
 
+def _index_key(items) -> tuple:
+    return tuple((field, int(d) if isinstance(d, float) else d) for field, d in items)
 
+
+@_timed
+def ensure_indexes() -> List[str]:
+    """
+    Diff INDEXES against what each collection already has and create only the
+    missing ones. Returns the names of indexes created. Undeclared indexes and
+    option conflicts are logged, never dropped or rebuilt.
+    """
+    db = get_db()
+    created = []
+    for collection, declared in INDEXES.items():
+        existing = {_index_key(info["key"].items()): info for info in db[collection].list_indexes()}
+        missing = []
+        for keys, options in declared:
+            info = existing.get(_index_key(keys))
+            if info is None:
+                missing.append(IndexModel(keys, **options))
+            elif any(info.get(k, False) != v for k, v in options.items()):
+                logger.warning("Index %s.%s differs from its declaration %s.", collection, info["name"], options)
+        if missing:
+            created += db[collection].create_indexes(missing)
+        declared_keys = {_index_key(keys) for keys, _ in declared} | {(("_id", 1),)}
+        for key, info in existing.items():
+            if key not in declared_keys:
+                logger.info("Undeclared index %s.%s (left in place).", collection, info["name"])
+    return created
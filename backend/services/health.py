@@ -0,0 +1,133 @@
+"""
+Health and readiness — dependency state behind /health and /ready.
+
+Startup never waits on the database: index reconciliation runs as a background
+task that retries with backoff until it succeeds, and /ready reports 503
+until it has.
+
+Deep checks (database `ping`, LLM provider reachability) run on their own
+interval in a background task and are cached with timestamps, so /health
+answers from memory no matter how often an orchestrator probes it.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict
+
+import aiohttp
+
+from config import get_settings
+from services.circuit_breaker import OPEN, breaker_states
+from services.db_service import ensure_indexes, get_db
+from services.llm_clients import get_session
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+DATABASE = settings.storage_backend  # check name: mongodb | sqlite
+
+# dependency → ready?
+_ready: Dict[str, bool] = {DATABASE: False, "indexes": False}
+# dependency → last probe result
+_checks: Dict[str, Dict[str, Any]] = {}
+_tasks: set = set()
+
+
+async def _reconcile_indexes() -> None:
+    delay = 1.0
+    while True:
+        try:
+            created = await asyncio.to_thread(ensure_indexes)
+            _ready[DATABASE] = _ready["indexes"] = True
+            logger.info("Database indexes reconciled (%d created).", len(created))
+            return
+        except Exception as exc:
+            logger.warning("Index reconciliation failed, retrying in %.0fs: %s", delay, exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+
+
+# ── Deep probes ───────────────────────────────────────────────
+
+async def _probe_database() -> None:
+    await asyncio.to_thread(get_db().command, "ping")
+
+
+async def _probe_http(url: str, headers: Dict[str, str] | None = None) -> None:
+    # Through the shared provider pool, which also keeps its connections warm
+    timeout = aiohttp.ClientTimeout(total=settings.health_probe_timeout_s)
+    async with get_session().get(url, headers=headers, timeout=timeout) as resp:
+        if resp.status >= 500 or resp.status in (401, 403):
+            raise RuntimeError(f"HTTP {resp.status}")
+
+
+def _probes() -> Dict[str, Callable[[], Awaitable[None]]]:
+    probes: Dict[str, Callable[[], Awaitable[None]]] = {DATABASE: _probe_database}
+    if settings.gemini_api_key:
+        probes["gemini"] = lambda: _probe_http(
+            f"https://generativelanguage.googleapis.com/v1beta/models?pageSize=1&key={settings.gemini_api_key}"
+        )
+    if settings.hf_api_token:
+        probes["huggingface"] = lambda: _probe_http(
+            f"https://huggingface.co/api/models/{settings.hf_model}",
+            {"Authorization": f"Bearer {settings.hf_api_token}"},
+        )
+    return probes
+
+
+async def _run_probe(name: str, probe: Callable[[], Awaitable[None]]) -> None:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(probe(), timeout=settings.health_probe_timeout_s)
+        result: Dict[str, Any] = {"ok": True}
+    except Exception as exc:
+        result = {"ok": False, "error": f"{type(exc).__name__}: {exc}"[:200]}
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    result["checked_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    _checks[name] = result
+    if name == DATABASE:
+        _ready[DATABASE] = result["ok"]
+
+
+async def _probe_loop() -> None:
+    while True:
+        await asyncio.gather(*(_run_probe(n, p) for n, p in _probes().items()))
+        await asyncio.sleep(settings.health_probe_interval_s)
+
+
+# ── Lifecycle ─────────────────────────────────────────────────
+
+def _spawn(coro) -> None:
+    task = asyncio.get_running_loop().create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def start_background_checks() -> None:
+    """Kick off startup work and probes that must not block the worker from booting."""
+    _spawn(_reconcile_indexes())
+    _spawn(_probe_loop())
+
+
+def stop_background_checks() -> None:
+    for task in list(_tasks):
+        task.cancel()
+
+
+def readiness() -> Dict[str, Any]:
+    return {"ready": all(_ready.values()), "checks": dict(_ready)}
+
+
+def health_report() -> Dict[str, Any]:
+    """Cached deep-check results and provider circuit states; never performs I/O."""
+    checks = dict(_checks)
+    breakers = breaker_states()
+    db_ok = checks.get(DATABASE, {}).get("ok", False)
+    providers_ok = (all(c["ok"] for n, c in checks.items() if n != DATABASE)
+                    and all(b["state"] != OPEN for b in breakers.values()))
+    return {
+        "status": "ok" if db_ok and providers_ok else ("degraded" if db_ok else "unavailable"),
+        "checks": checks,
+        "circuits": breakers,
+    }
@@ -0,0 +1,83 @@
+"""
+Hedged requests — a second provider races the first once it runs slow.
+
+    hedge = Hedge("generate")
+    result, index = await hedge.run(call_primary, call_secondary)
+
+The primary starts alone. If it has not returned within the hedge delay —
+the LLM_HEDGE_PERCENTILE of its recent successful latencies, clamped to
+[LLM_HEDGE_MIN_DELAY_S, LLM_HEDGE_MAX_DELAY_S] — the secondary starts too, the
+first valid result wins and the other call is cancelled. A primary that fails
+early hands over to the secondary straight away, as the plain fallback did.
+
+Outcomes are counted in llm_hedge_total (not_needed, primary_won,
+secondary_won, fallback, failed) and the current delay is exported as
+llm_hedge_delay_seconds, so hedge rate can be weighed against the tail.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Tuple
+
+from config import get_settings
+from services.metrics import llm_hedge_delay, llm_hedges
+from services.tracing import current_span
+
+settings = get_settings()
+
+MIN_SAMPLES = 20  # below this the delay stays at LLM_HEDGE_MAX_DELAY_S
+
+
+class Hedge:
+    def __init__(self, task: str):
+        self.task = task
+        self._latencies: deque = deque(maxlen=settings.llm_hedge_window)
+
+    def delay(self) -> float:
+        if len(self._latencies) < MIN_SAMPLES:
+            delay = settings.llm_hedge_max_delay_s
+        else:
+            ranked = sorted(self._latencies)
+            delay = ranked[max(math.ceil(settings.llm_hedge_percentile / 100 * len(ranked)) - 1, 0)]
+            delay = min(max(delay, settings.llm_hedge_min_delay_s), settings.llm_hedge_max_delay_s)
+        llm_hedge_delay.set(delay, self.task)
+        return delay
+
+    async def run(self, primary: Callable[[], Awaitable[Any]],
+                  secondary: Callable[[], Awaitable[Any]]) -> Tuple[Any, int]:
+        """Result of whichever call wins, and its index (0 primary, 1 secondary). Raises the last error if both fail."""
+        start = time.perf_counter()
+        first = asyncio.ensure_future(primary())
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.delay())
+            if done and first.exception() is None:
+                self._latencies.append(time.perf_counter() - start)
+                llm_hedges.inc(self.task, "not_needed")
+                return first.result(), 0
+            if done:
+                llm_hedges.inc(self.task, "fallback")
+                return await secondary(), 1
+
+            tasks.append(asyncio.ensure_future(secondary()))
+            span = current_span()
+            if span is not None:
+                span.set(hedged=True)
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        index = tasks.index(task)
+                        if index == 0:
+                            self._latencies.append(time.perf_counter() - start)
+                        llm_hedges.inc(self.task, "secondary_won" if index else "primary_won")
+                        return task.result(), index
+                    error = task.exception()
+            llm_hedges.inc(self.task, "failed")
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
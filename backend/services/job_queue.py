@@ -0,0 +1,180 @@
+"""
+Generation job queue — POST /generate/jobs hands the LLM round trip to a
+bounded pool of workers instead of holding the request open.
+
+Jobs live in the `generation_jobs` collection (MongoDB or SQLite, via
+db_service), so they survive restarts. Each worker claims the oldest queued
+job under a lease that it renews while the job runs. If a worker dies, its
+lease runs out and another worker picks the job up again, up to
+JOB_MAX_ATTEMPTS times. Every claim leases under its own owner token, so a
+worker that lost its lease cannot renew or finish the job, not even when the
+new owner is another worker in the same process. A worker that is shut
+down hands its job straight back to the queue.
+
+At most JOB_WORKERS generations run per process, and submissions are refused
+once JOB_QUEUE_MAX jobs are waiting. Queue depth, wait time and run time are
+exported as metrics.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from config import get_settings
+from services.db_service import (
+    claim_job, count_jobs, create_job, finish_job, purge_expired_jobs, renew_job_lease, save_generation,
+)
+from services.llm_service import generate_production
+from services.metrics import job_duration, job_queue_depth, job_wait, job_workers_busy
+from services.tracing import span
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+LEASE = timedelta(seconds=settings.job_lease_s)
+RETENTION = timedelta(seconds=settings.job_retention_s)
+DEPTH_INTERVAL_S = 15.0
+_owner = f"{os.uname().nodename}:{os.getpid()}"
+_tasks: set = set()
+_wake: Optional[asyncio.Event] = None
+_busy = 0
+
+
+class QueueFull(Exception):
+    """JOB_QUEUE_MAX jobs are already waiting."""
+
+
+def submit(user_id: str, project_id: str, story: str, bypass_cache: bool) -> dict:
+    """Queue a generation; raises QueueFull when the backlog is at its limit."""
+    if count_jobs("queued") >= settings.job_queue_max:
+        raise QueueFull()
+    job = create_job(user_id, project_id, story, bypass_cache)
+    if _wake is not None:
+        _wake.set()  # an idle worker in this process starts now rather than at its next poll
+    return job
+
+
+# ── Workers ───────────────────────────────────────────────────
+
+def _claim_owner() -> str:
+    return f"{_owner}:{uuid.uuid4().hex[:12]}"
+
+
+async def _worker() -> None:
+    while True:
+        _wake.clear()
+        try:
+            job = await asyncio.to_thread(claim_job, _claim_owner(), LEASE)
+        except Exception as exc:
+            logger.warning("Could not claim a generation job: %s", exc)
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(_wake.wait(), timeout=settings.job_poll_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await _run(job)
+
+
+async def _run(job: dict) -> None:
+    global _busy
+    job_id, owner = job["id"], job["lease_owner"]
+    if job["attempts"] > settings.job_max_attempts:
+        logger.warning("Generation job %s gave up after %d attempts.", job_id, job["attempts"] - 1)
+        await asyncio.to_thread(finish_job, job_id, owner, {"status": "failed", "error": "Too many attempts."},
+                                RETENTION)
+        return
+
+    created = job["created_at"]
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    job_wait.observe((datetime.now(timezone.utc) - created).total_seconds())
+    _busy += 1
+    job_workers_busy.set(_busy)
+    heartbeat = asyncio.get_running_loop().create_task(_heartbeat(job_id, owner))
+    start = time.perf_counter()
+    outcome = "failed"
+    try:
+        with span("job.generate", job_id=job_id, attempt=job["attempts"]):
+            result, provider = await generate_production(job["story"], bypass_cache=job.get("bypass_cache", False))
+            saved = await asyncio.to_thread(save_generation, job["project_id"], {
+                "story_input":  job["story"],
+                "screenplay":   result.get("screenplay", ""),
+                "shot_design":  result.get("shot_design", []),
+                "sound_design": result.get("sound_design", []),
+                "provider":     provider,
+            })
+        outcome = "done"
+        fields = {"status": "done", "generation_id": saved["id"], "provider": provider, "error": None}
+        retention = RETENTION
+    except asyncio.CancelledError:
+        # Shutting down: put the job back rather than waiting out the lease
+        outcome = "requeued"
+        finish_job(job_id, owner, {"status": "queued", "attempts": job["attempts"] - 1})
+        raise
+    except Exception as exc:
+        logger.error("Generation job %s failed (attempt %d): %s", job_id, job["attempts"], exc)
+        retry = job["attempts"] < settings.job_max_attempts
+        fields = {"status": "queued" if retry else "failed", "error": "Generation failed."}
+        retention = None if retry else RETENTION
+        outcome = "retried" if retry else "failed"
+    finally:
+        heartbeat.cancel()
+        _busy -= 1
+        job_workers_busy.set(_busy)
+        job_duration.observe(time.perf_counter() - start, outcome)
+
+    if not await asyncio.to_thread(finish_job, job_id, owner, fields, retention):
+        logger.warning("Lost the lease on generation job %s; another worker took it over.", job_id)
+
+
+async def _heartbeat(job_id: str, owner: str) -> None:
+    while True:
+        await asyncio.sleep(LEASE.total_seconds() / 3)
+        try:
+            if not await asyncio.to_thread(renew_job_lease, job_id, owner, LEASE):
+                logger.warning("Generation job %s lease could not be renewed.", job_id)
+                return
+        except Exception as exc:
+            logger.warning("Generation job %s lease renewal failed: %s", job_id, exc)
+
+
+async def _track_depth() -> None:
+    while True:
+        try:
+            for status in ("queued", "running"):
+                job_queue_depth.set(await asyncio.to_thread(count_jobs, status), status)
+            await asyncio.to_thread(purge_expired_jobs)
+        except Exception as exc:
+            logger.debug("Job queue depth unavailable: %s", exc)
+        await asyncio.sleep(DEPTH_INTERVAL_S)
+
+
+# ── Lifecycle ─────────────────────────────────────────────────
+
+def _spawn(coro) -> None:
+    task = asyncio.get_running_loop().create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def start_job_workers() -> None:
+    global _wake
+    if _tasks or settings.job_workers <= 0:
+        return
+    _wake = asyncio.Event()
+    for _ in range(settings.job_workers):
+        _spawn(_worker())
+    _spawn(_track_depth())
+
+
+async def stop_job_workers() -> None:
+    """Cancel the workers; jobs they were running go back to the queue."""
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,206 @@
+"""
+Tolerant JSON parsing for LLM output.
+
+    salvage = repair(raw)
+    salvage.data        # the object, as much of it as could be recovered
+    salvage.repairs     # defects fixed: trailing_comma, missing_comma, literal, truncated
+    salvage.open_key    # top-level key whose value truncation cut off, if any
+
+Well-formed output takes the json.loads fast path; anything before the first
+`{` (prose, a markdown fence) and after the object is ignored. Otherwise one
+pass over the text rewrites it: trailing commas are dropped, missing commas
+between values inserted, Python literals (True/False/None) translated, raw
+control characters inside strings tolerated. If the text ends early, it is cut
+back to the last complete top-level value or element of a top-level list — a
+finished scene — and the open containers are closed. A scene cut off halfway
+is dropped whole rather than kept with its remaining fields missing.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_decoder = json.JSONDecoder(strict=False)
+_LITERAL = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null|True|False|None")
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class Salvage:
+    def __init__(self, data: Dict[str, Any], repairs: List[str], open_key: Optional[str] = None):
+        self.data = data
+        self.repairs = repairs
+        self.open_key = open_key  # top-level key whose value was cut off
+
+    @property
+    def truncated(self) -> bool:
+        return "truncated" in self.repairs
+
+
+def repair(raw: str) -> Salvage:
+    """Parse the first JSON object in `raw`, repairing what it can. ValueError if nothing is recoverable."""
+    start = raw.find("{")
+    if start < 0:
+        raise ValueError("No JSON object found in LLM response.")
+    text = raw[start:]
+    try:
+        data, _ = _decoder.raw_decode(text)
+        return Salvage(data, [])
+    except json.JSONDecodeError:
+        pass
+    return _Scanner(text).run()
+
+
+class _Scanner:
+    """
+    Re-emits `text` token by token. Each stack frame is [bracket, state] where
+    state is key | colon | value | after (a value just completed).
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.out: List[str] = []
+        self.stack: List[List[str]] = []
+        self.repairs: List[str] = []
+        self.pending_comma = False
+        self.top_key: Optional[str] = None
+        # Last point where cutting and closing the open containers gives valid JSON
+        self.cut = 0
+        self.cut_stack: List[str] = []
+        self.cut_key: Optional[str] = None
+
+    def run(self) -> Salvage:
+        text, n, i = self.text, len(self.text), 0
+        while i < n:
+            c = text[i]
+            if c in " \t\r\n":
+                self.out.append(c)
+                i += 1
+            elif c == '"':
+                end = _string_end(text, i)
+                if end < 0:
+                    break
+                if not self._string(text[i:end + 1]):
+                    break
+                i = end + 1
+            elif c == ":":
+                if not self.stack or self.stack[-1] != ["{", "colon"]:
+                    break
+                self.stack[-1][1] = "value"
+                self.out.append(c)
+                i += 1
+            elif c == ",":
+                if not self.stack or self.stack[-1][1] != "after":
+                    break
+                self.pending_comma = True  # emitted only if another value follows
+                self.stack[-1][1] = "key" if self.stack[-1][0] == "{" else "value"
+                i += 1
+            elif c in "{[":
+                if not self._begin_value():
+                    break
+                self.out.append(c)
+                self.stack.append([c, "key" if c == "{" else "value"])
+                if c == "[" and len(self.stack) == 2:
+                    self._mark_cut()  # an empty list is a fine stub; an empty object is not
+                i += 1
+            elif c in "}]":
+                if not self.stack or _CLOSERS[self.stack[-1][0]] != c or self.stack[-1][1] in ("colon", "value") and c == "}":
+                    break  # mismatched bracket, or a key without its value
+                if self.pending_comma:
+                    self.pending_comma = False
+                    self._note("trailing_comma")
+                self.stack.pop()
+                self.out.append(c)
+                i += 1
+                if not self.stack:
+                    return self._result(complete=True)
+                self._end_value()
+            else:
+                match = _LITERAL.match(text, i)
+                if not match or match.end() >= n or not self._begin_value():
+                    break
+                literal = match.group(0)
+                if literal in _PYTHON_LITERALS:
+                    literal = _PYTHON_LITERALS[literal]
+                    self._note("literal")
+                self.out.append(literal)
+                i = match.end()
+                self._end_value()
+        return self._result(complete=False)
+
+    def _string(self, token: str) -> bool:
+        frame = self.stack[-1] if self.stack else None
+        if frame == ["{", "after"]:
+            self.out.append(",")
+            self._note("missing_comma")
+            frame[1] = "key"
+        if frame == ["{", "key"]:
+            self._flush_comma()
+            if len(self.stack) == 1:
+                self.top_key = _decoder.decode(token)
+            frame[1] = "colon"
+            self.out.append(token)
+            return True
+        if not self._begin_value():
+            return False
+        self.out.append(token)
+        self._end_value()
+        return True
+
+    def _begin_value(self) -> bool:
+        """Emit whatever must precede a value here; False if no value is allowed."""
+        if not self.stack:
+            return not self.out
+        frame = self.stack[-1]
+        if frame[1] == "after" and frame[0] == "[":
+            self.out.append(",")
+            self._note("missing_comma")
+            return True
+        if frame[1] != "value":
+            return False
+        self._flush_comma()
+        return True
+
+    def _end_value(self) -> None:
+        self.stack[-1][1] = "after"
+        # Only whole values of the root object, or whole elements of its lists, are kept
+        if len(self.stack) == 1 or (len(self.stack) == 2 and self.stack[1][0] == "["):
+            self._mark_cut()
+
+    def _flush_comma(self) -> None:
+        if self.pending_comma:
+            self.out.append(",")
+            self.pending_comma = False
+
+    def _mark_cut(self) -> None:
+        self.cut = len(self.out)
+        self.cut_stack = [frame[0] for frame in self.stack]
+        self.cut_key = self.top_key if len(self.stack) > 1 else None
+
+    def _note(self, defect: str) -> None:
+        if defect not in self.repairs:
+            self.repairs.append(defect)
+
+    def _result(self, complete: bool) -> Salvage:
+        if complete:
+            text = "".join(self.out)
+            return Salvage(_decoder.decode(text), self.repairs)
+        if not self.cut_stack:
+            raise ValueError("LLM response ended before any JSON value was complete.")
+        self._note("truncated")
+        text = "".join(self.out[:self.cut]) + "".join(_CLOSERS[b] for b in reversed(self.cut_stack))
+        return Salvage(_decoder.decode(text), self.repairs, open_key=self.cut_key)
+
+
+def _string_end(text: str, start: int) -> int:
+    """Index of the quote closing the string opened at `start`, or -1 if the text ends first."""
+    i = start + 1
+    while True:
+        i = text.find('"', i)
+        if i < 0:
+            return -1
+        backslashes = 0
+        while text[i - 1 - backslashes] == "\\":
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return i
+        i += 1
@@ -0,0 +1,146 @@
+"""
+Incremental parser for a production package arriving as streamed JSON text.
+
+    parser = PackageStreamParser()
+    for chunk in chunks:
+        for event, value in parser.feed(chunk):
+            ...  # ("screenplay", "new text") / ("shot_design", {...}) / ("sound_design", {...})
+
+The parser scans each character once, tracking string/escape state and the
+container stack. It emits the `screenplay` string as decoded deltas while it
+grows, and every element of `shot_design` / `sound_design` the moment its
+closing brace arrives. Anything before the first `{` (a markdown fence) is
+skipped.
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+SCENE_KEYS = ("shot_design", "sound_design")
+STREAMED_STRING_KEYS = ("screenplay",)
+
+Event = Tuple[str, Any]
+
+
+class PackageStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False        # next string at depth 1 is a key
+        self._key: Optional[str] = None  # current key at depth 1
+        self._value_string: Optional[str] = None  # streamed key whose string value is open
+        self._emitted = 0               # raw offset of the streamed string already emitted
+        self._last_escape = -1          # offset of the latest backslash escape in the buffer
+        self._element_start: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return self.buffer
+
+    def feed(self, chunk: str) -> List[Event]:
+        self.buffer += chunk
+        events: List[Event] = []
+        buf = self.buffer
+        i = self.pos
+        n = len(buf)
+
+        if not self.started:
+            start = buf.find("{", i)
+            if start < 0:
+                self.pos = n
+                return events
+            self.started = True
+            i = start
+
+        while i < n and not self.done:
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                    self._last_escape = i
+                elif c == '"':
+                    self._in_string = False
+                    self._end_string(i, events)
+                i += 1
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i + 1
+                if len(self._stack) == 1 and not self._expect_key and self._key in STREAMED_STRING_KEYS:
+                    self._value_string = self._key
+                    self._emitted = i + 1
+            elif c in "{[":
+                if (c == "{" and len(self._stack) == 2 and self._stack[1] == "["
+                        and self._key in SCENE_KEYS):
+                    self._element_start = i
+                self._stack.append(c)
+                if c == "{" and len(self._stack) == 1:
+                    self._expect_key = True
+            elif c in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if c == "}" and len(self._stack) == 2 and self._element_start is not None:
+                    self._emit_element(buf[self._element_start:i + 1], events)
+                    self._element_start = None
+                if not self._stack:
+                    self.done = True
+            elif c == "," and len(self._stack) == 1:
+                self._expect_key = True
+            i += 1
+
+        self.pos = i
+        if self._in_string and self._value_string is not None:
+            self._emit_string_delta(i, partial=True, events=events)
+        return events
+
+    def _end_string(self, end: int, events: List[Event]) -> None:
+        if len(self._stack) == 1 and self._expect_key:
+            self._key = json.loads(self.buffer[self._string_start - 1:end + 1], strict=False)
+            self._expect_key = False
+        elif self._value_string is not None:
+            self._emit_string_delta(end, partial=False, events=events)
+            self._value_string = None
+
+    def _emit_string_delta(self, end: int, partial: bool, events: List[Event]) -> None:
+        if partial:
+            end = self._safe_end(end)
+        raw = self.buffer[self._emitted:end]
+        if not raw:
+            return
+        try:
+            delta = json.loads(f'"{raw}"', strict=False)  # models sometimes emit raw newlines
+        except json.JSONDecodeError:
+            return  # malformed escape; the final parse will deal with it
+        self._emitted += len(raw)
+        events.append((self._value_string, delta))
+
+    def _safe_end(self, end: int) -> int:
+        """Pull `end` back before an escape the next chunk may still complete."""
+        start = self._last_escape
+        if start < self._emitted:
+            return end
+        tail = self.buffer[start:end]
+        if tail == "\\" or (tail.startswith("\\u") and len(tail) < 6) or (len(tail) == 6 and _high_surrogate(tail)):
+            end = start
+        # Keep a surrogate pair together
+        if end == start and start >= 6 and _high_surrogate(self.buffer[start - 6:start]):
+            end = start - 6
+        return max(end, self._emitted)
+
+    def _emit_element(self, text: str, events: List[Event]) -> None:
+        try:
+            events.append((self._key, json.loads(text, strict=False)))
+        except json.JSONDecodeError:
+            pass  # the final parse decides what to keep
+
+
+def _high_surrogate(escape: str) -> bool:
+    return escape[:2] == "\\u" and escape[2:3] in "dD" and escape[3:4] in "89abAB"
@@ -0,0 +1,162 @@
+"""
+LLM response cache — an in-process LRU in front of a persistent store.
+
+Keys hash everything that determines a response: the normalized input,
+action and tone, the configured providers and models, and a fingerprint of
+the prompt text, so editing a prompt or switching models invalidates old
+entries by itself. Values are kept as JSON bytes: one serialization on
+write, a private copy for every reader, and an exact size for eviction.
+
+  memory  LRU bounded by LLM_CACHE_MEMORY_BYTES, entries expire after LLM_CACHE_TTL_S
+  store   `llm_cache` collection (Mongo or SQLite, whichever db_service uses);
+          TTL index on expires_at, trimmed to LLM_CACHE_MAX_ENTRIES newest
+
+Store I/O runs in a worker thread, and any store failure is a cache miss —
+the cache can slow nothing down and break nothing.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Optional, Tuple
+
+import orjson
+
+from config import get_settings
+from services.db_service import get_db
+from services.metrics import llm_cache_requests
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PRUNE_EVERY = 100  # store writes between trims
+
+_memory: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()  # key → (expires at, value)
+_memory_bytes = 0
+_writes = 0
+
+
+def normalize_story(story: str) -> str:
+    return " ".join(story.split())
+
+
+def normalize_script(script: str) -> str:
+    """Line endings and trailing whitespace don't change a screenplay; indentation does."""
+    return "\n".join(line.rstrip() for line in script.replace("\r\n", "\n").split("\n")).strip("\n")
+
+
+def prompt_version(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()[:12]
+
+
+def cache_key(kind: str, *parts: str) -> str:
+    h = hashlib.sha256(kind.encode())
+    for part in parts:
+        h.update(b"\0" + part.encode())
+    return h.hexdigest()
+
+
+# ── Memory tier ───────────────────────────────────────────────
+
+def _memory_get(key: str) -> Optional[bytes]:
+    entry = _memory.get(key)
+    if entry is None:
+        return None
+    expires, value = entry
+    if expires < time.time():
+        _memory_drop(key)
+        return None
+    _memory.move_to_end(key)
+    return value
+
+
+def _memory_put(key: str, value: bytes, expires: float) -> None:
+    global _memory_bytes
+    if len(value) > settings.llm_cache_memory_bytes:
+        return
+    _memory_drop(key)
+    _memory[key] = (expires, value)
+    _memory_bytes += len(value)
+    while _memory_bytes > settings.llm_cache_memory_bytes:
+        _memory_drop(next(iter(_memory)))
+
+
+def _memory_drop(key: str) -> None:
+    global _memory_bytes
+    entry = _memory.pop(key, None)
+    if entry is not None:
+        _memory_bytes -= len(entry[1])
+
+
+# ── Store tier ────────────────────────────────────────────────
+
+def _store_get(key: str) -> Optional[Tuple[float, bytes]]:
+    doc = get_db().llm_cache.find_one({"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+    if doc is None:
+        return None
+    expires = doc["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+    return expires, doc["value"].encode()
+
+
+def _store_put(key: str, kind: str, value: bytes, expires: float) -> None:
+    global _writes
+    coll = get_db().llm_cache
+    now = datetime.now(timezone.utc)
+    coll.update_one(
+        {"_id": key},
+        {"$set": {
+            "kind": kind,
+            "value": value.decode(),  # a string, so any keys the model emits are storable
+            "size": len(value),
+            "created_at": now,
+            "expires_at": datetime.fromtimestamp(expires, timezone.utc),
+        }},
+        upsert=True,
+    )
+    _writes += 1
+    if _writes % PRUNE_EVERY == 0:
+        coll.delete_many({"expires_at": {"$lt": now}})  # Mongo's TTL monitor does this too; SQLite has none
+        overflow = [d["_id"] for d in coll.find({}, {"_id": 1}).sort("created_at", -1).skip(settings.llm_cache_max_entries)]
+        if overflow:
+            coll.delete_many({"_id": {"$in": overflow}})
+
+
+# ── API ───────────────────────────────────────────────────────
+
+async def get(kind: str, key: str, bypass: bool = False) -> Optional[Any]:
+    """Cached value for `key`, or None. `bypass` skips the lookup (the fresh result is still stored)."""
+    if not settings.llm_cache_enabled:
+        return None
+    if bypass:
+        llm_cache_requests.inc(kind, "bypass")
+        return None
+    value = _memory_get(key)
+    if value is not None:
+        llm_cache_requests.inc(kind, "memory_hit")
+        return orjson.loads(value)
+    try:
+        stored = await asyncio.to_thread(_store_get, key)
+    except Exception as exc:
+        logger.warning("LLM cache store read failed: %s", exc)
+        stored = None
+    if stored is None:
+        llm_cache_requests.inc(kind, "miss")
+        return None
+    llm_cache_requests.inc(kind, "store_hit")
+    _memory_put(key, stored[1], stored[0])
+    return orjson.loads(stored[1])
+
+
+async def put(kind: str, key: str, value: Any) -> None:
+    if not settings.llm_cache_enabled:
+        return
+    data = orjson.dumps(value)
+    expires = time.time() + settings.llm_cache_ttl_s
+    _memory_put(key, data, expires)
+    try:
+        await asyncio.to_thread(_store_put, key, kind, data, expires)
+    except Exception as exc:
+        logger.warning("LLM cache store write failed: %s", exc)
+
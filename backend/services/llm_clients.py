@@ -0,0 +1,95 @@
+"""
+LLM provider clients — one pooled HTTP session and SDK executor per worker.
+
+Opened at startup and closed at shutdown, so provider calls reuse warm
+keep-alive connections instead of paying DNS + TCP + TLS per request:
+
+  - `get_session()`: shared aiohttp session over a bounded TCPConnector
+    (LLM_POOL_SIZE total, LLM_POOL_PER_HOST per provider, DNS cached)
+  - `sdk_executor()`: dedicated, bounded thread pool for the blocking Gemini SDK
+  - `gemini_model()`: SDK configured once, GenerativeModel built once
+
+New vs reused connections are counted in `llm_http_connections_total`.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from config import get_settings
+from services.metrics import llm_http_connections
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_session: Optional[aiohttp.ClientSession] = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        ctx.host = urlsplit(str(params.url)).hostname or ""
+
+    async def on_connection_create_end(session, ctx, params):
+        llm_http_connections.inc(getattr(ctx, "host", ""), "new")
+
+    async def on_connection_reuseconn(session, ctx, params):
+        llm_http_connections.inc(getattr(ctx, "host", ""), "reused")
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace
+
+
+def _open_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=settings.llm_pool_size,
+        limit_per_host=settings.llm_pool_per_host,
+        keepalive_timeout=settings.llm_keepalive_s,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(connector=connector, trace_configs=[_trace_config()])
+
+
+def get_session() -> aiohttp.ClientSession:
+    """The shared session; opened on first use if startup hasn't run (scripts, benchmarks)."""
+    global _session
+    if _session is None or _session.closed:
+        _session = _open_session()
+    return _session
+
+
+def sdk_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.llm_sdk_workers, thread_name_prefix="gemini-sdk")
+    return _executor
+
+
+@lru_cache()
+def gemini_model():
+    import google.generativeai as genai
+
+    genai.configure(api_key=settings.gemini_api_key)
+    return genai.GenerativeModel(settings.gemini_model)
+
+
+async def start_llm_clients() -> None:
+    get_session()
+    sdk_executor()
+
+
+async def close_llm_clients() -> None:
+    global _session, _executor
+    if _session is not None:
+        await _session.close()
+        _session = None
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
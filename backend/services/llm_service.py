@@ -2,23 +2,39 @@
 LLM Service — Google Gemini (primary) with template fallback.
 Generates screenplay, shot design, and sound design from a story premise.
 """
+import asyncio
+import contextlib
 import json
 import logging
 import re
-from typing import Tuple, Dict, Any
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Tuple
+
+import aiohttp
+from pydantic import ValidationError
 
 from config import get_settings
+from models.generation import GenerationResult, ShotGroup, SoundScene
+from services import json_repair, llm_cache
+from services.circuit_breaker import ProviderError, ProviderUnavailable, backoff, get_breaker, retry_after
+from services.hedging import Hedge
+from services.json_stream import PackageStreamParser
+from services.llm_clients import gemini_model, get_session, sdk_executor
+from services.metrics import llm_json_repairs, llm_request_duration, llm_retries, llm_time_to_first_content
+from services.singleflight import SingleFlight
+from services.tracing import run_in_executor, span, traced
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-SYSTEM_PROMPT = """You are CineForge AI, an expert cinematic pre-production assistant.
-Given a story premise, generate a complete production package in valid JSON with this exact structure:
+# Identical concurrent requests (same cache key) share one provider call
+_generate_flights = SingleFlight("generate")
+_edit_flights = SingleFlight("edit")
+# A slow primary provider is raced against the next one
+_generate_hedge = Hedge("generate")
 
-{
-  "screenplay": "<Full screenplay in standard format: INT/EXT., action lines, dialogue>",
-  "shot_design": [
-    {
+# One scene of each section; SYSTEM_PROMPT asks for lists of them, SCENE_PROMPT for one
+SHOT_GROUP_SCHEMA = """    {
       "id": "scene-01",
       "scene_title": "Scene title",
       "shots": [
@@ -34,10 +50,9 @@ Given a story premise, generate a complete production package in valid JSON with
           "notes": "Optional director note"
         }
       ]
-    }
-  ],
-  "sound_design": [
-    {
+    }"""
+
+SOUND_SCENE_SCHEMA = """    {
       "scene_id": "scene-01",
       "scene_title": "Scene title",
       "time_of_day": "Dawn / Morning / Afternoon / Dusk / Night",
@@ -56,44 +71,85 @@ Given a story premise, generate a complete production package in valid JSON with
         "treatment": "e.g. Close-mic, intimate",
         "notes": "Any additional dialogue audio notes"
       }
+    }"""
+
+SYSTEM_PROMPT = f"""You are CineForge AI, an expert cinematic pre-production assistant.
+Given a story premise, generate a complete production package in valid JSON with this exact structure:
+
+{{
+  "screenplay": "<Full screenplay in standard format: INT/EXT., action lines, dialogue>",
+  "shot_design": [
+{SHOT_GROUP_SCHEMA}
+  ],
+  "sound_design": [
+{SOUND_SCENE_SCHEMA}
+  ]
+}}
+
+Return ONLY the JSON. No markdown code fences. No explanation."""
+
+# Scene-keyed sections of the package, with the field that identifies each scene and its model
+SECTION_IDS = {"shot_design": "id", "sound_design": "scene_id"}
+SECTION_MODELS = {"shot_design": ShotGroup, "sound_design": SoundScene}
+SCENE_ATTEMPTS = 2  # pipeline mode: tries per scene before a design that will not parse or validate is left out
+
+CONTINUATION_PROMPT = """Your previous answer was cut off. The screenplay is final:
+
+{screenplay}
+
+Return ONLY a JSON object with the keys {keys}, using the structure above.
+{done}"""
+
+# Pipeline mode (GENERATION_MODE=pipeline): an outline call, then one call per scene
+OUTLINE_PROMPT = """You are CineForge AI, an expert cinematic pre-production assistant.
+Given a story premise, write the screenplay and list its scenes in valid JSON with this exact structure:
+
+{
+  "screenplay": "<Full screenplay in standard format: INT/EXT., action lines, dialogue>",
+  "scenes": [
+    {
+      "id": "scene-01",
+      "scene_title": "Scene title",
+      "heading": "INT. LOCATION - DAY",
+      "time_of_day": "Dawn / Morning / Afternoon / Dusk / Night"
     }
   ]
 }
 
-Return ONLY the JSON. No markdown code fences. No explanation."""
+List every scene of the screenplay, in order. Return ONLY the JSON. No markdown code fences. No explanation."""
+
+SCENE_PROMPT = f"""You are CineForge AI, an expert cinematic pre-production assistant.
+Design the shots and the sound for ONE scene of the screenplay below, in valid JSON with this exact structure:
+
+{{
+  "shot_design":
+{SHOT_GROUP_SCHEMA},
+  "sound_design":
+{SOUND_SCENE_SCHEMA}
+}}
+
+Use the scene id and title you are given. Return ONLY the JSON. No markdown code fences. No explanation."""
 
 
 def build_user_prompt(story: str) -> str:
     return f"Story premise:\n\n{story}\n\nGenerate the full production package:"
 
 
-async def _call_gemini(story: str) -> Dict[str, Any]:
-    """Call Gemini API using google-generativeai SDK."""
-    try:
-        import google.generativeai as genai
-        genai.configure(api_key=settings.gemini_api_key)
-        model = genai.GenerativeModel(settings.gemini_model)
-        prompt = f"{SYSTEM_PROMPT}\n\n{build_user_prompt(story)}"
-        import asyncio
-        response = await asyncio.get_event_loop().run_in_executor(
-            None, lambda: model.generate_content(prompt)
-        )
-        return _parse_json(response.text)
-    except Exception as exc:
-        logger.warning("Gemini genai SDK failed: %s. Trying REST API.", exc)
-        # Fallback: use REST API directly
-        return await _call_gemini_rest(story)
+def _gemini_url(method: str, query: str = "") -> str:
+    """REST endpoint for GEMINI_MODEL, which may be given with or without its `models/` prefix."""
+    model = settings.gemini_model if settings.gemini_model.startswith("models/") else f"models/{settings.gemini_model}"
+    return f"https://generativelanguage.googleapis.com/v1beta/{model}:{method}?{query}key={settings.gemini_api_key}"
 
 
-async def _call_gemini_rest(story: str) -> Dict[str, Any]:
-    """Fallback: Call Gemini via REST API directly (no SDK issues)."""
-    import aiohttp
+def _production_prompt(story: str) -> str:
+    return f"{SYSTEM_PROMPT}\n\n{build_user_prompt(story)}"
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/{settings.gemini_model}:generateContent?key={settings.gemini_api_key}"
-    payload = {
+
+def _gemini_payload(prompt: str) -> Dict[str, Any]:
+    return {
         "contents": [{
             "parts": [{
-                "text": f"{SYSTEM_PROMPT}\n\n{build_user_prompt(story)}"
+                "text": prompt
             }]
         }],
         "generationConfig": {
@@ -102,43 +158,106 @@ async def _call_gemini_rest(story: str) -> Dict[str, Any]:
         }
     }
 
-    timeout = aiohttp.ClientTimeout(total=120)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        async with session.post(url, json=payload) as resp:
-            if resp.status != 200:
+
+async def _post_json(provider: str, url: str, payload: Dict[str, Any], timeout_s: float,
+                     headers: Dict[str, str] | None = None) -> Any:
+    """
+    POST to a provider through its circuit breaker. 429/5xx responses and
+    connection errors are retried with jittered exponential backoff, or after
+    the provider's Retry-After when it sends one it is worth waiting for.
+    """
+    breaker = get_breaker(provider)
+    timeout = aiohttp.ClientTimeout(total=timeout_s)
+    attempt = 0
+    while True:
+        breaker.allow()
+        start = time.perf_counter()
+        try:
+            async with get_session().post(url, headers=headers, json=payload, timeout=timeout) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    breaker.record(True, time.perf_counter() - start)
+                    return data
                 text = await resp.text()
-                raise RuntimeError(f"Gemini REST returned {resp.status}: {text[:300]}")
-            data = await resp.json()
-            text = data["candidates"][0]["content"]["parts"][0]["text"]
-            return _parse_json(text)
+                error = ProviderError(f"{provider} returned {resp.status}: {text[:300]}", resp.status,
+                                      retry_after(resp.headers))
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except aiohttp.ClientConnectionError as exc:
+            error = ProviderError(f"{provider} connection failed: {exc}")
+        except Exception:
+            breaker.record(False, time.perf_counter() - start)
+            raise
+        breaker.record(False, time.perf_counter() - start)
+
+        delay = backoff(attempt, error)
+        if delay is None:
+            if error.status == 429 and error.retry_after:
+                breaker.trip(error.retry_after)
+            raise error
+        llm_retries.inc(provider, str(error.status or "connection_error"))
+        logger.info("%s; retrying in %.1fs.", error, delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def _call_gemini(story: str) -> Dict[str, Any]:
+    """Call Gemini API using google-generativeai SDK."""
+    breaker = get_breaker("gemini")
+    breaker.allow()
+    start = time.perf_counter()
+    try:
+        with span("llm.gemini.sdk", model=settings.gemini_model):
+            response = await run_in_executor(sdk_executor(), gemini_model().generate_content, _production_prompt(story))
+            text = response.text
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as exc:
+        breaker.record(False, time.perf_counter() - start)
+        logger.warning("Gemini genai SDK failed: %s. Trying REST API.", exc)
+        # Fallback: use REST API directly
+        return await _call_gemini_rest(story)
+    breaker.record(True, time.perf_counter() - start)
+    return await _finish_package(text, story, _gemini_text, "gemini")
+
+
+@traced("llm.gemini.rest")
+async def _call_gemini_rest(story: str) -> Dict[str, Any]:
+    """Fallback: Call Gemini via REST API directly (no SDK issues)."""
+    text = await _gemini_text(_production_prompt(story))
+    return await _finish_package(text, story, _gemini_text, "gemini")
 
 
+async def _gemini_text(prompt: str, timeout_s: float = 120) -> str:
+    data = await _post_json("gemini", _gemini_url("generateContent"), _gemini_payload(prompt), timeout_s)
+    return data["candidates"][0]["content"]["parts"][0]["text"]
+
+
+@traced("llm.huggingface")
 async def _call_huggingface(story: str) -> Dict[str, Any]:
     """Call HuggingFace Inference API."""
-    import aiohttp
+    text = await _huggingface_text(_production_prompt(story))
+    return await _finish_package(text, story, _huggingface_text, "huggingface")
+
 
+async def _huggingface_text(prompt: str) -> str:
     url = f"https://api-inference.huggingface.co/models/{settings.hf_model}"
     headers = {
         "Authorization": f"Bearer {settings.hf_api_token}",
         "Content-Type": "application/json",
     }
     payload = {
-        "inputs": f"<s>[INST]\n{SYSTEM_PROMPT}\n\n{build_user_prompt(story)}\n[/INST]",
+        "inputs": f"<s>[INST]\n{prompt}\n[/INST]",
         "parameters": {
             "max_new_tokens": 4096,
             "temperature": 0.7,
             "return_full_text": False,
         },
     }
-    timeout = aiohttp.ClientTimeout(total=settings.hf_timeout)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        async with session.post(url, headers=headers, json=payload) as resp:
-            if resp.status != 200:
-                text = await resp.text()
-                raise RuntimeError(f"HuggingFace returned {resp.status}: {text[:200]}")
-            data = await resp.json()
-            raw = data[0]["generated_text"] if isinstance(data, list) else data.get("generated_text", "")
-            return _parse_json(raw)
+    data = await _post_json("huggingface", url, payload, settings.hf_timeout, headers)
+    return data[0]["generated_text"] if isinstance(data, list) else data.get("generated_text", "")
 
 
 def _generate_template(story: str) -> Dict[str, Any]:
@@ -306,46 +425,432 @@ THE END"""
     }
 
 
-def _parse_json(raw: str) -> Dict[str, Any]:
-    raw = re.sub(r"^```(?:json)?\s*", "", raw.strip(), flags=re.MULTILINE)
-    raw = re.sub(r"\s*```$", "", raw.strip(), flags=re.MULTILINE)
-    match = re.search(r"\{.*\}", raw, re.DOTALL)
-    if not match:
-        raise ValueError("No JSON object found in LLM response.")
-    return json.loads(match.group(0))
+# ─── Parsing and salvage ──────────────────────────────────────────────────────
+
+async def _finish_package(raw: str, story: str, complete: Callable[[str], Awaitable[str]],
+                          provider: str) -> Dict[str, Any]:
+    """
+    Parse a production package, keeping everything a malformed or truncated
+    response got right. Scenes that do not fit the ShotGroup / SoundScene
+    models are dropped. Sections that are missing, were cut off or lost a
+    scene are asked for once more from the same provider, listing the scenes
+    already done, and merged in by scene id. ValueError if no valid package
+    comes out of it.
+    """
+    salvage = json_repair.repair(raw)
+    package = salvage.data
+    for defect in salvage.repairs:
+        llm_json_repairs.inc(provider, defect)
+    screenplay = package.get("screenplay")
+    if not isinstance(screenplay, str) or not screenplay.strip():
+        raise ValueError("LLM response has no screenplay.")
+
+    pending: Dict[str, list] = {}
+    for section, id_field in SECTION_IDS.items():
+        scenes = package.get(section)
+        valid = _valid_scenes(section, scenes if isinstance(scenes, list) else [])
+        package[section] = valid
+        if not isinstance(scenes, list) or section == salvage.open_key or len(valid) < len(scenes):
+            pending[section] = [scene[id_field] for scene in valid]
+    if not pending:
+        return _check_package(package)
+
+    logger.info("%s response incomplete (%s); requesting %s.", provider, ", ".join(salvage.repairs) or "invalid scenes",
+                ", ".join(pending))
+    start = time.perf_counter()
+    try:
+        more = json_repair.repair(await complete(_continuation_prompt(story, screenplay, pending))).data
+        _observe(provider, "continuation", start, "success")
+    except Exception as exc:
+        logger.warning("%s continuation failed: %s", provider, exc)
+        _observe(provider, "continuation", start, "failure")
+        more = {}
+
+    for section in pending:
+        if isinstance(more.get(section), list):
+            package[section] = _merge_scenes(package[section], _valid_scenes(section, more[section]),
+                                             SECTION_IDS[section])
+    return _check_package(package)
+
+
+def _valid_scenes(section: str, scenes: list) -> list:
+    """The scenes of `section` that validate against its model."""
+    model = SECTION_MODELS[section]
+    valid = []
+    for scene in scenes:
+        try:
+            model.model_validate(scene)
+        except ValidationError as exc:
+            logger.info("Dropping an invalid %s scene: %s", section, exc.errors()[0]["msg"])
+            continue
+        valid.append(scene)
+    return valid
+
+
+def _check_package(package: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The package, if a GenerationResult can be built from it; ValueError
+    otherwise, so the caller moves on to the next provider instead of saving
+    and caching something every later read would fail on.
+    """
+    if not all(package.get(section) for section in SECTION_IDS):
+        raise ValueError("LLM response is missing scene sections.")
+    GenerationResult(project_id="", story_input="", provider="", **{
+        field: package[field] for field in ("screenplay", *SECTION_IDS)
+    })
+    return package
+
+
+def _continuation_prompt(story: str, screenplay: str, pending: Dict[str, list]) -> str:
+    done = "\n".join(
+        f"For {section}, omit these scenes, they are already done: {', '.join(ids)}."
+        for section, ids in pending.items() if ids
+    )
+    keys = ", ".join(f'"{section}"' for section in pending)
+    return f"{_production_prompt(story)}\n\n" + CONTINUATION_PROMPT.format(screenplay=screenplay, keys=keys, done=done)
+
+
+def _merge_scenes(scenes: list, more: list, id_field: str) -> list:
+    """Scenes from `more` replace same-id scenes (a cut-off partial one) and are appended otherwise."""
+    merged = list(scenes)
+    index = {s[id_field]: i for i, s in enumerate(merged) if isinstance(s, dict) and id_field in s}
+    for scene in more:
+        i = index.get(scene.get(id_field)) if isinstance(scene, dict) else None
+        if i is None:
+            merged.append(scene)
+        else:
+            merged[i] = scene
+    return merged
 
 
-async def generate_production(story: str) -> Tuple[Dict[str, Any], str]:
+def _provider_fingerprint(edit: bool = False) -> str:
+    """Configured providers and models, in the order they are tried."""
+    parts = [f"gemini/{settings.gemini_model}"] if settings.gemini_api_key else []
+    if settings.hf_api_token and not edit:
+        parts.append(f"huggingface/{settings.hf_model}")
+    return ",".join(parts)
+
+
+def _generate_key(story: str) -> str:
+    prompt = OUTLINE_PROMPT + SCENE_PROMPT if settings.generation_mode == "pipeline" else SYSTEM_PROMPT
+    return llm_cache.cache_key(
+        "generate", llm_cache.normalize_story(story), _provider_fingerprint(), llm_cache.prompt_version(prompt)
+    )
+
+
+@traced("llm.generate_production")
+async def generate_production(story: str, bypass_cache: bool = False) -> Tuple[Dict[str, Any], str]:
     """
     Returns (result_dict, provider_name).
-    Tries Gemini first; falls back to HuggingFace; ultimate fallback to template.
+    Served from the response cache when the same premise was generated
+    before, and shared with any identical request already in flight;
+    template fallbacks are never cached.
     """
-    # Try Gemini first (more reliable)
-    if settings.gemini_api_key:
+    key = _generate_key(story)
+    cached = await _cached_generation(key, bypass_cache)
+    if cached is not None:
+        return cached["result"], cached["provider"]
+
+    return await _generate_flights.do(key, lambda: _generate_and_cache(story, key))
+
+
+async def _cached_generation(key: str, bypass: bool) -> Dict[str, Any] | None:
+    """A cached package, unless it no longer validates (cached before packages were checked)."""
+    cached = await llm_cache.get("generate", key, bypass=bypass)
+    if cached is not None:
         try:
-            logger.info("Generating with Gemini (%s)…", settings.gemini_model)
-            result = await _call_gemini(story)
-            logger.info("Gemini generation succeeded.")
-            return result, "gemini"
-        except Exception as exc:
-            logger.warning("Gemini failed: %s. Trying HuggingFace.", exc)
+            _check_package(cached["result"])
+        except ValueError:
+            logger.warning("Ignoring an invalid cached package for key %s.", key[:12])
+            return None
+    return cached
+
+
+async def _generate_and_cache(story: str, key: str) -> Tuple[Dict[str, Any], str]:
+    result, provider = await _generate_uncached(story)
+    if provider != "template":
+        await llm_cache.put("generate", key, {"result": result, "provider": provider})
+    return result, provider
 
-    # Try HuggingFace
+
+async def _generate_uncached(story: str) -> Tuple[Dict[str, Any], str]:
+    """
+    Tries Gemini first, then HuggingFace; ultimate fallback to template.
+    With both configured, a slow Gemini call is hedged with HuggingFace. In
+    pipeline mode the hedge races whole pipelines: the outline and scene
+    calls inside one are not hedged individually, though each still goes
+    through its provider's circuit breaker and retries.
+    """
+    pipeline = settings.generation_mode == "pipeline"
+    providers = []
+    if settings.gemini_api_key:
+        providers.append(("gemini", _pipelined(_gemini_text, "gemini") if pipeline else _call_gemini))
     if settings.hf_api_token:
+        providers.append(("huggingface", _pipelined(_huggingface_text, "huggingface") if pipeline else _call_huggingface))
+
+    if len(providers) == 2 and settings.llm_hedge_enabled:
+        (primary, call_primary), (secondary, call_secondary) = providers
         try:
-            logger.info("Generating with HuggingFace (%s)…", settings.hf_model)
-            result = await _call_huggingface(story)
-            logger.info("HuggingFace generation succeeded.")
-            return result, "huggingface"
+            result, index = await _generate_hedge.run(
+                lambda: _attempt(primary, call_primary, story),
+                lambda: _attempt(secondary, call_secondary, story),
+            )
+            return result, providers[index][0]
         except Exception as exc:
-            logger.warning("HuggingFace also failed: %s", exc)
+            logger.warning("Gemini and HuggingFace both failed: %s", exc)
+    else:
+        for provider, call in providers:
+            try:
+                return await _attempt(provider, call, story), provider
+            except Exception as exc:
+                logger.warning("%s failed: %s", provider, exc)
 
     # Ultimate fallback: template generation (always works)
     logger.warning("All LLM providers failed or not configured. Using template fallback.")
-    result = _generate_template(story)
+    start = time.perf_counter()
+    with span("llm.template"):
+        result = _generate_template(story)
+    _observe("template", "generate", start, "success")
     return result, "template"
 
 
+async def _attempt(provider: str, call: Callable[[str], Awaitable[Dict[str, Any]]], story: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    logger.info("Generating with %s…", provider)
+    try:
+        result = await call(story)
+    except asyncio.CancelledError:
+        _observe(provider, "generate", start, "cancelled")  # lost a hedge race
+        raise
+    except ProviderUnavailable:
+        _observe(provider, "generate", start, "skipped")
+        raise
+    except Exception:
+        _observe(provider, "generate", start, "failure")
+        raise
+    logger.info("%s generation succeeded.", provider)
+    _observe(provider, "generate", start, "success")
+    return result
+
+
+# ─── Pipeline mode ────────────────────────────────────────────────────────────
+
+def _pipelined(complete: Callable[[str], Awaitable[str]], provider: str) -> Callable[[str], Awaitable[Dict[str, Any]]]:
+    return lambda story: _generate_pipelined(story, complete, provider)
+
+
+@traced("llm.pipeline")
+async def _generate_pipelined(story: str, complete: Callable[[str], Awaitable[str]], provider: str) -> Dict[str, Any]:
+    """
+    One call writes the screenplay and lists its scenes; then every scene's
+    shot and sound design gets its own call, PIPELINE_SCENE_CONCURRENCY at a
+    time, so wall-clock time follows the slowest scene rather than the sum.
+    Scenes without a usable design are left out; ValueError if the outline or
+    every scene fails, or if the merged package does not validate.
+    """
+    start = time.perf_counter()
+    try:
+        outline = json_repair.repair(await complete(f"{OUTLINE_PROMPT}\n\n{build_user_prompt(story)}")).data
+        screenplay = outline.get("screenplay")
+        scenes = [s for s in outline.get("scenes", []) if isinstance(s, dict) and s.get("id")]
+        if not isinstance(screenplay, str) or not screenplay.strip() or not scenes:
+            raise ValueError("Outline has no screenplay or no scenes.")
+    except Exception:
+        _observe(provider, "outline", start, "failure")
+        raise
+    _observe(provider, "outline", start, "success")
+
+    limit = asyncio.Semaphore(settings.pipeline_scene_concurrency)
+    designs = await asyncio.gather(
+        *(_design_scene(screenplay, scene, complete, provider, limit) for scene in scenes),
+        return_exceptions=True,
+    )
+    package: Dict[str, Any] = {"screenplay": screenplay, "shot_design": [], "sound_design": []}
+    for scene, design in zip(scenes, designs):
+        if isinstance(design, BaseException):
+            logger.warning("%s design for %s failed: %s", provider, scene["id"], design)
+            continue
+        package["shot_design"].append(design["shot_design"])
+        package["sound_design"].append(design["sound_design"])
+    if not package["shot_design"]:
+        raise ValueError("Every scene design failed.")
+    return _check_package(package)
+
+
+async def _design_scene(screenplay: str, scene: Dict[str, Any], complete: Callable[[str], Awaitable[str]],
+                        provider: str, limit: asyncio.Semaphore) -> Dict[str, Any]:
+    """
+    The scene's design; a reply that does not parse or validate is asked for
+    again, up to SCENE_ATTEMPTS times in all. Provider errors are not retried
+    here, since the text call has already retried them.
+    """
+    prompt = (f"{SCENE_PROMPT}\n\nScreenplay:\n\n{screenplay}\n\n"
+              f"Scene: {scene['id']} — {scene.get('scene_title', '')} ({scene.get('heading', '')})")
+    for attempt in range(1, SCENE_ATTEMPTS + 1):
+        async with limit:
+            start = time.perf_counter()
+            try:
+                design = _scene_design(json_repair.repair(await complete(prompt)).data, scene)
+            except ValueError as exc:
+                _observe(provider, "scene", start, "failure")
+                if attempt == SCENE_ATTEMPTS:
+                    raise
+                logger.info("%s design for %s is unusable, asking again: %s", provider, scene["id"], exc)
+                continue
+            except Exception:
+                _observe(provider, "scene", start, "failure")
+                raise
+            _observe(provider, "scene", start, "success")
+            return design
+
+
+def _scene_design(design: Dict[str, Any], scene: Dict[str, Any]) -> Dict[str, Any]:
+    """Both sections of a scene design, labelled from the outline; ValueError unless they validate."""
+    shots, sound = design.get("shot_design"), design.get("sound_design")
+    if not isinstance(shots, dict) or not isinstance(sound, dict):
+        raise ValueError("Scene design is missing shot_design or sound_design.")
+
+    # The outline's ids and titles win, so both sections line up with its scene list
+    title = scene.get("scene_title", "")
+    shots.update(id=scene["id"])
+    shots.setdefault("scene_title", title)
+    sound.update(scene_id=scene["id"])
+    sound.setdefault("scene_title", title)
+    sound.setdefault("time_of_day", scene.get("time_of_day", ""))
+    design = {"shot_design": shots, "sound_design": sound}
+    for section, model in SECTION_MODELS.items():
+        try:
+            model.model_validate(design[section])
+        except ValidationError as exc:
+            raise ValueError(f"Invalid {section} for {scene['id']}: {exc.errors()[0]['msg']}") from None
+    return design
+
+
+# ─── Streaming generation ─────────────────────────────────────────────────────
+
+async def _stream_gemini(story: str) -> AsyncIterator[str]:
+    """Yield text chunks from Gemini's streamGenerateContent (server-sent events)."""
+    breaker = get_breaker("gemini")
+    breaker.allow()
+    start = time.perf_counter()
+    timeout = aiohttp.ClientTimeout(total=180, sock_read=60)
+    url = _gemini_url("streamGenerateContent", "alt=sse&")
+    try:
+        async with get_session().post(url, json=_gemini_payload(_production_prompt(story)), timeout=timeout) as resp:
+            if resp.status != 200:
+                text = await resp.text()
+                raise ProviderError(f"gemini stream returned {resp.status}: {text[:300]}", resp.status,
+                                    retry_after(resp.headers))
+            async for line in resp.content:
+                if not line.startswith(b"data:"):
+                    continue
+                chunk = json.loads(line[5:])
+                for part in chunk["candidates"][0].get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+    except (asyncio.CancelledError, GeneratorExit):
+        breaker.release()
+        raise
+    except Exception as exc:
+        breaker.record(False, time.perf_counter() - start)
+        if isinstance(exc, ProviderError) and exc.status == 429 and exc.retry_after:
+            breaker.trip(exc.retry_after)
+        raise
+    breaker.record(True, time.perf_counter() - start)
+
+
+def _replay(result: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """Events for a package that arrived whole (cache hit, HuggingFace, template)."""
+    yield "screenplay", result.get("screenplay", "")
+    for event in ("shot_design", "sound_design"):
+        for scene in result.get(event, []):
+            yield event, scene
+
+
+def _fits(section: str, scene: Any) -> bool:
+    try:
+        SECTION_MODELS[section].model_validate(scene)
+    except ValidationError:
+        return False
+    return True
+
+
+def _reconcile(sent: Dict[str, list], result: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """Events that turn the streamed scenes into the result's: retractions first, then additions."""
+    for section, id_field in SECTION_IDS.items():
+        for scene in sent[section]:
+            if scene not in result[section]:
+                yield "retract", {"section": section, "id": scene[id_field]}
+    for section in SECTION_IDS:
+        for scene in result[section]:
+            if scene not in sent[section]:
+                yield section, scene
+
+
+@traced("llm.stream_production")
+async def stream_production(story: str, bypass_cache: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming generate_production. Yields ("provider", name), then
+    ("screenplay", text delta), ("shot_design", scene) and ("sound_design", scene)
+    events as soon as each is complete, and finally ("result", (result_dict, provider)).
+
+    Gemini is streamed; cache hits, pipeline mode and the non-streaming
+    fallbacks are replayed as the same events once they are ready. If the stream fails before any
+    content arrived, the regular fallback chain takes over.
+
+    Streamed scenes that do not fit their section model are held back, since
+    the package drops them. Once the package is finished, a ("retract",
+    {"section", "id"}) event withdraws any sent scene it no longer has (one a
+    continuation replaced), ahead of the scenes the continuation added, so
+    the scene events always add up to the result's sections.
+    """
+    key = _generate_key(story)
+    cached = await _cached_generation(key, bypass_cache)
+    if cached is None and settings.gemini_api_key and settings.generation_mode != "pipeline":
+        start = time.perf_counter()
+        parser = PackageStreamParser()
+        started = False
+        sent: Dict[str, list] = {section: [] for section in SECTION_IDS}
+        try:
+            async for text in _stream_gemini(story):
+                for event, value in parser.feed(text):
+                    if not started:
+                        started = True
+                        llm_time_to_first_content.observe(time.perf_counter() - start, "gemini")
+                        yield "provider", "gemini"
+                    if event in sent:
+                        if not _fits(event, value):
+                            continue
+                        sent[event].append(value)
+                    yield event, value
+            result = await _finish_package(parser.text, story, _gemini_text, "gemini")
+            for event in _reconcile(sent, result):
+                yield event
+        except Exception as exc:
+            _observe("gemini", "stream", start, "failure")
+            if started:
+                raise
+            logger.warning("Gemini stream failed before any content: %s. Falling back.", exc)
+        else:
+            _observe("gemini", "stream", start, "success")
+            await llm_cache.put("generate", key, {"result": result, "provider": "gemini"})
+            yield "result", (result, "gemini")
+            return
+
+    if cached is not None:
+        result, provider = cached["result"], cached["provider"]
+    else:
+        result, provider = await generate_production(story, bypass_cache=True)
+    yield "provider", provider
+    for event in _replay(result):
+        yield event
+    yield "result", (result, provider)
+
+
+def _observe(provider: str, task: str, start: float, outcome: str) -> None:
+    llm_request_duration.observe(time.perf_counter() - start, provider, task, outcome)
+
+
 # ─── Script Editing ───────────────────────────────────────────────────────────
 
 EDIT_PROMPTS = {
@@ -454,35 +959,53 @@ def _edit_script_locally(script: str, action: str, tone: str = "") -> str:
     return script
 
 
+@traced("llm.gemini.edit")
 async def _call_llm_for_edit(prompt: str, script: str) -> str:
     """Call Gemini to edit the script. Returns the edited text."""
     full_prompt = f"{prompt}\n\n---\n\n{script}"
 
     # Try Gemini REST API
     if settings.gemini_api_key:
-        import aiohttp
-        url = f"https://generativelanguage.googleapis.com/v1beta/{settings.gemini_model}:generateContent?key={settings.gemini_api_key}"
-        payload = {
-            "contents": [{"parts": [{"text": full_prompt}]}],
-            "generationConfig": {"temperature": 0.7, "maxOutputTokens": 8192},
-        }
-        timeout = aiohttp.ClientTimeout(total=60)
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(url, json=payload) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        return data["candidates"][0]["content"]["parts"][0]["text"]
+            return await _gemini_text(full_prompt, timeout_s=60)
         except Exception as exc:
             logger.warning("Gemini edit call failed: %s", exc)
 
     return ""  # empty = use local fallback
 
 
-async def edit_script(script: str, action: str, tone: str = "") -> str:
+# Each INT./EXT. heading starts a scene; long scripts are edited scene by scene
+SCENE_HEADING = re.compile(r"^[ \t]*(?:INT\./EXT\.|EXT\./INT\.|I/E\.?|INT\.|EXT\.)[ \t]", re.MULTILINE)
+
+SCENE_EDIT_NOTE = "\n\nThis is one scene of a longer screenplay: keep its scene heading and do not add new scenes."
+
+
+def _split_scenes(script: str) -> List[str]:
+    """Cut a screenplay before each scene heading. The pieces join back into the original exactly."""
+    starts = [m.start() for m in SCENE_HEADING.finditer(script)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return [script[a:b] for a, b in zip(starts, starts[1:] + [len(script)])]
+
+
+def _respace(original: str, edited: str) -> str:
+    """Give an edited piece the leading and trailing whitespace of the piece it replaces."""
+    lead = original[:len(original) - len(original.lstrip())]
+    trail = original[len(lead) + len(original.strip()):]  # empty when the piece is all whitespace
+    return lead + edited.strip() + trail
+
+
+@traced("llm.edit_script")
+async def edit_script(script: str, action: str, tone: str = "", bypass_cache: bool = False) -> str:
     """
     Edit a screenplay using AI or local fallback.
     action: 'expand' | 'compress' | 'rewrite' | 'tone'
+    A script with scene headings is edited one scene at a time,
+    EDIT_SCENE_CONCURRENCY scenes at once, and reassembled; anything before
+    the first heading is kept as written. LLM edits are cached per scene by
+    its text, action and tone, so re-running after a small change only calls
+    the LLM for the scenes that changed (and identical edits in flight share
+    one call); local fallbacks are not cached.
     """
     if not script.strip():
         return script
@@ -495,21 +1018,61 @@ async def edit_script(script: str, action: str, tone: str = "") -> str:
     else:
         return script
 
+    pieces = _split_scenes(script)
+    if len(pieces) == 1:
+        return await _edit_piece(prompt, script, action, tone, bypass_cache)
+
+    limit = asyncio.Semaphore(settings.edit_scene_concurrency)
+
+    async def edit(piece: str) -> str:
+        if not SCENE_HEADING.match(piece):
+            return piece  # title page, FADE IN:
+        edited = await _edit_piece(prompt + SCENE_EDIT_NOTE, piece, action, tone, bypass_cache, limit)
+        return _respace(piece, edited)
+
+    with span("llm.edit_scenes", scenes=len(pieces)):
+        return "".join(await asyncio.gather(*(edit(piece) for piece in pieces)))
+
+
+async def _edit_piece(prompt: str, script: str, action: str, tone: str, bypass_cache: bool,
+                      limit: asyncio.Semaphore | None = None) -> str:
+    key = llm_cache.cache_key(
+        "edit", llm_cache.normalize_script(script), action, tone,
+        _provider_fingerprint(edit=True), llm_cache.prompt_version(prompt),
+    )
+    cached = await llm_cache.get("edit", key, bypass=bypass_cache)
+    if cached is not None:
+        return cached
+    return await _edit_flights.do(key, lambda: _edit_and_cache(prompt, script, action, tone, key, limit))
+
+
+async def _edit_and_cache(prompt: str, script: str, action: str, tone: str, key: str,
+                          limit: asyncio.Semaphore | None = None) -> str:
     # Try LLM first
+    start = time.perf_counter()
     try:
-        result = await _call_llm_for_edit(prompt, script)
+        async with limit or contextlib.nullcontext():
+            start = time.perf_counter()  # time the call, not the wait for a slot
+            result = await _call_llm_for_edit(prompt, script)
         if result and len(result) > 20:
             logger.info("Script %s via LLM succeeded.", action)
+            _observe("gemini", "edit", start, "success")
             # Clean markdown fences if present
             result = re.sub(r"^```(?:\w+)?\s*", "", result.strip(), flags=re.MULTILINE)
             result = re.sub(r"\s*```$", "", result.strip(), flags=re.MULTILINE)
+            await llm_cache.put("edit", key, result)
             return result
     except Exception as exc:
         logger.warning("LLM script edit failed: %s", exc)
+    if settings.gemini_api_key:
+        _observe("gemini", "edit", start, "failure")
 
     # Fallback to local
     logger.info("Using local fallback for script %s.", action)
-    return _edit_script_locally(script, action, tone)
+    start = time.perf_counter()
+    result = _edit_script_locally(script, action, tone)
+    _observe("template", "edit", start, "success")
+    return result
 
 
 # ── Storyboard Prompt Generation ──────────────────────────────
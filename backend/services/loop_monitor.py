@@ -0,0 +1,111 @@
+"""
+Event-loop monitor — continuous lag measurement and blocking-call capture.
+
+A heartbeat coroutine sleeps LOOP_MONITOR_INTERVAL_MS at a time and records
+how late it woke up (`event_loop_lag_seconds`). A watchdog thread watches the
+heartbeat from outside the loop: once it has been silent for longer than
+LOOP_STALL_THRESHOLD_MS, the loop is stuck in synchronous code, so the
+watchdog grabs the loop thread's current frame from `sys._current_frames()`
+and logs that stack — the pymongo `find_one` or bcrypt `verify` that is
+blocking — once per stall. Recent stalls are kept for inspection.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from config import get_settings
+from services.metrics import event_loop_lag, event_loop_lag_max, event_loop_stalls
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+STACK_LIMIT = 40
+
+_stalls: Deque[Dict[str, Any]] = deque(maxlen=50)
+_last_beat = 0.0
+_loop_thread_id: Optional[int] = None
+_task: Optional[asyncio.Task] = None
+_watchdog: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+async def _heartbeat() -> None:
+    global _last_beat
+    interval = settings.loop_monitor_interval_ms / 1000
+    window_max, window_start = 0.0, time.monotonic()
+    while True:
+        expected = time.monotonic() + interval
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        _last_beat = now
+        lag = max(0.0, now - expected)
+        event_loop_lag.observe(lag)
+        window_max = max(window_max, lag)
+        if now - window_start >= 10.0:
+            event_loop_lag_max.set(window_max)
+            window_max, window_start = 0.0, now
+
+
+def _capture() -> Optional[List[str]]:
+    frame = sys._current_frames().get(_loop_thread_id)
+    if frame is None:
+        return None
+    return [line.rstrip() for line in traceback.format_stack(frame, limit=STACK_LIMIT)]
+
+
+def _watch() -> None:
+    threshold = settings.loop_stall_threshold_ms / 1000
+    poll = min(threshold, settings.loop_monitor_interval_ms / 1000) / 2
+    reported_beat = 0.0
+    while not _stop.wait(poll):
+        beat = _last_beat
+        silent = time.monotonic() - beat
+        if beat == 0.0 or beat == reported_beat or silent < threshold:
+            continue
+        reported_beat = beat  # one report per stall
+        stack = _capture()
+        if stack is None:
+            continue
+        event_loop_stalls.inc()
+        _stalls.append({
+            "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "blocked_ms": round(silent * 1000, 1),
+            "stack": stack,
+        })
+        logger.warning(
+            "Event loop blocked for %.0fms+; loop thread is in:\n%s", silent * 1000, "\n".join(stack)
+        )
+
+
+def recent_stalls() -> List[Dict[str, Any]]:
+    """Most recent stalls, newest last (blocked_ms is when the stack was taken)."""
+    return list(_stalls)
+
+
+def start_loop_monitor() -> None:
+    """Start the heartbeat on the running loop and the watchdog thread."""
+    global _task, _watchdog, _loop_thread_id, _last_beat
+    if not settings.loop_monitor_enabled or _task is not None:
+        return
+    _loop_thread_id = threading.get_ident()
+    _last_beat = time.monotonic()
+    _task = asyncio.get_running_loop().create_task(_heartbeat())
+    _stop.clear()
+    _watchdog = threading.Thread(target=_watch, name="loop-watchdog", daemon=True)
+    _watchdog.start()
+
+
+def stop_loop_monitor() -> None:
+    global _task, _watchdog
+    if _task is None:
+        return
+    _task.cancel()
+    _stop.set()
+    _watchdog.join(timeout=2)
+    _task = _watchdog = None
@@ -0,0 +1,277 @@
+"""
+Metrics — per-process counters, gauges and histograms, rendered in Prometheus text format.
+
+Recording is lock-free: each thread writes only to its own shard (a plain dict
+keyed by metric and label values), so the hot path is a dict lookup and an add
+with no contention. `render()` merges the shards at scrape time.
+"""
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+JOB_BUCKETS = (0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+_shards: List[dict] = []
+_local = threading.local()
+_register_lock = threading.Lock()  # taken once per thread, never on the hot path
+_registry: Dict[str, "_Metric"] = {}
+
+
+def _shard() -> dict:
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = {}
+        with _register_lock:
+            _shards.append(shard)
+        return shard
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        _registry[name] = self
+
+    def _merged(self) -> Dict[Tuple[str, ...], object]:
+        raise NotImplementedError
+
+    def _render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        shard = _shard()
+        key = (self.name, label_values)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merged(self) -> Dict[Tuple[str, ...], float]:
+        merged: Dict[Tuple[str, ...], float] = {}
+        for shard in list(_shards):
+            for (name, values), count in shard.copy().items():
+                if name == self.name:
+                    merged[values] = merged.get(values, 0) + count
+        return merged
+
+    def _render(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labels, values)} {_number(count)}"
+            for values, count in sorted(self._merged().items())
+        ]
+
+
+class Gauge(_Metric):
+    """Last value wins, so gauges skip the shards: one dict store under the GIL."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        self._values[label_values] = value
+
+    def _merged(self) -> Dict[Tuple[str, ...], float]:
+        return self._values.copy()
+
+    def _render(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labels, values)} {_number(value)}"
+            for values, value in sorted(self._merged().items())
+        ]
+
+
+class Histogram(_Metric):
+    """Cells hold one count per bucket (plus +Inf), followed by the running sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        shard = _shard()
+        key = (self.name, label_values)
+        cell = shard.get(key)
+        if cell is None:
+            cell = shard[key] = [0] * (len(self.buckets) + 2)
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def _merged(self) -> Dict[Tuple[str, ...], List[float]]:
+        merged: Dict[Tuple[str, ...], List[float]] = {}
+        for shard in list(_shards):
+            for (name, values), cell in shard.copy().items():
+                if name == self.name:
+                    total = merged.setdefault(values, [0] * len(cell))
+                    for i, v in enumerate(list(cell)):
+                        total[i] += v
+        return merged
+
+    def _render(self) -> List[str]:
+        lines = []
+        for values, cell in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), cell):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels((*self.labels, 'le'), (*values, le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_number(cell[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """Prometheus text exposition (format 0.0.4) of every registered metric."""
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        lines.extend(metric._render())
+    return "\n".join(lines) + "\n"
+
+
+# ── Application metrics ───────────────────────────────────────
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status (the _count series is the request count).",
+    ("method", "route", "status"),
+)
+llm_request_duration = Histogram(
+    "llm_request_duration_seconds",
+    "LLM provider call latency by provider, task and outcome.",
+    ("provider", "task", "outcome"),
+)
+llm_time_to_first_content = Histogram(
+    "llm_time_to_first_content_seconds",
+    "Time from sending a streaming LLM request to the first parsed content event.",
+    ("provider",),
+)
+llm_json_repairs = Counter(
+    "llm_json_repairs_total",
+    "Defects repaired in LLM JSON output, by provider and defect (trailing_comma, missing_comma, literal, truncated).",
+    ("provider", "repair"),
+)
+llm_hedges = Counter(
+    "llm_hedge_total",
+    "Hedged provider calls by task and outcome (not_needed, primary_won, secondary_won, fallback, failed).",
+    ("task", "outcome"),
+)
+llm_hedge_delay = Gauge(
+    "llm_hedge_delay_seconds",
+    "Current delay before a hedged call starts the secondary provider.",
+    ("task",),
+)
+llm_breaker_state = Gauge(
+    "llm_breaker_state",
+    "Provider circuit breaker state: 0 closed, 1 half-open, 2 open.",
+    ("provider",),
+)
+llm_breaker_transitions = Counter(
+    "llm_breaker_transitions_total",
+    "Provider circuit breaker state changes, by the state entered.",
+    ("provider", "state"),
+)
+llm_breaker_rejections = Counter(
+    "llm_breaker_rejections_total",
+    "Provider calls skipped because the circuit was open.",
+    ("provider",),
+)
+llm_retries = Counter(
+    "llm_retries_total",
+    "Provider call retries, by the status that caused them (or connection_error).",
+    ("provider", "reason"),
+)
+job_queue_depth = Gauge(
+    "generation_jobs",
+    "Generation jobs by status (queued, running), sampled every 15s.",
+    ("status",),
+)
+job_workers_busy = Gauge(
+    "generation_job_workers_busy",
+    "Job workers in this process currently running a generation.",
+)
+job_wait = Histogram(
+    "generation_job_wait_seconds",
+    "Time generation jobs spent queued before a worker claimed them.",
+    buckets=JOB_BUCKETS,
+)
+job_duration = Histogram(
+    "generation_job_duration_seconds",
+    "Generation job run time by outcome (done, retried, failed, requeued).",
+    ("outcome",),
+    buckets=JOB_BUCKETS,
+)
+llm_cache_requests = Counter(
+    "llm_cache_requests_total",
+    "LLM response cache lookups by kind and result (memory_hit, store_hit, miss, bypass).",
+    ("kind", "result"),
+)
+llm_single_flight = Counter(
+    "llm_single_flight_total",
+    "Identical concurrent LLM requests: callers that joined an in-flight call, and calls abandoned by every caller.",
+    ("kind", "event"),
+)
+llm_http_connections = Counter(
+    "llm_http_connections_total",
+    "Connections used for LLM provider calls, by host and whether a pooled one was reused.",
+    ("host", "state"),
+)
+mongo_operation_duration = Histogram(
+    "mongo_operation_duration_seconds",
+    "db_service operation latency.",
+    ("operation", "outcome"),
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds",
+    "Wire-level MongoDB command latency, from pymongo command monitoring.",
+    ("command", "collection", "outcome"),
+)
+mongo_commands_per_request = Histogram(
+    "mongo_commands_per_request",
+    "MongoDB commands issued while serving one HTTP request.",
+    ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+rate_limit_rejections = Counter(
+    "rate_limit_rejections_total",
+    "Requests rejected by the rate limiter, by exhausted budget.",
+    ("budget",),
+)
+event_loop_lag = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between a scheduled event-loop heartbeat and when it actually ran.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+event_loop_lag_max = Gauge(
+    "event_loop_lag_max_seconds",
+    "Largest heartbeat lag seen in the last monitor interval window.",
+)
+event_loop_stalls = Counter(
+    "event_loop_stalls_total",
+    "Stalls over LOOP_STALL_THRESHOLD_MS; each one logs the blocking stack.",
+)
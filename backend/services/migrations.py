@@ -0,0 +1,220 @@
+"""
+Online schema migrations — versioned, batched, resumable, run while serving.
+
+Each migration walks its collections in `_id` order, rewriting one batch at a
+time and sleeping between batches so live traffic keeps priority. Progress
+(the last `_id` handled per collection) is recorded in `schema_migrations`
+after every batch, so a restarted worker resumes where the last one stopped.
+A lease on the migration's record ensures only one worker runs it at a time.
+
+Updates are guarded by the same filter that selected the document, so a row
+rewritten by the app mid-migration is never clobbered.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from config import get_settings
+from services.db_service import get_db
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+LEASE = timedelta(seconds=60)
+_owner = f"{os.uname().nodename}:{os.getpid()}"
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+class Migration:
+    """
+    `select` picks documents still needing the change; `transform` returns the
+    `$set` fields for one document.
+    """
+
+    def __init__(self, version: int, name: str, collections: List[str],
+                 select: dict, transform: Callable[[dict], Dict[str, object]]):
+        self.version = version
+        self.name = name
+        self.collections = collections
+        self.select = select
+        self.transform = transform
+
+
+# ── Migrations ────────────────────────────────────────────────
+
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+
+def _to_datetime(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Legacy values came from datetime.utcnow().isoformat(): naive, but UTC
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _normalize_timestamps(doc: dict) -> Dict[str, object]:
+    fields = {}
+    for f in TIMESTAMP_FIELDS:
+        if isinstance(doc.get(f), str):
+            try:
+                fields[f] = _to_datetime(doc[f])
+            except ValueError:
+                logger.warning("Unparseable %s %r on %s; leaving it.", f, doc[f], doc["_id"])
+    return fields
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        version=1,
+        name="normalize_timestamps",
+        collections=["users", "projects", "generations", "callsheet", "budget", "shot_designs", "contacts"],
+        select={"$or": [{f: {"$type": "string"}} for f in TIMESTAMP_FIELDS]},
+        transform=_normalize_timestamps,
+    ),
+]
+
+
+# ── Runner ────────────────────────────────────────────────────
+
+def _acquire(migration: Migration) -> Optional[dict]:
+    """Take (or renew) the lease on a migration; None if done or held elsewhere."""
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    try:
+        db.schema_migrations.update_one(
+            {"_id": migration.version},
+            {"$setOnInsert": {"name": migration.name, "status": "pending", "progress": {}, "migrated": 0}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass  # another worker created it first
+    return db.schema_migrations.find_one_and_update(
+        {
+            "_id": migration.version,
+            "status": {"$ne": "done"},
+            "$or": [{"lease_owner": _owner}, {"lease_until": {"$lt": now}}, {"lease_until": {"$exists": False}}],
+        },
+        {"$set": {"status": "running", "lease_owner": _owner, "lease_until": now + LEASE},
+         "$min": {"started_at": now}},
+        return_document=True,
+    )
+
+
+def _run_batch(migration: Migration, collection: str, after) -> tuple:
+    """Migrate one batch; returns (last _id seen or None when exhausted, documents changed)."""
+    db = get_db()
+    query = dict(migration.select)
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    docs = list(db[collection].find(query).sort("_id", ASCENDING).limit(settings.migrations_batch_size))
+    if not docs:
+        return None, 0
+    ops = []
+    for doc in docs:
+        fields = migration.transform(doc)
+        if fields:
+            ops.append(UpdateOne({"_id": doc["_id"], **migration.select}, {"$set": fields}))
+    changed = db[collection].bulk_write(ops, ordered=False).modified_count if ops else 0
+    return docs[-1]["_id"], changed
+
+
+def run_migration(migration: Migration) -> bool:
+    """Run one migration to completion (or until stopped). True if it finished."""
+    state = _acquire(migration)
+    if state is None:
+        return False
+    db = get_db()
+    progress = state.get("progress", {})
+    logger.info("Migration %d (%s) running.", migration.version, migration.name)
+
+    for collection in migration.collections:
+        after = progress.get(collection)
+        if after == "done":
+            continue
+        while not _stop.is_set():
+            last, changed = _run_batch(migration, collection, after)
+            after = last if last is not None else "done"
+            recorded = db.schema_migrations.update_one(
+                {"_id": migration.version, "lease_owner": _owner},
+                {"$set": {f"progress.{collection}": after,
+                          "lease_until": datetime.now(timezone.utc) + LEASE},
+                 "$inc": {"migrated": changed}},
+            )
+            if recorded.matched_count == 0:
+                logger.warning("Lost lease on migration %d; another worker took over.", migration.version)
+                return False
+            if last is None:
+                break
+            _stop.wait(settings.migrations_batch_interval_ms / 1000)
+        if _stop.is_set():
+            return False
+
+    db.schema_migrations.update_one(
+        {"_id": migration.version},
+        {"$set": {"status": "done", "finished_at": datetime.now(timezone.utc)},
+         "$unset": {"lease_owner": "", "lease_until": ""}},
+    )
+    logger.info("Migration %d (%s) finished.", migration.version, migration.name)
+    return True
+
+
+def _run_all() -> None:
+    """Apply migrations in version order, retrying while Mongo is unavailable or another worker holds a lease."""
+    pending = sorted(MIGRATIONS, key=lambda m: m.version)
+    while pending and not _stop.is_set():
+        migration = pending[0]
+        try:
+            if run_migration(migration) or _is_done(migration):
+                pending.pop(0)
+                continue
+        except Exception as exc:
+            logger.warning("Migration %d (%s) paused: %s", migration.version, migration.name, exc)
+        _stop.wait(LEASE.total_seconds() / 2)
+
+
+def _is_done(migration: Migration) -> bool:
+    doc = get_db().schema_migrations.find_one({"_id": migration.version}, {"status": 1})
+    return bool(doc and doc.get("status") == "done")
+
+
+def migration_status() -> List[dict]:
+    """Recorded state of every known migration."""
+    db = get_db()
+    recorded = {d["_id"]: d for d in db.schema_migrations.find()}
+    return [
+        {
+            "version": m.version,
+            "name": m.name,
+            "status": recorded.get(m.version, {}).get("status", "pending"),
+            "migrated": recorded.get(m.version, {}).get("migrated", 0),
+            "progress": recorded.get(m.version, {}).get("progress", {}),
+        }
+        for m in MIGRATIONS
+    ]
+
+
+def start_migrations() -> None:
+    """
+    Run pending migrations in a background thread. Mongo only: SQLite stores
+    are created by this codebase and already have the current schema.
+    """
+    global _thread
+    if not settings.migrations_enabled or settings.storage_backend != "mongodb":
+        return
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run_all, name="schema-migrations", daemon=True)
+    _thread.start()
+
+
+def stop_migrations() -> None:
+    """Stop after the current batch; progress is already recorded."""
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=10)
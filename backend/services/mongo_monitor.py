@@ -0,0 +1,130 @@
+"""
+Mongo command monitoring — every wire command, attributed to its HTTP request.
+
+`CommandMonitor` is a pymongo CommandListener registered on the client. It
+records each command's latency in `mongo_command_duration_seconds`, logs
+commands slower than MONGODB_SLOW_COMMAND_MS with the *shape* of their filter
+(values replaced by `?`, so the log names the missing index without leaking
+data), and adds the command to the current request's tally.
+
+The tally lives in a ContextVar that LoggingMiddleware opens per request.
+pymongo runs listeners synchronously on the calling thread and asyncio.to_thread
+copies the context, so commands issued anywhere inside a request land in it.
+Requests issuing more than MONGODB_REQUEST_QUERY_LIMIT commands are logged with
+their repeated shapes — the N+1 pattern shows up as one shape with a high count.
+"""
+import contextvars
+import logging
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+from config import get_settings
+from services.metrics import mongo_command_duration, mongo_commands_per_request
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Where each command keeps the filter that decides which index it uses
+_FILTER_PATHS = {
+    "find": ("filter",),
+    "count": ("query",),
+    "distinct": ("query",),
+    "findAndModify": ("query",),
+    "update": ("updates", 0, "q"),
+    "delete": ("deletes", 0, "q"),
+    "aggregate": ("pipeline", 0, "$match"),
+}
+
+
+class RequestQueries:
+    __slots__ = ("count", "total_ms", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes: Counter = Counter()
+
+
+_request: contextvars.ContextVar[Optional[RequestQueries]] = contextvars.ContextVar(
+    "cineforge_mongo_request", default=None
+)
+
+
+def shape(value: Any) -> Any:
+    """Replace literal values with `?`, keeping field names and operators."""
+    if isinstance(value, dict):
+        return {k: shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [shape(v) for v in value[:3]]
+    return "?"
+
+
+def _filter_shape(name: str, command) -> Optional[Any]:
+    node = command
+    for step in _FILTER_PATHS.get(name, ()):
+        try:
+            node = node[step]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return shape(node) if node is not command else None
+
+
+def _shape_key(name: str, collection: str, command) -> str:
+    return f"{name} {collection} {_filter_shape(name, command)}"
+
+
+class CommandMonitor(monitoring.CommandListener):
+    def __init__(self):
+        # (connection, request id) → (command name, collection, command doc)
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str, Any]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        name = event.command_name
+        collection = event.command.get(name)
+        self._pending[(event.connection_id, event.request_id)] = (
+            name, collection if isinstance(collection, str) else "", event.command
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, "ok")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, "error")
+
+    def _finish(self, event, outcome: str) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        name, collection, command = pending
+        duration_ms = event.duration_micros / 1000
+        mongo_command_duration.observe(duration_ms / 1000, name, collection, outcome)
+
+        tally = _request.get()
+        if tally is not None:
+            tally.count += 1
+            tally.total_ms += duration_ms
+            tally.shapes[_shape_key(name, collection, command)] += 1
+
+        if duration_ms >= settings.mongodb_slow_command_ms:
+            logger.warning(
+                "Slow Mongo %s on %s: %.1fms filter=%s (%s)",
+                name, collection, duration_ms, _filter_shape(name, command), outcome,
+            )
+
+
+def begin_request() -> RequestQueries:
+    """Start attributing commands to a new request (call from the request's context)."""
+    tally = RequestQueries()
+    _request.set(tally)
+    return tally
+
+
+def finish_request(tally: RequestQueries, method: str, route: str) -> None:
+    mongo_commands_per_request.observe(tally.count, route)
+    if tally.count > settings.mongodb_request_query_limit:
+        logger.warning(
+            "%s %s issued %d Mongo commands (%.1fms); most repeated: %s",
+            method, route, tally.count, tally.total_ms, tally.shapes.most_common(3),
+        )
@@ -0,0 +1,188 @@
+"""
+Profiler — on-demand per-request CPU sampling and tracemalloc snapshots.
+
+Request profiles: ProfilingMiddleware registers its own frame as a marker
+while a profiled request runs. A sampler thread reads the event-loop thread's
+stack every PROFILE_INTERVAL_MS and, whenever the marker frame is on it, counts
+the frames below the marker for that request. Concurrent requests therefore
+never pollute each other's profile. Results are collapsed stacks
+(`frame;frame;frame count`), ready for flamegraph.pl or speedscope.
+Work pushed to executor threads is not sampled.
+
+Memory: tracemalloc can be started, snapshotted and diffed at runtime, so
+growth can be pinned to a source line (the rate-limit `_windows`, cached
+sessions, large generation dicts, ...) without a restart.
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from config import get_settings
+
+settings = get_settings()
+
+MAX_DEPTH = 200
+
+_profiles: Deque["Profile"] = deque(maxlen=settings.profile_keep)
+_active: Dict[int, "Profile"] = {}  # id(marker frame) → profile
+_wake = threading.Event()
+_sampler: Optional[threading.Thread] = None
+_sampler_lock = threading.Lock()
+_loop_thread_id: Optional[int] = None
+
+
+class Profile:
+    def __init__(self, method: str, path: str):
+        self.id = os.urandom(6).hex()
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.duration_ms = 0.0
+        self.status: Optional[int] = None
+        self.stacks: Counter = Counter()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "duration_ms": round(self.duration_ms, 1),
+            "samples": sum(self.stacks.values()),
+            "interval_ms": settings.profile_interval_ms,
+        }
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _sample_loop() -> None:
+    interval = settings.profile_interval_ms / 1000
+    while True:
+        if not _active:
+            _wake.wait()
+            _wake.clear()
+            continue
+        time.sleep(interval)
+        frame = sys._current_frames().get(_loop_thread_id)
+        names: List[str] = []
+        depth = 0
+        while frame is not None and depth < MAX_DEPTH:
+            profile = _active.get(id(frame))
+            if profile is not None:
+                if names:
+                    profile.stacks[";".join(reversed(names))] += 1
+                break
+            names.append(_label(frame))
+            frame = frame.f_back
+            depth += 1
+        del frame
+
+
+def start_profile(method: str, path: str, marker) -> Profile:
+    """Begin sampling everything that runs below `marker` (the caller's frame)."""
+    global _sampler, _loop_thread_id
+    _loop_thread_id = threading.get_ident()
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="request-profiler", daemon=True)
+            _sampler.start()
+    profile = Profile(method, path)
+    _active[id(marker)] = profile
+    _wake.set()
+    return profile
+
+
+def finish_profile(profile: Profile, marker, status: Optional[int]) -> None:
+    _active.pop(id(marker), None)
+    profile.duration_ms = (time.perf_counter() - profile.start) * 1000
+    profile.status = status
+    _profiles.append(profile)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    return [p.summary() for p in reversed(_profiles)]
+
+
+def get_profile(profile_id: str) -> Optional[Profile]:
+    return next((p for p in _profiles if p.id == profile_id), None)
+
+
+# ── Memory ────────────────────────────────────────────────────
+
+_snapshots: "OrderedDict[str, tracemalloc.Snapshot]" = OrderedDict()
+MAX_SNAPSHOTS = 5  # each one holds every live allocation's traceback
+MAX_TRACE_FRAMES = 100  # deeper tracebacks cost memory per allocation for little insight
+
+
+def memory_start(frames: int = 10) -> Dict[str, Any]:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    return memory_status()
+
+
+def memory_stop() -> Dict[str, Any]:
+    tracemalloc.stop()
+    _snapshots.clear()
+    return memory_status()
+
+
+def memory_status() -> Dict[str, Any]:
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "snapshots": list(_snapshots),
+    }
+
+
+def _filtered(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    return snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def _stat(stat) -> Dict[str, Any]:
+    entry = {
+        "where": [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        entry["size_diff_bytes"] = stat.size_diff
+        entry["count_diff"] = stat.count_diff
+    return entry
+
+
+def memory_snapshot(group_by: str = "lineno", limit: int = 25) -> Dict[str, Any]:
+    """Take a snapshot; raises RuntimeError when tracemalloc is not running."""
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running.")
+    snapshot = _filtered(tracemalloc.take_snapshot())
+    snapshot_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+    _snapshots[snapshot_id] = snapshot
+    while len(_snapshots) > MAX_SNAPSHOTS:
+        _snapshots.popitem(last=False)
+    return {"id": snapshot_id, "top": [_stat(s) for s in snapshot.statistics(group_by)[:limit]]}
+
+
+def memory_diff(base: str, target: str, group_by: str = "lineno", limit: int = 25) -> List[Dict[str, Any]]:
+    """Largest allocation changes between two snapshots; raises KeyError for unknown ids."""
+    stats = _snapshots[target].compare_to(_snapshots[base], group_by)
+    return [_stat(s) for s in stats[:limit]]
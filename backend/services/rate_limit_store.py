@@ -0,0 +1,331 @@
+"""
+Rate-limit counter stores — where RateLimitMiddleware keeps its per-client counts.
+
+All stores use the same sliding-window approximation: one integer counter per
+(bucket key, window index), with the previous window's count weighted by how
+much of it still overlaps the sliding window. A request may charge several
+buckets at once; the check-and-increment across all of them is atomic and
+all-or-nothing, and happens in a single store operation (one round-trip).
+
+Backends (RATE_LIMIT_BACKEND):
+  memory  — per-process dict (default; the limit applies per worker)
+  shm     — mmap'd file shared by every worker on one host, guarded by flock
+  redis   — any Redis-protocol server, one EVAL per request
+"""
+import asyncio
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import time
+from functools import lru_cache
+from typing import List, Tuple
+from urllib.parse import urlparse
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def _window_position(now: float, window: int) -> Tuple[int, float]:
+    """Return (current window index, weight of the previous window)."""
+    index = int(now // window)
+    elapsed = now - index * window
+    # Rounded as the Redis store sends it, so every backend floors the same products
+    return index, round(1.0 - elapsed / window, 6)
+
+
+# (bucket key, cost, limit)
+Charge = Tuple[str, int, int]
+
+
+class RateLimitStore:
+    """Base class. `hit` applies every charge only if all of them fit."""
+
+    async def hit(self, charges: List[Charge], window: int) -> Tuple[bool, List[int]]:
+        """
+        Return (allowed, used) where `used` holds each bucket's usage,
+        including this hit when allowed.
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+# ── In-process ────────────────────────────────────────────────
+
+# key → [window index, current count, previous count]
+_windows: dict[str, list] = {}
+_SWEEP_THRESHOLD = 10_000
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    async def hit(self, charges: List[Charge], window: int) -> Tuple[bool, List[int]]:
+        index, weight = _window_position(time.time(), window)
+        slots, used, allowed = [], [], True
+        for key, cost, limit in charges:
+            slot = _windows.get(key)
+            if slot is None:
+                if len(_windows) >= _SWEEP_THRESHOLD:
+                    self._sweep(index)
+                slot = _windows[key] = [index, 0, 0]
+            elif slot[0] != index:
+                slot[2] = slot[1] if slot[0] == index - 1 else 0
+                slot[1] = 0
+                slot[0] = index
+            slots.append(slot)
+            used.append(int(slot[2] * weight + slot[1]))
+            allowed = allowed and used[-1] + cost <= limit
+
+        if allowed:
+            for i, (slot, (_, cost, _)) in enumerate(zip(slots, charges)):
+                slot[1] += cost
+                used[i] += cost
+        return allowed, used
+
+    @staticmethod
+    def _sweep(index: int) -> None:
+        """Drop clients that have been idle for more than a full window."""
+        for key in [k for k, s in _windows.items() if s[0] < index - 1]:
+            del _windows[key]
+
+
+# ── Shared memory (one host, many workers) ────────────────────
+
+# key hash (u64), window index (i64), current count (u32), previous count (u32)
+_SLOT = struct.Struct("<QqII")
+_MAX_PROBES = 8
+# The lock is held for microseconds; give up after about half a second of retries
+_LOCK_RETRY_S = 0.001
+_LOCK_ATTEMPTS = 500
+
+
+class SharedMemoryRateLimitStore(RateLimitStore):
+    """
+    Fixed-size open-addressing table in an mmap'd file (tmpfs by default).
+    Every worker maps the same file; an exclusive flock makes each
+    check-and-increment atomic across processes.
+    """
+
+    def __init__(self, path: str, slots: int):
+        self.slots = slots
+        size = slots * _SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # No lock needed: workers racing here all grow the file to the same size,
+        # and growing it keeps the slots already written.
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    async def hit(self, charges: List[Charge], window: int) -> Tuple[bool, List[int]]:
+        index, weight = _window_position(time.time(), window)
+        await self._lock()
+        try:
+            slots, used, allowed = [], [], True
+            for key, cost, limit in charges:
+                slot = self._claim(key, index)
+                slots.append(slot and (*slot, cost))
+                if slot is None:
+                    # Table saturated around this hash: fail open for this bucket.
+                    used.append(0)
+                    continue
+                _, _, current, previous = slot
+                used.append(int(previous * weight + current))
+                allowed = allowed and used[-1] + cost <= limit
+
+            for i, slot in enumerate(slots):
+                if slot is None:
+                    continue
+                offset, key_hash, current, previous, cost = slot
+                if allowed:
+                    current += cost
+                    used[i] += cost
+                _SLOT.pack_into(self._map, offset, key_hash, index, current, previous)
+            return allowed, used
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    async def _lock(self) -> None:
+        """
+        Take the flock without blocking the event loop: while another worker
+        holds it, yield and try again. TimeoutError after _LOCK_ATTEMPTS tries,
+        so the middleware fails open rather than queueing requests behind it.
+        """
+        for _ in range(_LOCK_ATTEMPTS):
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                await asyncio.sleep(_LOCK_RETRY_S)
+        raise TimeoutError("Rate-limit table is locked by another worker.")
+
+    def _claim(self, key: str, index: int):
+        """Find (or claim) the slot for `key`; caller holds the lock."""
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        start = key_hash % self.slots
+        offset, state = None, None
+        for probe in range(_MAX_PROBES):
+            candidate = ((start + probe) % self.slots) * _SLOT.size
+            slot_hash, slot_index, current, previous = _SLOT.unpack_from(self._map, candidate)
+            if slot_hash == key_hash:
+                offset, state = candidate, (slot_index, current, previous)
+                break
+            if offset is None and (slot_hash == 0 or slot_index < index - 1):
+                # Empty or stale — claim it unless the key turns up further along.
+                offset, state = candidate, (index, 0, 0)
+        if offset is None:
+            return None
+        slot_index, current, previous = state
+        if slot_index != index:
+            previous = current if slot_index == index - 1 else 0
+            current = 0
+        return offset, key_hash, current, previous
+
+    async def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+# ── Redis protocol ────────────────────────────────────────────
+
+# KEYS: current/previous counter pairs, one pair per bucket.
+# ARGV: previous-window weight, ttl, then a cost/limit pair per bucket.
+_HIT_SCRIPT = """
+local weight = tonumber(ARGV[1])
+local used = {}
+local allowed = 1
+for i = 1, #KEYS / 2 do
+  local cur = tonumber(redis.call('GET', KEYS[2 * i - 1]) or '0')
+  local prev = tonumber(redis.call('GET', KEYS[2 * i]) or '0')
+  used[i] = math.floor(prev * weight + cur)
+  if used[i] + tonumber(ARGV[2 * i + 1]) > tonumber(ARGV[2 * i + 2]) then
+    allowed = 0
+  end
+end
+if allowed == 1 then
+  for i = 1, #KEYS / 2 do
+    local cost = tonumber(ARGV[2 * i + 1])
+    redis.call('INCRBY', KEYS[2 * i - 1], cost)
+    redis.call('EXPIRE', KEYS[2 * i - 1], ARGV[2])
+    used[i] = used[i] + cost
+  end
+end
+table.insert(used, 1, allowed)
+return used
+"""
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """
+    Minimal RESP client — one EVAL per hit, so the reads, limit checks and
+    INCRBYs for every bucket run atomically on the server in a single round-trip.
+    """
+
+    def __init__(self, url: str, prefix: str = "cineforge:rl:", timeout: float = 0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout  # per connect and per reply; the middleware fails open past it
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def hit(self, charges: List[Charge], window: int) -> Tuple[bool, List[int]]:
+        index, weight = _window_position(time.time(), window)
+        keys, argv = [], [f"{weight:.6f}", str(window * 2)]
+        for key, cost, limit in charges:
+            keys += [f"{self.prefix}{key}:{index}", f"{self.prefix}{key}:{index - 1}"]
+            argv += [str(cost), str(limit)]
+        reply = await self._command("EVAL", _HIT_SCRIPT, str(len(keys)), *keys, *argv)
+        return bool(reply[0]), [int(u) for u in reply[1:]]
+
+    async def _command(self, *args: str):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections are bound to the loop that opened them.
+            self._reader = self._writer = None
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        async with self._lock:
+            if self._writer is None:
+                await self._connect()
+            try:
+                self._writer.write(_encode(args))
+                await asyncio.wait_for(self._writer.drain(), self.timeout)
+                return await asyncio.wait_for(_read_reply(self._reader), self.timeout)
+            except BaseException:
+                # Timeout, cancellation or a broken reply: whatever is left unread on
+                # the socket belongs to this command, so the next one needs a fresh one.
+                self._drop()
+                raise
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout,
+        )
+        try:
+            if self.password:
+                self._writer.write(_encode(("AUTH", self.password)))
+                await asyncio.wait_for(_read_reply(self._reader), self.timeout)
+            if self.db:
+                self._writer.write(_encode(("SELECT", str(self.db))))
+                await asyncio.wait_for(_read_reply(self._reader), self.timeout)
+        except BaseException:
+            self._drop()
+            raise
+
+    def _drop(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def close(self) -> None:
+        self._drop()
+
+
+def _encode(args) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg.encode() if isinstance(arg, str) else arg
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = (await reader.readuntil(b"\r\n"))[:-2]
+    kind, body = line[:1], line[1:]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise RuntimeError(f"Redis error: {body.decode()}")
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise RuntimeError(f"Unexpected Redis reply: {line[:50]!r}")
+
+
+@lru_cache()
+def get_rate_limit_store() -> RateLimitStore:
+    """Singleton store selected by RATE_LIMIT_BACKEND."""
+    s = get_settings()
+    if s.rate_limit_backend == "shm":
+        return SharedMemoryRateLimitStore(s.rate_limit_shm_path, s.rate_limit_shm_slots)
+    if s.rate_limit_backend == "redis":
+        return RedisRateLimitStore(s.rate_limit_redis_url, timeout=s.rate_limit_redis_timeout_s)
+    return MemoryRateLimitStore()
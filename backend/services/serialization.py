@@ -0,0 +1,51 @@
+"""
+Fast JSON path for trusted documents read back from MongoDB.
+
+Data we wrote ourselves was validated on the way in, so read-only routes can
+skip rebuilding Pydantic models and let orjson serialize the documents
+directly. ObjectId becomes a string; datetimes are ISO 8601 with a `Z` suffix
+for UTC, matching what Pydantic would have produced.
+
+Documents fetched as RawBSONDocument stay as wire bytes until the encoder
+reaches them; each nested document is then decoded in one C-level pass and
+dropped as soon as it has been written. Arrays of documents can be streamed
+element by element with `iter_json_array`, so only one is alive at a time.
+"""
+from typing import Iterable, Iterator
+
+import bson
+import orjson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from starlette.responses import Response
+
+
+def _default(obj):
+    if isinstance(obj, RawBSONDocument):
+        return bson.decode(obj.raw)
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def iter_json_array(items: Iterable) -> Iterator[bytes]:
+    """Encode an iterable as a JSON array, one element per chunk."""
+    yield b"["
+    separator = b""
+    for item in items:
+        yield separator + dumps(item)
+        separator = b","
+    yield b"]"
+
+
+class FastJSONResponse(Response):
+    """JSONResponse without validation; returning it bypasses `response_model` serialization."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
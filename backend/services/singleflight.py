@@ -0,0 +1,56 @@
+"""
+Single-flight — concurrent callers with the same key share one in-flight call.
+
+    result = await flights.do(key, lambda: expensive(...))
+
+The first caller starts the work as its own task; callers arriving while it
+runs await the same task through `asyncio.shield`, so a caller that is
+cancelled (client disconnected) only stops waiting. The shared task is
+reference-counted and cancelled once its last waiter has gone. Once it
+finishes, the key is free again — later callers find the result in the
+response cache instead.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from services.metrics import llm_single_flight
+from services.tracing import current_span
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.get_running_loop().create_task(fn()))
+            flight.task.add_done_callback(lambda _: self._release(key, flight))
+        else:
+            llm_single_flight.inc(self.name, "joined")
+            span = current_span()
+            if span is not None:
+                span.set(coalesced=True)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                llm_single_flight.inc(self.name, "abandoned")
+                flight.task.cancel()
+                self._release(key, flight)
+
+    def _release(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,390 @@
+"""
+SQLite storage — an embedded backend for db_service (STORAGE_BACKEND=sqlite).
+
+Implements the slice of the pymongo Database / Collection API that
+db_service uses (find / find_one with sort, skip and limit, insert_one,
+update_one, find_one_and_update, delete_one / delete_many, list_indexes /
+create_indexes, command("ping")), so every db_service function runs
+unchanged against either backend.
+
+Each collection is a table of (id, doc) rows, `doc` being JSON queried
+through SQLite's JSON1 functions. Datetimes and ObjectIds are stored as
+{"$date": ...} / {"$oid": ...}; `_field` unwraps them so filters and sorts
+compare ISO strings and hex ids, which order the same way the originals do.
+Declared indexes become expression indexes over the same `_field`
+expressions, so the planner uses them for the same queries Mongo would.
+
+The database runs in WAL mode with one connection per thread: readers
+never block the writer, and writes are single-statement or BEGIN IMMEDIATE
+transactions.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import DeleteResult, InsertOneResult, UpdateResult
+
+_COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+# BSON $type alias → json_type() result (only the aliases that map one-to-one)
+_JSON_TYPES = {"string": "text", "int": "integer", "double": "real", "null": "null", "object": "object", "array": "array"}
+
+
+# ── Encoding ──────────────────────────────────────────────────
+
+def _iso(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    # Millisecond precision, like BSON dates; fixed width so strings sort chronologically
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": _iso(value)}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    raise TypeError(f"Cannot store {type(value).__name__}")
+
+
+def _hook(obj: dict) -> Any:
+    if len(obj) == 1:
+        if "$date" in obj:
+            # Naive UTC, as pymongo returns by default
+            return datetime.strptime(obj["$date"], "%Y-%m-%dT%H:%M:%S.%fZ")
+        if "$oid" in obj:
+            return ObjectId(obj["$oid"])
+    return obj
+
+
+def _dumps(doc: dict) -> str:
+    return json.dumps(doc, default=_default, separators=(",", ":"))
+
+
+def _loads(text: str) -> dict:
+    return json.loads(text, object_hook=_hook)
+
+
+def _key(value: Any) -> str:
+    """Primary-key text for an _id."""
+    return str(value) if isinstance(value, ObjectId) else json.dumps(value, default=_default)
+
+
+def _literal(value: Any) -> Any:
+    """A query value as it compares against `_field` expressions."""
+    if isinstance(value, datetime):
+        return _iso(value)
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _path(field: str) -> str:
+    return "$." + ".".join(f'"{part}"' for part in field.split("."))
+
+
+def _field(field: str) -> str:
+    """SQL expression for a document field, with $date / $oid wrappers unwrapped."""
+    if field == "_id":
+        return "id"
+    p = _path(field)
+    return f"""COALESCE(json_extract(doc, '{p}."$date"'), json_extract(doc, '{p}."$oid"'), json_extract(doc, '{p}'))"""
+
+
+# ── Query translation ─────────────────────────────────────────
+
+def _where(filter: Optional[dict]) -> Tuple[str, List[Any]]:
+    if not filter:
+        return "1", []
+    clauses, params = [], []
+    for field, cond in filter.items():
+        if field in ("$or", "$and"):
+            parts = [_where(sub) for sub in cond]
+            joiner = " OR " if field == "$or" else " AND "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            params += [p for _, ps in parts for p in ps]
+        elif isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            for op, value in cond.items():
+                sql, ps = _operator(field, op, value)
+                clauses.append(sql)
+                params += ps
+        else:
+            sql, ps = _operator(field, "$eq", cond)
+            clauses.append(sql)
+            params += ps
+    return " AND ".join(clauses), params
+
+
+def _operator(field: str, op: str, value: Any) -> Tuple[str, List[Any]]:
+    expr = _field(field)
+    if op == "$eq":
+        if value is None:
+            return f"{expr} IS NULL", []
+        return f"{expr} = ?", [_param(field, value)]
+    if op == "$ne":
+        return f"{expr} IS NOT ?", [_param(field, value)]
+    if op in _COMPARISONS:
+        return f"{expr} {_COMPARISONS[op]} ?", [_param(field, value)]
+    if op in ("$in", "$nin"):
+        marks = ",".join("?" * len(value)) or "NULL"
+        neg = "NOT " if op == "$nin" else ""
+        return f"{expr} {neg}IN ({marks})", [_param(field, v) for v in value]
+    if op == "$exists":
+        return f"json_type(doc, '{_path(field)}') IS {'NOT ' if value else ''}NULL", []
+    if op == "$type":
+        return f"json_type(doc, '{_path(field)}') = ?", [_JSON_TYPES.get(value, value)]
+    raise ValueError(f"Unsupported query operator {op}")
+
+
+def _param(field: str, value: Any) -> Any:
+    return _key(value) if field == "_id" else _literal(value)
+
+
+def _order(sort: Optional[Sequence[Tuple[str, int]]]) -> str:
+    if not sort:
+        return ""
+    return " ORDER BY " + ", ".join(f"{_field(f)} {'DESC' if d == -1 else 'ASC'}" for f, d in sort)
+
+
+def _project(doc: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return doc
+    if any(projection.values()):
+        keep = {f for f, on in projection.items() if on} | ({"_id"} if projection.get("_id", 1) else set())
+        return {k: v for k, v in doc.items() if k in keep}
+    return {k: v for k, v in doc.items() if k not in projection}
+
+
+# ── Updates (applied in Python inside the write transaction) ──
+
+def _set_path(doc: dict, field: str, value: Any) -> None:
+    *parents, leaf = field.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[leaf] = value
+
+
+def _get_path(doc: dict, field: str) -> Any:
+    for part in field.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+
+def _apply(doc: dict, update: dict, inserting: bool) -> dict:
+    doc = json.loads(_dumps(doc), object_hook=_hook)  # private copy
+    for op, fields in update.items():
+        for field, value in fields.items():
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                _set_path(doc, field, value)
+            elif op == "$unset":
+                *parents, leaf = field.split(".")
+                parent = _get_path(doc, ".".join(parents)) if parents else doc
+                if isinstance(parent, dict):
+                    parent.pop(leaf, None)
+            elif op == "$inc":
+                _set_path(doc, field, (_get_path(doc, field) or 0) + value)
+            elif op in ("$min", "$max"):
+                current = _get_path(doc, field)
+                if current is None or (value < current if op == "$min" else value > current):
+                    _set_path(doc, field, value)
+            elif op != "$setOnInsert":
+                raise ValueError(f"Unsupported update operator {op}")
+    return doc
+
+
+# ── Collections ───────────────────────────────────────────────
+
+class SQLiteCursor:
+    def __init__(self, collection: "SQLiteCollection", filter: Optional[dict], projection: Optional[dict]):
+        self._collection = collection
+        self._filter = filter
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._limit = 0
+        self._skip = 0
+
+    def sort(self, key, direction: int = 1) -> "SQLiteCursor":
+        self._sort = list(key) if isinstance(key, list) else [(key, direction)]
+        return self
+
+    def limit(self, n: int) -> "SQLiteCursor":
+        self._limit = n
+        return self
+
+    def skip(self, n: int) -> "SQLiteCursor":
+        self._skip = n
+        return self
+
+    def __iter__(self) -> Iterator[dict]:
+        where, params = _where(self._filter)
+        sql = f'SELECT doc FROM "{self._collection.name}" WHERE {where}{_order(self._sort)}'
+        if self._limit or self._skip:
+            sql += f" LIMIT {int(self._limit) or -1} OFFSET {int(self._skip)}"
+        for (text,) in self._collection._conn().execute(sql, params):
+            yield _project(_loads(text), self._projection)
+
+
+class SQLiteCollection:
+    def __init__(self, database: "SQLiteDatabase", name: str):
+        self.database = database
+        self.name = name
+
+    def _conn(self) -> sqlite3.Connection:
+        return self.database._conn(self.name)
+
+    def with_options(self, **_) -> "SQLiteCollection":
+        """Codec options are a pymongo decoding concern; documents here are always dicts."""
+        return self
+
+    # ── Reads ──
+
+    def find(self, filter: Optional[dict] = None, projection: Optional[dict] = None) -> SQLiteCursor:
+        return SQLiteCursor(self, filter, projection)
+
+    def find_one(self, filter: Optional[dict] = None, projection: Optional[dict] = None, sort=None) -> Optional[dict]:
+        cursor = self.find(filter, projection).limit(1)
+        if sort:
+            cursor.sort(sort)
+        return next(iter(cursor), None)
+
+    def count_documents(self, filter: dict) -> int:
+        where, params = _where(filter)
+        return self._conn().execute(f'SELECT COUNT(*) FROM "{self.name}" WHERE {where}', params).fetchone()[0]
+
+    # ── Writes ──
+
+    def insert_one(self, document: dict) -> InsertOneResult:
+        document.setdefault("_id", ObjectId())
+        try:
+            self._conn().execute(
+                f'INSERT INTO "{self.name}" (id, doc) VALUES (?, ?)', (_key(document["_id"]), _dumps(document))
+            )
+        except sqlite3.IntegrityError as exc:
+            raise DuplicateKeyError(str(exc), 11000) from exc
+        return InsertOneResult(document["_id"], True)
+
+    def _modify(self, filter: dict, update: dict, upsert: bool, sort=None) -> Tuple[Optional[dict], Optional[dict], bool]:
+        """Atomically update the first match; returns (before, after, upserted)."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            where, params = _where(filter)
+            row = conn.execute(
+                f'SELECT doc FROM "{self.name}" WHERE {where}{_order(sort)} LIMIT 1', params
+            ).fetchone()
+            if row is None and not upsert:
+                conn.execute("COMMIT")
+                return None, None, False
+            before = _loads(row[0]) if row else None
+            if before is None:
+                seed = {k: v for k, v in filter.items() if not k.startswith("$") and not isinstance(v, dict)}
+                after = _apply(seed, update, inserting=True)
+                after.setdefault("_id", ObjectId())
+                conn.execute(f'INSERT INTO "{self.name}" (id, doc) VALUES (?, ?)', (_key(after["_id"]), _dumps(after)))
+            else:
+                after = _apply(before, update, inserting=False)
+                conn.execute(f'UPDATE "{self.name}" SET doc = ? WHERE id = ?', (_dumps(after), _key(before["_id"])))
+            conn.execute("COMMIT")
+            after = _loads(_dumps(after))  # as stored (millisecond dates), like the doc Mongo returns
+        except sqlite3.IntegrityError as exc:
+            conn.execute("ROLLBACK")
+            raise DuplicateKeyError(str(exc), 11000) from exc
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return before, after, before is None
+
+    def update_one(self, filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        before, after, upserted = self._modify(filter, update, upsert)
+        raw: Dict[str, Any] = {"n": int(after is not None), "nModified": int(before is not None and before != after)}
+        if upserted:
+            raw["upserted"] = after["_id"]
+        return UpdateResult(raw, True)
+
+    def find_one_and_update(self, filter: dict, update: dict, projection: Optional[dict] = None,
+                            sort=None, upsert: bool = False, return_document: bool = False) -> Optional[dict]:
+        before, after, _ = self._modify(filter, update, upsert, sort)
+        doc = after if return_document else before
+        return _project(doc, projection) if doc is not None else None
+
+    def delete_one(self, filter: dict) -> DeleteResult:
+        where, params = _where(filter)
+        cur = self._conn().execute(
+            f'DELETE FROM "{self.name}" WHERE id = (SELECT id FROM "{self.name}" WHERE {where} LIMIT 1)', params
+        )
+        return DeleteResult({"n": cur.rowcount}, True)
+
+    def delete_many(self, filter: dict) -> DeleteResult:
+        where, params = _where(filter)
+        cur = self._conn().execute(f'DELETE FROM "{self.name}" WHERE {where}', params)
+        return DeleteResult({"n": cur.rowcount}, True)
+
+    # ── Indexes ──
+
+    def list_indexes(self) -> List[dict]:
+        rows = self._conn().execute("SELECT spec FROM _indexes WHERE collection = ?", (self.name,))
+        return [{"name": "_id_", "key": {"_id": 1}}] + [json.loads(spec) for (spec,) in rows]
+
+    def create_indexes(self, models) -> List[str]:
+        """Build each pymongo IndexModel as an expression index over the same `_field`s."""
+        names = []
+        conn = self._conn()
+        for model in models:
+            spec = dict(model.document)
+            spec["key"] = dict(spec["key"])
+            columns = ", ".join(f"{_field(f)} {'DESC' if d == -1 else 'ASC'}" for f, d in spec["key"].items())
+            unique = "UNIQUE " if spec.get("unique") else ""
+            conn.execute(f'CREATE {unique}INDEX IF NOT EXISTS "{self.name}.{spec["name"]}" ON "{self.name}" ({columns})')
+            conn.execute(
+                "INSERT OR REPLACE INTO _indexes (collection, name, spec) VALUES (?, ?, ?)",
+                (self.name, spec["name"], json.dumps(spec)),
+            )
+            names.append(spec["name"])
+        return names
+
+
+class SQLiteDatabase:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._collections: Dict[str, SQLiteCollection] = {}
+        self._tables: set = set()
+        self._lock = threading.Lock()
+
+    def _conn(self, table: Optional[str] = None) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; multi-statement writes take BEGIN IMMEDIATE explicitly
+            conn = self._local.conn = sqlite3.connect(self.path, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS _indexes (collection TEXT, name TEXT, spec TEXT, PRIMARY KEY (collection, name))")
+        if table is not None and table not in self._tables:
+            with self._lock:
+                conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id TEXT PRIMARY KEY, doc TEXT NOT NULL)')
+                self._tables.add(table)
+        return conn
+
+    def __getitem__(self, name: str) -> SQLiteCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = SQLiteCollection(self, name)
+        return collection
+
+    def __getattr__(self, name: str) -> SQLiteCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def command(self, name: str) -> dict:
+        if name != "ping":
+            raise ValueError(f"Unsupported command {name}")
+        self._conn().execute("SELECT 1").fetchone()
+        return {"ok": 1.0}
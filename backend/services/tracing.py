@@ -0,0 +1,246 @@
+"""
+Tracing — lightweight spans with contextvar propagation and background export.
+
+    with span("llm.gemini.rest", model=settings.gemini_model):
+        ...
+
+Spans nest through a ContextVar, so coroutines, child tasks and executor jobs
+submitted through `run_in_executor` below all attach to the right parent.
+Finished spans are queued and shipped by a background thread, either as JSON
+lines to a local file or as OTLP/HTTP JSON to a collector.
+
+TRACE_EXPORTER = file | otlp  (empty disables tracing; `span` is then a no-op)
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attrs", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    traceparent = None
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+_UNSAMPLED = object()  # marks a trace the root decided not to record
+_current: contextvars.ContextVar = contextvars.ContextVar("cineforge_span", default=None)
+_queue: queue.Queue = queue.Queue(maxsize=10_000)
+_exporter: Optional[threading.Thread] = None
+_stop = threading.Event()
+_HEX_DIGITS = frozenset("0123456789abcdef")  # lowercase only, per W3C trace context
+
+
+def enabled() -> bool:
+    return bool(settings.trace_exporter)
+
+
+def current_span() -> Optional[Span]:
+    cur = _current.get()
+    return cur if isinstance(cur, Span) else None
+
+
+def _hex(value: str, length: int) -> bool:
+    return len(value) == length and all(c in _HEX_DIGITS for c in value)
+
+
+def parse_traceparent(header: str) -> Optional[Tuple[str, str, bool]]:
+    """W3C traceparent → (trace_id, parent span id, sampled), or None if malformed (a new trace starts)."""
+    parts = header.strip().split("-")
+    if len(parts) < 4 or not _hex(parts[0], 2) or parts[0] == "ff":
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    if version == "00" and len(parts) != 4:
+        return None
+    if not (_hex(trace_id, 32) and _hex(parent_id, 16) and _hex(flags, 2)):
+        return None
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+@contextmanager
+def span(name: str, parent: Optional[Tuple[str, str, bool]] = None, **attrs: Any):
+    """Open a child of the current span (or a new trace, continuing `parent` if given)."""
+    cur = _current.get() if enabled() else _UNSAMPLED
+    if cur is _UNSAMPLED:
+        yield _NOOP
+        return
+    if cur is None:
+        if parent:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = random.random() < settings.trace_sample_rate
+        if not sampled:
+            token = _current.set(_UNSAMPLED)
+            try:
+                yield _NOOP
+            finally:
+                _current.reset(token)
+            return
+    else:
+        trace_id, parent_id = cur.trace_id, cur.span_id
+
+    s = Span(name, trace_id, parent_id, attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as exc:
+        s.error = f"{type(exc).__name__}: {exc}"[:300]
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current.reset(token)
+        try:
+            _queue.put_nowait(s)
+        except queue.Full:
+            pass
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of `span` for sync and async functions."""
+    def decorator(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def run_in_executor(executor, fn: Callable, *args: Any) -> asyncio.Future:
+    """loop.run_in_executor that carries the caller's context (and span) into the worker."""
+    ctx = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(executor, functools.partial(ctx.run, fn, *args))
+
+
+# ── Export ────────────────────────────────────────────────────
+
+def _write_file(batch: List[Span]) -> None:
+    with open(settings.trace_file_path, "a", encoding="utf-8") as f:
+        for s in batch:
+            f.write(json.dumps(s.to_dict(), default=str) + "\n")
+
+
+def _write_otlp(batch: List[Span]) -> None:
+    def attrs(d: Dict[str, Any]) -> list:
+        return [{"key": k, "value": {"stringValue": str(v)}} for k, v in d.items()]
+
+    body = {"resourceSpans": [{
+        "resource": {"attributes": attrs({"service.name": "cineforge-api"})},
+        "scopeSpans": [{
+            "scope": {"name": "cineforge"},
+            "spans": [{
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                "parentSpanId": s.parent_id or "",
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns),
+                "attributes": attrs(s.attrs),
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            } for s in batch],
+        }],
+    }]}
+    req = urllib.request.Request(
+        settings.trace_otlp_endpoint,
+        data=json.dumps(body, default=str).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    urllib.request.urlopen(req, timeout=5).close()
+
+
+def _export_loop(write: Callable[[List[Span]], None]) -> None:
+    while not (_stop.is_set() and _queue.empty()):
+        try:
+            batch = [_queue.get(timeout=1.0)]
+        except queue.Empty:
+            continue
+        while len(batch) < 512:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            write(batch)
+        except Exception as exc:
+            logger.warning("Dropped %d spans: %s", len(batch), exc)
+
+
+def start_exporter() -> None:
+    global _exporter
+    if not enabled() or _exporter is not None:
+        return
+    write = _write_otlp if settings.trace_exporter == "otlp" else _write_file
+    _stop.clear()
+    _exporter = threading.Thread(target=_export_loop, args=(write,), name="trace-exporter", daemon=True)
+    _exporter.start()
+
+
+def stop_exporter() -> None:
+    """Flush queued spans and stop the exporter thread."""
+    global _exporter
+    if _exporter is None:
+        return
+    _stop.set()
+    _exporter.join(timeout=10)
+    _exporter = None
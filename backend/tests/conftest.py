@@ -0,0 +1,19 @@
+"""
+Shared test setup. Run from backend/:  python -m pytest tests
+
+Settings are read once, so the environment is pinned here before any app
+module is imported: no tracing, no LLM keys, SQLite as the default store.
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.update({
+    "TRACE_EXPORTER": "",
+    "HF_API_TOKEN": "",
+    "GEMINI_API_KEY": "",
+    "LLM_CACHE_ENABLED": "false",
+    "LOOP_MONITOR_ENABLED": "false",
+})
@@ -0,0 +1,175 @@
+"""Circuit breaker state transitions and retry backoff."""
+from types import SimpleNamespace
+
+import pytest
+
+from config import get_settings
+from services import circuit_breaker
+from services.circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ProviderError, ProviderUnavailable, backoff, retry_after,
+)
+
+settings = get_settings()
+FAST = 1.0
+SLOW = settings.llm_breaker_slow_call_s + 1
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(monotonic=lambda: now[0], time=lambda: 0.0))
+    return now
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    # Open periods and backoff waits take the top of their jitter range
+    monkeypatch.setattr(circuit_breaker.random, "uniform", lambda low, high: high)
+
+
+def _fail(breaker: CircuitBreaker, n: int, latency: float = FAST) -> None:
+    for _ in range(n):
+        breaker.allow()
+        breaker.record(False, latency)
+
+
+def test_opens_once_the_failure_rate_is_reached(clock):
+    breaker = CircuitBreaker("test")
+    _fail(breaker, settings.llm_breaker_min_calls - 1)
+    assert breaker.state == CLOSED  # too few calls to judge
+    _fail(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(ProviderUnavailable):
+        breaker.allow()
+
+
+def test_stays_closed_below_the_failure_rate(clock):
+    breaker = CircuitBreaker("test")
+    for i in range(20):
+        breaker.allow()
+        breaker.record(i % 3 != 0, FAST)  # a third fail
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_open_it_too(clock):
+    breaker = CircuitBreaker("test")
+    for _ in range(settings.llm_breaker_min_calls):
+        breaker.allow()
+        breaker.record(True, SLOW)
+    assert breaker.state == OPEN
+
+
+def test_old_outcomes_leave_the_window(clock):
+    breaker = CircuitBreaker("test")
+    _fail(breaker, settings.llm_breaker_min_calls - 1)
+    clock[0] += settings.llm_breaker_window_s + 1
+    _fail(breaker, 1)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_success_closes_it(clock, no_jitter):
+    breaker = CircuitBreaker("test")
+    _fail(breaker, settings.llm_breaker_min_calls)
+    clock[0] += settings.llm_breaker_open_s * 1.2 - 0.1
+    with pytest.raises(ProviderUnavailable):
+        breaker.allow()
+
+    clock[0] += 0.2
+    breaker.allow()  # the probe
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(ProviderUnavailable):
+        breaker.allow()  # only one probe at a time
+    breaker.record(True, FAST)
+    assert breaker.state == CLOSED
+    breaker.allow()
+
+
+def test_half_open_probe_failure_doubles_the_open_period(clock, no_jitter):
+    breaker = CircuitBreaker("test")
+    _fail(breaker, settings.llm_breaker_min_calls)
+    open_s = settings.llm_breaker_open_s
+    for _ in range(3):
+        clock[0] += open_s * 1.2
+        breaker.allow()
+        breaker.record(False, FAST)
+        assert breaker.state == OPEN
+        open_s = min(open_s * 2, settings.llm_breaker_max_open_s)
+        assert breaker.snapshot()["retry_in_s"] == pytest.approx(open_s * 1.2, abs=0.1)
+
+    clock[0] += open_s * 1.2
+    breaker.allow()
+    breaker.record(True, FAST)
+    assert breaker.state == CLOSED
+    assert breaker._open_for == settings.llm_breaker_open_s
+
+
+def test_a_slow_probe_counts_as_failed(clock):
+    breaker = CircuitBreaker("test")
+    _fail(breaker, settings.llm_breaker_min_calls)
+    clock[0] += settings.llm_breaker_open_s * 2
+    breaker.allow()
+    breaker.record(True, SLOW)
+    assert breaker.state == OPEN
+
+
+def test_a_released_probe_lets_the_next_one_through(clock):
+    breaker = CircuitBreaker("test")
+    _fail(breaker, settings.llm_breaker_min_calls)
+    clock[0] += settings.llm_breaker_open_s * 2
+    breaker.allow()
+    breaker.release()  # cancelled before it had an outcome
+    breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+
+def test_trip_honours_retry_after_exactly(clock):
+    breaker = CircuitBreaker("test")
+    breaker.trip(300)
+    assert breaker.state == OPEN
+    clock[0] += 299.9
+    with pytest.raises(ProviderUnavailable):
+        breaker.allow()
+    clock[0] += 0.2
+    breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+
+def test_outcomes_of_calls_started_before_opening_are_ignored(clock):
+    breaker = CircuitBreaker("test")
+    _fail(breaker, settings.llm_breaker_min_calls)
+    breaker.record(True, FAST)
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["recent_calls"] == 0
+
+
+# ── Retry backoff ─────────────────────────────────────────────
+
+def test_backoff_is_exponential_and_capped(no_jitter):
+    waits = [backoff(attempt, ProviderError("503", 503)) for attempt in range(settings.llm_retry_attempts)]
+    expected = [min(settings.llm_retry_max_s, settings.llm_retry_base_s * 2 ** a)
+                for a in range(settings.llm_retry_attempts - 1)]
+    assert waits == expected + [None]  # the last attempt is not retried
+
+
+def test_backoff_is_full_jitter():
+    waits = {backoff(0, ProviderError("connection failed")) for _ in range(50)}
+    assert all(0 <= w <= settings.llm_retry_base_s for w in waits)
+    assert len(waits) > 1
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404, 422])
+def test_client_errors_are_not_retried(status):
+    assert backoff(0, ProviderError("bad request", status)) is None
+
+
+def test_retry_after_is_used_when_short_enough():
+    assert backoff(0, ProviderError("429", 429, retry_after=2.0)) == 2.0
+    assert backoff(0, ProviderError("429", 429, retry_after=settings.llm_retry_max_s + 1)) is None
+
+
+def test_retry_after_header_forms(clock):
+    assert retry_after({"Retry-After": "7"}) == 7.0
+    assert retry_after({"Retry-After": "-3"}) == 0.0
+    assert retry_after({"Retry-After": "Thu, 01 Jan 1970 00:01:00 GMT"}) == 60.0
+    assert retry_after({"Retry-After": "soon"}) is None
+    assert retry_after({}) is None
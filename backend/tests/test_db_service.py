@@ -0,0 +1,328 @@
+"""
+Storage conformance — every db_service function against the embedded SQLite
+store and against mongomock, which stands in for MongoDB. The SQLite store
+re-implements the query, update, sort and index behaviour db_service relies
+on, so both backends must give the same answers.
+
+mongomock only approximates the server. With MONGODB_URI set, every test also
+runs against that server, in a throwaway database dropped after each test:
+
+    MONGODB_URI=mongodb://localhost:27017 python -m pytest tests/test_db_service.py
+"""
+import os
+import time
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from bson import ObjectId
+from bson.codec_options import CodecOptions
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import DuplicateKeyError
+
+from services import db_service
+from services.sqlite_store import SQLiteDatabase
+
+LEASE = timedelta(minutes=2)
+EXPIRED = timedelta(seconds=-1)
+
+
+MONGODB_URI = os.environ.get("MONGODB_URI", "")
+
+
+@pytest.fixture(params=["sqlite", "mongomock", *(["mongodb"] if MONGODB_URI else [])])
+def db(request, tmp_path, monkeypatch):
+    client = None
+    if request.param == "sqlite":
+        database = SQLiteDatabase(str(tmp_path / "store.db"))
+    elif request.param == "mongomock":
+        database = mongomock.MongoClient()["cineforge"]
+        # mongomock cannot decode to RawBSONDocument; the raw reads return plain dicts there
+        monkeypatch.setattr(db_service, "_RAW", CodecOptions())
+    else:
+        client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+        database = client[f"cineforge_test_{ObjectId()}"]
+    monkeypatch.setattr(db_service, "get_db", lambda: database)
+    yield database
+    if client is not None:
+        client.drop_database(database.name)
+        client.close()
+
+
+def _tick() -> None:
+    """Stored dates have millisecond precision; keep created_at orderings strict."""
+    time.sleep(0.002)
+
+
+# ── Users ─────────────────────────────────────────────────────
+
+def test_users(db):
+    user = db_service.create_user("Ada@Example.com", "hash", "Ada")
+    assert user["email"] == "ada@example.com"
+    assert isinstance(user["id"], str)
+    assert db_service.find_user_by_email("ada@example.com")["id"] == user["id"]
+    assert db_service.find_user_by_id(user["id"])["name"] == "Ada"
+    assert db_service.find_user_by_email("nobody@example.com") is None
+
+
+def test_unique_email_index(db):
+    db_service.ensure_indexes()
+    db_service.create_user("ada@example.com", "hash", "Ada")
+    with pytest.raises(DuplicateKeyError):
+        db_service.create_user("ADA@example.com", "hash", "Ada again")
+
+
+def test_ensure_indexes_is_idempotent(db):
+    assert db_service.ensure_indexes()
+    assert db_service.ensure_indexes() == []
+
+
+# ── Projects ──────────────────────────────────────────────────
+
+def test_projects_are_listed_newest_first_per_user(db):
+    first = db_service.create_project("u1", {"title": "First"})
+    _tick()
+    second = db_service.create_project("u1", {"title": "Second"})
+    db_service.create_project("u2", {"title": "Other"})
+    assert [p["id"] for p in db_service.list_projects("u1")] == [second["id"], first["id"]]
+
+
+def test_get_project_checks_owner_and_id(db):
+    project = db_service.create_project("u1", {"title": "Mine"})
+    assert db_service.get_project(project["id"], "u1")["title"] == "Mine"
+    assert db_service.get_project(project["id"], "u2") is None
+    assert db_service.get_project("not-an-id", "u1") is None
+
+
+def test_update_project_returns_the_updated_document(db):
+    project = db_service.create_project("u1", {"title": "Draft", "genre": "noir"})
+    _tick()
+    updated = db_service.update_project(project["id"], "u1", {"title": "Final"})
+    assert updated["title"] == "Final"
+    assert updated["genre"] == "noir"
+    assert updated["updated_at"] > updated["created_at"]
+    assert db_service.update_project(project["id"], "u2", {"title": "Stolen"}) is None
+    assert db_service.get_project(project["id"], "u1")["title"] == "Final"
+
+
+def test_delete_project_cascades_to_generations(db):
+    project = db_service.create_project("u1", {"title": "Doomed"})
+    keep = db_service.create_project("u1", {"title": "Kept"})
+    db_service.save_generation(project["id"], {"screenplay": "a"})
+    db_service.save_generation(keep["id"], {"screenplay": "b"})
+    assert db_service.delete_project(project["id"], "u2") is False
+    assert db_service.delete_project(project["id"], "u1") is True
+    assert db_service.get_project_generations(project["id"]) == []
+    assert len(db_service.get_project_generations(keep["id"])) == 1
+    assert db_service.delete_project(project["id"], "u1") is False
+
+
+# ── Generations ───────────────────────────────────────────────
+
+def _history(project_id: str, n: int) -> list:
+    saved = []
+    for i in range(n):
+        saved.append(db_service.save_generation(project_id, {
+            "story_input": f"story {i}", "screenplay": f"draft {i}",
+            "shot_design": [{"scene_id": i}], "sound_design": [], "provider": "template",
+            "internal": "not part of a GenerationResult",
+        }))
+        _tick()
+    return saved
+
+
+def test_generation_history_is_newest_first(db):
+    saved = _history("p1", 3)
+    _history("p2", 1)
+    assert [g["id"] for g in db_service.get_project_generations("p1")] == [g["id"] for g in reversed(saved)]
+    assert db_service.get_latest_generation("p1")["id"] == saved[-1]["id"]
+    assert db_service.get_generation(saved[0]["id"])["screenplay"] == "draft 0"
+    assert db_service.get_generation("not-an-id") is None
+    assert db_service.get_latest_generation("missing") is None
+
+
+def test_raw_reads_project_the_result_fields(db):
+    saved = _history("p1", 3)
+    latest = db_service.get_latest_generation_raw("p1")
+    assert str(latest["_id"]) == saved[-1]["id"]
+    assert "internal" not in latest and "project_id" not in latest
+    assert [dict(scene) for scene in latest["shot_design"]] == [{"scene_id": 2}]  # RawBSONDocument from a server
+
+    history = list(db_service.get_project_generations_raw("p1"))
+    assert [str(g["_id"]) for g in history] == [g["id"] for g in reversed(saved)]
+    assert set(history[0].keys()) == {"_id", *db_service.GENERATION_FIELDS}
+    assert db_service.get_latest_generation_raw("missing") is None
+
+
+def test_update_generation_screenplay(db):
+    saved = _history("p1", 1)[0]
+    updated = db_service.update_generation_screenplay(saved["id"], "rewritten")
+    assert updated["screenplay"] == "rewritten"
+    assert updated["story_input"] == "story 0"
+    assert isinstance(updated["updated_at"], datetime)
+    assert db_service.update_generation_screenplay(str(ObjectId()), "nothing") is None
+
+
+# ── Project children ──────────────────────────────────────────
+
+def test_callsheet_budget_and_contacts(db):
+    entry = db_service.create_callsheet_entry("p1", {"name": "Lead", "available_dates": ["2026-01-02"]})
+    assert db_service.update_callsheet_entry(entry["id"], {"role": "Actor"})["role"] == "Actor"
+    assert db_service.update_callsheet_entry(entry["id"], {"unknown": 1}) is None
+    assert [e["name"] for e in db_service.get_callsheet("p1")] == ["Lead"]
+    assert db_service.delete_callsheet_entry(entry["id"]) is True
+    assert db_service.delete_callsheet_entry(entry["id"]) is False
+
+    item = db_service.create_budget_item("p1", {
+        "category_id": "c", "category_name": "Crew", "item_id": "i", "item_name": "Gaffer", "rate": 100,
+    })
+    assert db_service.update_budget_item(item["id"], {"rate": 120})["rate"] == 120
+    assert db_service.update_budget_item(str(ObjectId()), {"rate": 1}) is None
+
+    for name in ("Zed", "Amy", "Mo"):
+        db_service.create_contact("p1", {"name": name})
+    assert [c["name"] for c in db_service.get_contacts("p1")] == ["Amy", "Mo", "Zed"]
+
+
+def test_shot_designs(db):
+    design = db_service.create_shot_design("p1", {"scene_name": "Opening", "elements": [{"type": "camera"}]})
+    updated = db_service.update_shot_design(design["id"], {"elements": [{"type": "actor"}]})
+    assert updated["elements"] == [{"type": "actor"}]
+    assert db_service.get_shot_design(design["id"])["scene_name"] == "Opening"
+    assert db_service.delete_shot_design(design["id"]) is True
+    assert db_service.get_shot_designs("p1") == []
+
+
+# ── Collection API the store re-implements ────────────────────
+
+def test_find_one_and_update_return_values(db):
+    coll = db.things
+    coll.insert_one({"_id": "a", "n": 1, "tag": "x"})
+    coll.insert_one({"_id": "b", "n": 2, "tag": "x"})
+
+    before = coll.find_one_and_update({"_id": "a"}, {"$inc": {"n": 10}})
+    assert before == {"_id": "a", "n": 1, "tag": "x"}
+    after = coll.find_one_and_update({"_id": "a"}, {"$inc": {"n": 10}}, return_document=True)
+    assert after == {"_id": "a", "n": 21, "tag": "x"}
+    assert coll.find_one_and_update({"_id": "missing"}, {"$set": {"n": 0}}) is None
+    assert coll.find_one_and_update({"_id": "missing"}, {"$set": {"n": 0}}, return_document=True) is None
+
+    # sort picks which match is updated
+    top = coll.find_one_and_update({"tag": "x"}, {"$set": {"hit": True}}, sort=[("n", DESCENDING)],
+                                   return_document=True)
+    assert top["_id"] == "a"
+    low = coll.find_one_and_update({"tag": "x"}, {"$set": {"hit": True}}, sort=[("n", ASCENDING)],
+                                   projection={"n": 1})
+    assert low == {"_id": "b", "n": 2}
+
+    upserted = coll.find_one_and_update({"_id": "c"}, {"$set": {"n": 3}, "$setOnInsert": {"new": True}},
+                                        upsert=True, return_document=True)
+    assert upserted == {"_id": "c", "n": 3, "new": True}
+    assert coll.find_one_and_update({"_id": "c"}, {"$setOnInsert": {"new": False}}, upsert=True,
+                                    return_document=True)["new"] is True
+
+
+def test_update_one_and_delete_counts(db):
+    coll = db.things
+    coll.insert_one({"_id": "a", "n": 1, "nested": {"x": 1, "y": 2}})
+    result = coll.update_one({"_id": "a"}, {"$set": {"n": 1}})
+    assert (result.matched_count, result.modified_count) == (1, 0)
+    result = coll.update_one({"_id": "a"}, {"$set": {"nested.x": 5}, "$unset": {"nested.y": ""}, "$max": {"n": 4}})
+    assert (result.matched_count, result.modified_count) == (1, 1)
+    assert coll.find_one({"_id": "a"}) == {"_id": "a", "n": 4, "nested": {"x": 5}}
+    assert coll.update_one({"_id": "zz"}, {"$set": {"n": 1}}).matched_count == 0
+
+    coll.insert_one({"_id": "b", "n": 2})
+    assert coll.delete_many({"n": {"$gte": 0}}).deleted_count == 2
+    assert coll.delete_one({"_id": "a"}).deleted_count == 0
+
+
+def test_query_operators(db):
+    coll = db.things
+    for i in range(6):
+        coll.insert_one({"_id": f"d{i}", "n": i, "kind": "even" if i % 2 == 0 else "odd",
+                         **({"meta": {"flag": True}} if i < 2 else {})})
+
+    def ids(filter, skip=0, limit=0):
+        return [d["_id"] for d in coll.find(filter).sort("n", 1).skip(skip).limit(limit)]
+
+    assert ids({"n": {"$in": [1, 3, 9]}}) == ["d1", "d3"]
+    assert ids({"n": {"$nin": [0, 1, 2]}}) == ["d3", "d4", "d5"]
+    assert ids({"kind": {"$ne": "even"}}) == ["d1", "d3", "d5"]
+    assert ids({"n": {"$gt": 1, "$lte": 3}}) == ["d2", "d3"]
+    assert ids({"meta": {"$exists": True}}) == ["d0", "d1"]
+    assert ids({"meta.flag": True}) == ["d0", "d1"]
+    assert ids({"$or": [{"n": 0}, {"kind": "odd", "n": {"$gt": 3}}]}) == ["d0", "d5"]
+    assert ids({}, skip=1, limit=2) == ["d1", "d2"]
+    assert coll.count_documents({"kind": "odd"}) == 3
+    assert coll.find_one({"kind": "even"}, sort=[("n", DESCENDING)])["_id"] == "d4"
+    assert coll.find_one({"n": 1}, {"kind": 0}) == {"_id": "d1", "n": 1, "meta": {"flag": True}}
+
+
+def test_dates_compare_and_round_trip(db):
+    coll = db.things
+    now = datetime(2026, 1, 2, 3, 4, 5, 678000)
+    coll.insert_one({"_id": "a", "at": now})
+    coll.insert_one({"_id": "b", "at": now + timedelta(seconds=1)})
+    assert coll.find_one({"_id": "a"})["at"] == now
+    assert [d["_id"] for d in coll.find({"at": {"$gt": now}})] == ["b"]
+    assert [d["_id"] for d in coll.find({}).sort("at", DESCENDING)] == ["b", "a"]
+
+
+# ── Generation jobs ───────────────────────────────────────────
+
+def test_jobs_are_claimed_oldest_first(db):
+    first = db_service.create_job("u1", "p1", "story one", False)
+    _tick()
+    second = db_service.create_job("u1", "p1", "story two", True)
+    assert db_service.count_jobs("queued") == 2
+
+    claimed = db_service.claim_job("w1", LEASE)
+    assert claimed["id"] == first["id"]
+    assert claimed["status"] == "running"
+    assert claimed["attempts"] == 1
+    assert claimed["lease_owner"] == "w1"
+    assert db_service.claim_job("w2", LEASE)["id"] == second["id"]
+    assert db_service.claim_job("w3", LEASE) is None
+    assert db_service.count_jobs("running") == 2
+
+
+def test_live_lease_is_renewed_only_by_its_owner(db):
+    job = db_service.create_job("u1", "p1", "story", False)
+    db_service.claim_job("w1", LEASE)
+    assert db_service.renew_job_lease(job["id"], "w1", LEASE) is True
+    assert db_service.renew_job_lease(job["id"], "w2", LEASE) is False
+    assert db_service.claim_job("w2", LEASE) is None
+
+
+def test_expired_lease_is_reclaimed_and_the_old_owner_cannot_finish(db):
+    job = db_service.create_job("u1", "p1", "story", False)
+    db_service.claim_job("w1", EXPIRED)
+    reclaimed = db_service.claim_job("w2", LEASE)
+    assert reclaimed["id"] == job["id"]
+    assert reclaimed["attempts"] == 2
+    assert reclaimed["lease_owner"] == "w2"
+
+    assert db_service.renew_job_lease(job["id"], "w1", LEASE) is False
+    assert db_service.finish_job(job["id"], "w1", {"status": "done"}) is False
+    assert db_service.get_job(job["id"], "u1")["status"] == "running"
+
+    assert db_service.finish_job(job["id"], "w2", {"status": "done", "generation_id": "g1"}, timedelta(days=1))
+    done = db_service.get_job(job["id"], "u1")
+    assert done["status"] == "done" and done["generation_id"] == "g1"
+    assert "lease_owner" not in done and "lease_until" not in done
+    assert done["expires_at"] > datetime.utcnow()
+    assert db_service.finish_job(job["id"], "w2", {"status": "failed"}) is False
+
+
+def test_finished_jobs_are_purged_once_expired(db):
+    kept = db_service.create_job("u1", "p1", "kept", False)
+    _tick()
+    gone = db_service.create_job("u1", "p1", "gone", False)
+    for retention in (timedelta(days=1), EXPIRED):
+        claimed = db_service.claim_job("w1", LEASE)
+        db_service.finish_job(claimed["id"], "w1", {"status": "done"}, retention)
+    assert db_service.purge_expired_jobs() == 1
+    assert db_service.get_job(kept["id"], "u1") is not None
+    assert db_service.get_job(gone["id"], "u1") is None
+    assert db_service.get_job(kept["id"], "u2") is None
@@ -0,0 +1,72 @@
+"""
+Generation history route — versions are streamed, but a query that fails is
+still an error status, and a failure mid-stream never looks like a complete
+history.
+"""
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from routers import generation
+
+VERSIONS = [
+    {"_id": f"g{i}", "story_input": "A lighthouse keeper.", "screenplay": f"Draft {i}",
+     "shot_design": [], "sound_design": [], "provider": "test"}
+    for i in range(3)
+]
+
+
+def _history(fail_after=None):
+    def fetch(project_id):
+        for i, version in enumerate(VERSIONS):
+            if i == fail_after:
+                raise RuntimeError("cursor lost")
+            yield version
+    return fetch
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app = FastAPI()
+    app.include_router(generation.router)
+
+    @app.middleware("http")
+    async def user(request: Request, call_next):
+        request.state.user = SimpleNamespace(id="u1")
+        return await call_next(request)
+
+    monkeypatch.setattr(generation, "get_project", lambda project_id, user_id: {"id": project_id})
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_history_is_streamed_in_cursor_order(client, monkeypatch):
+    monkeypatch.setattr(generation, "get_project_generations_raw", _history())
+    resp = client.get("/generate/p1/history")
+    assert resp.status_code == 200
+    assert [g["screenplay"] for g in resp.json()] == ["Draft 0", "Draft 1", "Draft 2"]
+
+
+def test_empty_history(client, monkeypatch):
+    monkeypatch.setattr(generation, "get_project_generations_raw", lambda project_id: iter(()))
+    resp = client.get("/generate/p1/history")
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+
+def test_a_failing_query_is_a_server_error(client, monkeypatch):
+    monkeypatch.setattr(generation, "get_project_generations_raw", _history(fail_after=0))
+    assert client.get("/generate/p1/history").status_code == 500
+
+
+def test_a_failure_mid_stream_is_logged_and_leaves_invalid_json(client, monkeypatch, caplog):
+    monkeypatch.setattr(generation, "get_project_generations_raw", _history(fail_after=2))
+    with caplog.at_level(logging.ERROR, logger=generation.logger.name):
+        resp = client.get("/generate/p1/history")
+    assert resp.status_code == 200  # already sent when the cursor failed
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(resp.content)
+    assert "history of project p1 failed" in caplog.text
@@ -0,0 +1,202 @@
+"""
+Generation job queue — claiming, lease expiry and re-claim, and a worker that
+lost its lease must not be able to renew or finish the job. Jobs live in the
+embedded SQLite store; the generation itself is a stand-in.
+"""
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from services import db_service, job_queue
+from services.db_service import claim_job, create_job, get_job
+from services.sqlite_store import SQLiteDatabase
+
+EXPIRED = timedelta(seconds=-1)
+PACKAGE = {"screenplay": "INT. LIGHTHOUSE - NIGHT", "shot_design": [{}], "sound_design": [{}]}
+
+
+class Generation:
+    """Stands in for generate_production; blocks until released when asked to."""
+
+    def __init__(self, error=None, block=False):
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+        if not block:
+            self.release.set()
+
+    async def __call__(self, story, bypass_cache=False):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return PACKAGE, "test"
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    database = SQLiteDatabase(str(tmp_path / "store.db"))
+    monkeypatch.setattr(db_service, "get_db", lambda: database)
+    saved = iter(range(1, 1000))
+    monkeypatch.setattr(job_queue, "save_generation", lambda project_id, data: {"id": f"gen-{next(saved)}"})
+    return database
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    fake = Generation()
+    monkeypatch.setattr(job_queue, "generate_production", fake)
+    return fake
+
+
+def _job() -> dict:
+    return create_job("u1", "p1", "A lighthouse keeper finds a message in a bottle.", False)
+
+
+def _claim(lease: timedelta = job_queue.LEASE) -> dict:
+    """Claim the way a worker does: under a fresh owner token from this process."""
+    return claim_job(job_queue._claim_owner(), lease)
+
+
+def _stored(job: dict) -> dict:
+    return get_job(job["id"], "u1")
+
+
+# ── Claiming ──────────────────────────────────────────────────
+
+def test_every_claim_gets_its_own_owner_token(db):
+    _job()
+    _job()
+    first, second = _claim(), _claim()
+    assert first["lease_owner"] != second["lease_owner"]
+    assert first["lease_owner"].startswith(job_queue._owner + ":")
+    assert _claim() is None
+
+
+@pytest.mark.asyncio
+async def test_a_claimed_job_runs_to_done(db, generation):
+    job = _job()
+    await job_queue._run(_claim())
+    stored = _stored(job)
+    assert stored["status"] == "done"
+    assert stored["generation_id"] == "gen-1"
+    assert stored["provider"] == "test"
+    assert "lease_owner" not in stored and "expires_at" in stored
+
+
+@pytest.mark.asyncio
+async def test_a_failed_attempt_goes_back_to_the_queue(db, monkeypatch):
+    monkeypatch.setattr(job_queue, "generate_production", Generation(error=ValueError("provider down")))
+    job = _job()
+    for attempt in range(1, job_queue.settings.job_max_attempts):
+        await job_queue._run(_claim())
+        assert _stored(job)["status"] == "queued"
+        assert _stored(job)["attempts"] == attempt
+    await job_queue._run(_claim())
+    assert _stored(job)["status"] == "failed"
+    assert _claim() is None
+
+
+@pytest.mark.asyncio
+async def test_a_job_past_its_attempts_is_failed_without_running(db, generation):
+    job = _job()
+    for _ in range(job_queue.settings.job_max_attempts):
+        _claim(EXPIRED)  # each worker died holding it
+    await job_queue._run(_claim())
+    assert _stored(job)["status"] == "failed"
+    assert generation.calls == 0
+
+
+# ── Lease expiry ──────────────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_an_expired_lease_is_reclaimed_and_the_stale_worker_cannot_finish(db, monkeypatch):
+    slow, fast = Generation(block=True), Generation()
+    job = _job()
+    stale = _claim(EXPIRED)
+
+    monkeypatch.setattr(job_queue, "generate_production", slow)
+    running = asyncio.ensure_future(job_queue._run(stale))
+    await asyncio.sleep(0.01)
+
+    # Another worker in this same process takes the job over once the lease has run out
+    current = _claim()
+    assert current["id"] == job["id"]
+    assert current["attempts"] == 2
+
+    slow.release.set()
+    await running
+    stored = _stored(job)
+    assert stored["status"] == "running"
+    assert stored["lease_owner"] == current["lease_owner"]
+    assert "generation_id" not in stored
+
+    monkeypatch.setattr(job_queue, "generate_production", fast)
+    await job_queue._run(current)
+    stored = _stored(job)
+    assert stored["status"] == "done"
+    assert stored["generation_id"] == "gen-2"
+
+
+@pytest.mark.asyncio
+async def test_a_stale_worker_cannot_requeue_the_job_on_shutdown(db, monkeypatch):
+    slow = Generation(block=True)
+    monkeypatch.setattr(job_queue, "generate_production", slow)
+    job = _job()
+    running = asyncio.ensure_future(job_queue._run(_claim(EXPIRED)))
+    await asyncio.sleep(0.01)
+    current = _claim()
+
+    running.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await running
+    stored = _stored(job)
+    assert stored["status"] == "running"
+    assert stored["lease_owner"] == current["lease_owner"]
+
+
+@pytest.mark.asyncio
+async def test_a_stale_heartbeat_stops_instead_of_renewing(db, monkeypatch):
+    monkeypatch.setattr(job_queue, "LEASE", timedelta(milliseconds=30))
+    _job()
+    stale = _claim(EXPIRED)
+    current = _claim()
+    await asyncio.wait_for(job_queue._heartbeat(stale["id"], stale["lease_owner"]), timeout=1)
+    assert _stored(current)["lease_until"] == current["lease_until"]
+
+
+@pytest.mark.asyncio
+async def test_a_live_heartbeat_keeps_the_lease(db, monkeypatch):
+    monkeypatch.setattr(job_queue, "LEASE", timedelta(milliseconds=60))
+    job = _job()
+    claimed = claim_job(job_queue._claim_owner(), job_queue.LEASE)
+    heartbeat = asyncio.ensure_future(job_queue._heartbeat(claimed["id"], claimed["lease_owner"]))
+    await asyncio.sleep(0.15)
+    assert not heartbeat.done()
+    heartbeat.cancel()
+    assert _stored(job)["lease_until"] > claimed["lease_until"]
+    assert _claim() is None
+
+
+# ── Shutdown ──────────────────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_shutdown_hands_the_running_job_back(db, monkeypatch):
+    slow = Generation(block=True)
+    monkeypatch.setattr(job_queue, "generate_production", slow)
+    monkeypatch.setattr(job_queue.settings, "job_workers", 2)
+    job = _job()
+    job_queue.start_job_workers()
+    try:
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if slow.calls:
+                break
+        assert _stored(job)["status"] == "running"
+    finally:
+        await job_queue.stop_job_workers()
+    stored = _stored(job)
+    assert stored["status"] == "queued"
+    assert stored["attempts"] == 0
+    assert "lease_owner" not in stored
@@ -0,0 +1,119 @@
+"""
+Tolerant JSON parsing — malformed LLM output is repaired, and truncated
+output is cut back to whole top-level values and whole list elements.
+"""
+import json
+
+import pytest
+
+from services.json_repair import repair
+
+PACKAGE = {
+    "screenplay": "INT. LIGHTHOUSE - NIGHT\nThe lamp turns.",
+    "shot_design": [
+        {"id": "scene-01", "shots": [{"number": 1, "lens": "35mm", "duration": 4.5, "tags": ["wide", "slow"]}]},
+        {"id": "scene-02", "shots": [{"number": 2, "lens": "85mm", "duration": 12, "tags": []}]},
+    ],
+    "sound_design": [
+        {"scene_id": "scene-01", "music": {"track": "Tide", "tempo": "60"}, "ambient": ["surf", "wind"]},
+        {"scene_id": "scene-02", "music": {"track": "Gale", "tempo": "120"}, "ambient": ["rain"]},
+    ],
+}
+TEXT = json.dumps(PACKAGE)
+
+
+def _cut_after(marker: str, occurrence: int = 1) -> str:
+    at = -1
+    for _ in range(occurrence):
+        at = TEXT.index(marker, at + 1)
+    return TEXT[:at + len(marker)]
+
+
+# ── Malformed but complete ────────────────────────────────────
+
+def test_well_formed_json_is_untouched():
+    salvage = repair(f"Here you go:\n```json\n{TEXT}\n```\nEnjoy!")
+    assert salvage.data == PACKAGE
+    assert salvage.repairs == []
+    assert not salvage.truncated
+
+
+def test_trailing_and_missing_commas_and_python_literals():
+    salvage = repair('{"a": [1, 2,], "b": {"c": True "d": None,} "e": "x"}')
+    assert salvage.data == {"a": [1, 2], "b": {"c": True, "d": None}, "e": "x"}
+    assert set(salvage.repairs) == {"trailing_comma", "missing_comma", "literal"}
+
+
+def test_raw_control_characters_in_strings():
+    assert repair('{"screenplay": "line one\nline\ttwo", "x": [1 2]}').data == {
+        "screenplay": "line one\nline\ttwo", "x": [1, 2],
+    }
+
+
+def test_no_object_at_all():
+    with pytest.raises(ValueError):
+        repair("I cannot help with that.")
+
+
+# ── Truncated ─────────────────────────────────────────────────
+
+def test_truncated_inside_the_screenplay_is_unrecoverable():
+    with pytest.raises(ValueError):
+        repair(_cut_after('"INT. LIGHT'))
+
+
+def test_truncated_inside_a_string_drops_the_open_element():
+    salvage = repair(_cut_after('"track": "Ga'))
+    assert salvage.truncated
+    assert salvage.open_key == "sound_design"
+    assert salvage.data == {**PACKAGE, "sound_design": PACKAGE["sound_design"][:1]}
+
+
+def test_truncated_inside_a_number():
+    salvage = repair(_cut_after('"duration": 1'))
+    assert salvage.open_key == "shot_design"
+    assert salvage.data == {"screenplay": PACKAGE["screenplay"], "shot_design": PACKAGE["shot_design"][:1]}
+
+
+def test_a_number_at_the_very_end_is_not_trusted():
+    # "12" may be the start of "120": a literal touching the end of the text is dropped
+    salvage = repair('{"screenplay": "x", "count": 12')
+    assert salvage.data == {"screenplay": "x"}
+
+
+def test_truncated_inside_a_nested_object():
+    salvage = repair(_cut_after('"music": {', occurrence=2))
+    assert salvage.data["sound_design"] == PACKAGE["sound_design"][:1]
+
+
+def test_truncated_inside_a_nested_array():
+    salvage = repair(_cut_after('"tags": ["wide"'))
+    assert salvage.open_key == "shot_design"
+    assert salvage.data["shot_design"] == []
+
+
+def test_truncated_between_elements():
+    salvage = repair(TEXT[:TEXT.index('{"id": "scene-02"')])
+    assert salvage.data["shot_design"] == PACKAGE["shot_design"][:1]
+
+
+def test_truncated_after_a_whole_section():
+    salvage = repair(_cut_after('"sound_design": '))
+    assert salvage.data == {"screenplay": PACKAGE["screenplay"], "shot_design": PACKAGE["shot_design"]}
+    assert salvage.open_key is None
+
+
+def test_truncated_right_after_a_list_opens():
+    salvage = repair(_cut_after('"sound_design": ['))
+    assert salvage.data["sound_design"] == []
+    assert salvage.open_key == "sound_design"
+
+
+def test_every_truncation_keeps_only_whole_elements():
+    start = TEXT.index('"shot_design"')
+    for cut in range(start, len(TEXT) - 1):
+        data = repair(TEXT[:cut]).data
+        assert data["screenplay"] == PACKAGE["screenplay"]
+        for section in ("shot_design", "sound_design"):
+            scenes = data.get(section, [])
+            assert scenes == PACKAGE[section][:len(scenes)], (cut, section)
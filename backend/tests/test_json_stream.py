@@ -0,0 +1,86 @@
+"""
+Incremental package parser — the events must not depend on where the stream
+is cut into chunks: inside strings, escapes, surrogate pairs or numbers.
+"""
+import json
+
+import pytest
+
+from services.json_stream import PackageStreamParser
+
+PACKAGE = {
+    "title": "Night \"Shift\" {draft}",
+    "screenplay": 'INT. DINER - NIGHT\n\n\tMAYA: "Coffee?" \\ one sugar — café 🎬 [beat] {pause}\nFADE OUT.',
+    "shot_design": [
+        {"scene_id": 1, "shots": [{"shot": 1, "lens_mm": 35, "duration_s": 12.5, "note": "push in, \"slow\""}]},
+        {"scene_id": 2, "shots": [{"shot": 1, "lens_mm": 85, "duration_s": -1e-3, "screenplay": "nested key"}]},
+    ],
+    "sound_design": [
+        {"scene_id": 1, "music": {"track": "Low strings ♪", "bpm": 72}, "ambience": ["rain", "neon hum"]},
+    ],
+    "notes": ["{not an element}", 3.25],
+}
+# ensure_ascii escapes é, ♪ and the emoji (as a surrogate pair) to exercise \u handling
+TEXT = "```json\n" + json.dumps(PACKAGE, indent=1, ensure_ascii=True) + "\n```"
+
+
+def _run(chunks):
+    parser = PackageStreamParser()
+    screenplay, elements = "", {"shot_design": [], "sound_design": []}
+    for chunk in chunks:
+        for event, value in parser.feed(chunk):
+            if event == "screenplay":
+                screenplay += value
+            else:
+                elements[event].append(value)
+    return parser, screenplay, elements
+
+
+def _check(parser, screenplay, elements):
+    assert parser.done
+    assert screenplay == PACKAGE["screenplay"]
+    assert elements == {"shot_design": PACKAGE["shot_design"], "sound_design": PACKAGE["sound_design"]}
+    assert json.loads(parser.text[parser.text.index("{"):parser.pos]) == PACKAGE
+
+
+def test_whole_text_in_one_chunk():
+    _check(*_run([TEXT]))
+
+
+def test_one_character_at_a_time():
+    _check(*_run(list(TEXT)))
+
+
+def test_every_two_chunk_split():
+    for cut in range(1, len(TEXT)):
+        _check(*_run([TEXT[:cut], TEXT[cut:]]))
+
+
+@pytest.mark.parametrize("marker", ['\\"', "\\\\", "\\n", "\\t", "\\u00e9", "\\ud83c\\udfac", "12.5", "-0.001"])
+def test_splits_inside_escapes_and_numbers(marker):
+    at = TEXT.index(marker, TEXT.index('"screenplay"'))
+    for offset in range(1, len(marker)):
+        first, second, third = TEXT[:at + offset - 1], TEXT[at + offset - 1:at + offset], TEXT[at + offset:]
+        _check(*_run([first, second, third]))
+
+
+def test_screenplay_is_streamed_while_it_grows():
+    parser = PackageStreamParser()
+    head = TEXT[:TEXT.index("MAYA")]
+    assert parser.feed(head) == [("screenplay", "INT. DINER - NIGHT\n\n\t")]
+    assert parser.feed("MAY") == [("screenplay", "MAY")]
+
+
+def test_a_dangling_escape_is_held_back():
+    parser = PackageStreamParser()
+    head = TEXT[:TEXT.index("\\ud83c") + 4]  # cut inside the high surrogate of the emoji
+    streamed = "".join(value for _, value in parser.feed(head))
+    assert streamed == PACKAGE["screenplay"][:PACKAGE["screenplay"].index("🎬")]
+    rest = "".join(value for event, value in parser.feed(TEXT[len(head):]) if event == "screenplay")
+    assert streamed + rest == PACKAGE["screenplay"]
+
+
+def test_text_after_the_object_is_ignored():
+    parser, _, elements = _run([TEXT + '\n{"screenplay": "again", "shot_design": [{}]}'])
+    assert parser.done
+    assert len(elements["shot_design"]) == 2
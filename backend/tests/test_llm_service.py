@@ -0,0 +1,304 @@
+"""
+LLM service — what comes out of a provider's text before it is saved and
+cached. No provider is called: each test hands in the model's text and a
+stand-in for the follow-up request, or in pipeline mode a stand-in that
+answers the outline and every scene call.
+"""
+import json
+
+import pytest
+
+from models.generation import GenerationResult
+from services import llm_service
+from services.llm_service import (
+    OUTLINE_PROMPT, SCENE_ATTEMPTS, SCENE_HEADING, SECTION_IDS, _finish_package, _generate_pipelined, _generate_template,
+    _respace, _split_scenes,
+)
+
+STORY = "A lighthouse keeper finds a message in a bottle and follows it out to sea."
+PACKAGE = _generate_template(STORY)
+TEXT = json.dumps(PACKAGE)
+
+
+def _result(package: dict) -> GenerationResult:
+    return GenerationResult(project_id="p1", story_input=STORY, provider="test", **package)
+
+
+class Continuation:
+    """Stands in for the provider's follow-up request."""
+
+    def __init__(self, reply=None):
+        self.reply = reply
+        self.prompts = []
+
+    async def __call__(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if self.reply is None:
+            raise RuntimeError("provider down")
+        return json.dumps(self.reply)
+
+
+def _cut_inside_second_music() -> str:
+    sound = TEXT.index('"sound_design"')
+    music = TEXT.index('"music"', TEXT.index('"music"', sound) + 1)
+    return TEXT[:music + 30]
+
+
+# ── Salvaging a package ───────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_a_whole_package_needs_no_follow_up():
+    more = Continuation()
+    assert await _finish_package(TEXT, STORY, more, "test") == PACKAGE
+    assert more.prompts == []
+
+
+@pytest.mark.asyncio
+async def test_cut_off_scene_is_dropped_when_the_follow_up_fails():
+    more = Continuation()
+    package = await _finish_package(_cut_inside_second_music(), STORY, more, "test")
+    assert len(more.prompts) == 1
+    assert package["shot_design"] == PACKAGE["shot_design"]
+    assert package["sound_design"] == PACKAGE["sound_design"][:1]
+    _result(package)
+
+
+@pytest.mark.asyncio
+async def test_cut_off_scene_is_completed_by_the_follow_up():
+    more = Continuation({"sound_design": PACKAGE["sound_design"][1:]})
+    package = await _finish_package(_cut_inside_second_music(), STORY, more, "test")
+    assert package == PACKAGE
+    assert "omit these scenes, they are already done: scene-01." in more.prompts[0]
+
+
+@pytest.mark.asyncio
+async def test_invalid_scenes_are_dropped_and_asked_for_again():
+    broken = json.loads(TEXT)
+    del broken["shot_design"][1]["shots"]
+    broken["sound_design"][0]["music"] = "strings"
+    more = Continuation({
+        "shot_design": [PACKAGE["shot_design"][1]],
+        "sound_design": [{"scene_id": "scene-01", "music": None}],  # still invalid
+    })
+    package = await _finish_package(json.dumps(broken), STORY, more, "test")
+    assert package["shot_design"] == PACKAGE["shot_design"]
+    assert package["sound_design"] == PACKAGE["sound_design"][1:]
+    _result(package)
+
+
+@pytest.mark.asyncio
+async def test_no_valid_scene_in_a_section_fails_the_provider():
+    broken = json.loads(TEXT)
+    for scene in broken["sound_design"]:
+        del scene["dialogue"]
+    with pytest.raises(ValueError):
+        await _finish_package(json.dumps(broken), STORY, Continuation(), "test")
+
+
+@pytest.mark.asyncio
+async def test_no_screenplay_fails_the_provider():
+    with pytest.raises(ValueError):
+        await _finish_package(json.dumps({**PACKAGE, "screenplay": ""}), STORY, Continuation(), "test")
+
+
+# ── Pipeline mode ─────────────────────────────────────────────
+
+OUTLINE = {
+    "screenplay": PACKAGE["screenplay"],
+    "scenes": [
+        {"id": shots["id"], "scene_title": shots["scene_title"], "heading": "INT. LIGHTHOUSE",
+         "time_of_day": sound["time_of_day"]}
+        for shots, sound in zip(PACKAGE["shot_design"], PACKAGE["sound_design"])
+    ],
+}
+
+
+def _design(index: int) -> dict:
+    return {"shot_design": PACKAGE["shot_design"][index], "sound_design": PACKAGE["sound_design"][index]}
+
+
+class Provider:
+    """Stands in for a provider's text call: answers the outline, then each scene from its queue of replies."""
+
+    def __init__(self, scenes: dict):
+        self.scenes = {scene_id: list(replies) for scene_id, replies in scenes.items()}
+        self.calls = {scene_id: 0 for scene_id in scenes}
+
+    async def __call__(self, prompt: str) -> str:
+        if prompt.startswith(OUTLINE_PROMPT):
+            return json.dumps(OUTLINE)
+        scene_id = prompt.rsplit("Scene: ", 1)[1].split(" ", 1)[0]
+        self.calls[scene_id] += 1
+        reply = self.scenes[scene_id].pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply if isinstance(reply, str) else json.dumps(reply)
+
+
+def _without(design: dict, section: str, field: str) -> dict:
+    broken = json.loads(json.dumps(design))
+    del broken[section][field]
+    return broken
+
+
+@pytest.mark.asyncio
+async def test_pipeline_merges_the_scene_designs():
+    provider = Provider({"scene-01": [_design(0)], "scene-02": [_design(1)]})
+    package = await _generate_pipelined(STORY, provider, "test")
+    assert package == {key: PACKAGE[key] for key in ("screenplay", "shot_design", "sound_design")}
+    _result(package)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_labels_scenes_from_the_outline():
+    design = json.loads(json.dumps(_design(1)))
+    design["shot_design"]["id"] = "scene-99"
+    del design["sound_design"]["scene_id"]
+    provider = Provider({"scene-01": [_design(0)], "scene-02": [design]})
+    package = await _generate_pipelined(STORY, provider, "test")
+    assert [s["id"] for s in package["shot_design"]] == ["scene-01", "scene-02"]
+    assert [s["scene_id"] for s in package["sound_design"]] == ["scene-01", "scene-02"]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_asks_again_for_an_invalid_scene_design():
+    provider = Provider({
+        "scene-01": [_design(0)],
+        "scene-02": [_without(_design(1), "sound_design", "music"), _design(1)],
+    })
+    package = await _generate_pipelined(STORY, provider, "test")
+    assert provider.calls == {"scene-01": 1, "scene-02": 2}
+    assert package["sound_design"] == PACKAGE["sound_design"]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_leaves_out_a_scene_that_stays_invalid():
+    provider = Provider({
+        "scene-01": [_design(0)],
+        "scene-02": [_without(_design(1), "shot_design", "shots"), "not json at all"],
+    })
+    package = await _generate_pipelined(STORY, provider, "test")
+    assert provider.calls["scene-02"] == SCENE_ATTEMPTS
+    assert package["shot_design"] == PACKAGE["shot_design"][:1]
+    assert package["sound_design"] == PACKAGE["sound_design"][:1]
+    _result(package)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_does_not_retry_provider_errors():
+    provider = Provider({"scene-01": [_design(0)], "scene-02": [RuntimeError("provider down"), _design(1)]})
+    package = await _generate_pipelined(STORY, provider, "test")
+    assert provider.calls["scene-02"] == 1
+    assert len(package["shot_design"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_pipeline_fails_when_no_scene_design_is_valid():
+    invalid = _without(_design(0), "sound_design", "dialogue")
+    provider = Provider({"scene-01": [invalid] * SCENE_ATTEMPTS, "scene-02": [invalid] * SCENE_ATTEMPTS})
+    with pytest.raises(ValueError):
+        await _generate_pipelined(STORY, provider, "test")
+
+
+# ── Scene-by-scene editing ────────────────────────────────────
+
+SCRIPTS = [
+    "",
+    "\n\n",
+    "FADE IN:\n\nThe sea at dawn.\n",
+    "INT. LIGHTHOUSE - NIGHT\nThe lamp turns.",
+    "TITLE PAGE\n\n\nFADE IN:\n\nINT. LIGHTHOUSE - NIGHT\n\nThe lamp turns.\n\n  EXT. SEA - DAY\n\tWaves.\n\n\n",
+    "INT. LIGHTHOUSE - NIGHT\r\nThe lamp turns.\r\n\r\nEXT. SEA - DAY\r\nWaves.\r\n",
+    "INT. A - DAY\nEXT. B - DAY\nI/E CAR - NIGHT\nINT./EXT. DOOR - DAY\n\t EXT. C - DAY   \n",
+    "The INT. of the boat. EXT. is not a heading mid-line.\nINTERIOR shots only.\n",
+]
+
+
+@pytest.mark.parametrize("script", SCRIPTS)
+def test_scene_pieces_join_back_into_the_script(script):
+    pieces = _split_scenes(script)
+    assert "".join(pieces) == script
+    assert all(SCENE_HEADING.match(piece) for piece in pieces[1:])
+
+
+def test_scenes_are_cut_before_each_heading():
+    assert _split_scenes(SCRIPTS[4]) == [
+        "TITLE PAGE\n\n\nFADE IN:\n\n",
+        "INT. LIGHTHOUSE - NIGHT\n\nThe lamp turns.\n\n",
+        "  EXT. SEA - DAY\n\tWaves.\n\n\n",
+    ]
+    assert len(_split_scenes(SCRIPTS[6])) == 5
+    assert _split_scenes(SCRIPTS[7]) == [SCRIPTS[7]]
+
+
+@pytest.mark.parametrize("script", SCRIPTS)
+def test_respace_keeps_the_original_whitespace(script):
+    for piece in _split_scenes(script):
+        assert _respace(piece, piece) == piece
+        assert _respace(piece, f"\n \t{piece.strip()}\n\n\n") == piece
+
+
+def test_respace_replaces_only_the_text():
+    assert _respace("  EXT. SEA - DAY\n\tWaves.\n\n", "EXT. SEA - DAY\nBig waves.\n") == "  EXT. SEA - DAY\nBig waves.\n\n"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("script", [script for script in SCRIPTS if len(_split_scenes(script)) > 1])
+async def test_an_unchanged_scene_by_scene_edit_returns_the_script_exactly(script, monkeypatch):
+    async def echo(prompt, piece, *args):
+        return f"\n{piece.strip()}  \n"  # models rarely keep a piece's exact surrounding whitespace
+
+    monkeypatch.setattr(llm_service, "_edit_piece", echo)
+    assert await llm_service.edit_script(script, "rewrite") == script
+
+
+# ── Streaming ─────────────────────────────────────────────────
+
+async def _stream(monkeypatch, text: str, more: Continuation) -> tuple:
+    """Stream `text` as Gemini's reply; return the client's view of the scenes and the final result."""
+    async def gemini(story):
+        for i in range(0, len(text), 50):
+            yield text[i:i + 50]
+
+    monkeypatch.setattr(llm_service.settings, "gemini_api_key", "key")
+    monkeypatch.setattr(llm_service, "_stream_gemini", gemini)
+    monkeypatch.setattr(llm_service, "_gemini_text", more)
+    shown = {section: [] for section in SECTION_IDS}
+    async for event, value in llm_service.stream_production(STORY):
+        if event == "retract":
+            id_field = SECTION_IDS[value["section"]]
+            shown[value["section"]] = [s for s in shown[value["section"]] if s[id_field] != value["id"]]
+        elif event in shown:
+            shown[event].append(value)
+        elif event == "result":
+            result = value[0]
+    return shown, result
+
+
+@pytest.mark.asyncio
+async def test_an_invalid_scene_is_never_streamed(monkeypatch):
+    broken = json.loads(TEXT)
+    broken["sound_design"][1]["music"] = "strings"
+    more = Continuation({"sound_design": PACKAGE["sound_design"][1:]})
+    shown, result = await _stream(monkeypatch, json.dumps(broken), more)
+    assert shown == {section: PACKAGE[section] for section in SECTION_IDS}
+    assert result == PACKAGE
+
+
+@pytest.mark.asyncio
+async def test_an_invalid_scene_that_is_not_replaced_is_held_back(monkeypatch):
+    broken = json.loads(TEXT)
+    del broken["shot_design"][0]["shots"]
+    shown, result = await _stream(monkeypatch, json.dumps(broken), Continuation())
+    assert shown["shot_design"] == result["shot_design"] == PACKAGE["shot_design"][1:]
+
+
+@pytest.mark.asyncio
+async def test_a_streamed_scene_the_continuation_replaces_is_retracted(monkeypatch):
+    broken = json.loads(TEXT)
+    broken["sound_design"][1]["music"] = "strings"
+    redone = {**PACKAGE["sound_design"][0], "mixing_notes": "Redone."}
+    more = Continuation({"sound_design": [redone, PACKAGE["sound_design"][1]]})
+    shown, result = await _stream(monkeypatch, json.dumps(broken), more)
+    assert result["sound_design"] == [redone, PACKAGE["sound_design"][1]]
+    assert shown == {section: result[section] for section in SECTION_IDS}
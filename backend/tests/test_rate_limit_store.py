@@ -0,0 +1,303 @@
+"""
+Rate-limit stores — the same sliding-window behaviour from the in-process,
+shared-memory and Redis backends. Redis is a small in-process RESP server
+that runs the hit script's logic in Python, so the client, key layout and
+argument encoding are exercised without a real server.
+"""
+import asyncio
+import fcntl
+import math
+import multiprocessing
+import os
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middleware.rate_limit import RateLimitMiddleware
+from services import rate_limit_store
+from services.rate_limit_store import (
+    MemoryRateLimitStore, RedisRateLimitStore, SharedMemoryRateLimitStore, _HIT_SCRIPT, _encode, _read_reply,
+)
+
+WINDOW = 60
+T0 = 6000.0  # the start of a window
+
+
+class FakeRedis:
+    """Just enough Redis: AUTH, SELECT and EVAL of _HIT_SCRIPT."""
+
+    def __init__(self, password=None, stall=False):
+        self.password = password
+        self.stall = stall          # accept commands but never answer
+        self.delay = 0.0            # before the next EVAL reply
+        self.data = {}
+        self.commands = []
+        self.server = None
+        self.writers = set()
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{port}/0"
+
+    async def stop(self) -> None:
+        for writer in self.writers:
+            writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            while True:
+                args = [a.decode() if isinstance(a, bytes) else a for a in await _read_reply(reader)]
+                self.commands.append(args[0])
+                if self.stall:
+                    continue
+                writer.write(await self._reply(args))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def _reply(self, args) -> bytes:
+        name = args[0]
+        if name == "AUTH":
+            return b"+OK\r\n" if args[1] == self.password else b"-WRONGPASS invalid password\r\n"
+        if name == "SELECT":
+            return b"+OK\r\n"
+        assert name == "EVAL" and args[1] == _HIT_SCRIPT
+        if self.delay:
+            delay, self.delay = self.delay, 0.0
+            await asyncio.sleep(delay)
+        numkeys = int(args[2])
+        keys, argv = args[3:3 + numkeys], args[3 + numkeys:]
+        weight, used, allowed = float(argv[0]), [], 1
+        for i in range(numkeys // 2):
+            cur, prev = self.data.get(keys[2 * i], 0), self.data.get(keys[2 * i + 1], 0)
+            used.append(math.floor(prev * weight + cur))
+            if used[i] + int(argv[2 * i + 2]) > int(argv[2 * i + 3]):
+                allowed = 0
+        if allowed:
+            for i in range(numkeys // 2):
+                cost = int(argv[2 * i + 2])
+                self.data[keys[2 * i]] = self.data.get(keys[2 * i], 0) + cost
+                used[i] += cost
+        return b"*%d\r\n" % (len(used) + 1) + b"".join(b":%d\r\n" % n for n in [allowed, *used])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [T0]
+    monkeypatch.setattr(rate_limit_store, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest_asyncio.fixture(params=["memory", "shm", "redis"])
+async def store(request, tmp_path, monkeypatch):
+    if request.param == "memory":
+        monkeypatch.setattr(rate_limit_store, "_windows", {})
+        yield MemoryRateLimitStore()
+    elif request.param == "shm":
+        store = SharedMemoryRateLimitStore(str(tmp_path / "rl"), 1024)
+        yield store
+        await store.close()
+    else:
+        redis = FakeRedis()
+        store = RedisRateLimitStore(await redis.start())
+        yield store
+        await store.close()
+        await redis.stop()
+
+
+# ── Every backend ─────────────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_allows_up_to_the_limit(store, clock):
+    results = [await store.hit([("requests:a", 1, 3)], WINDOW) for _ in range(4)]
+    assert results == [(True, [1]), (True, [2]), (True, [3]), (False, [3])]
+
+
+@pytest.mark.asyncio
+async def test_cost_weighting(store, clock):
+    for used in (3, 6, 9):
+        assert await store.hit([("llm:a", 3, 10)], WINDOW) == (True, [used])
+    assert await store.hit([("llm:a", 3, 10)], WINDOW) == (False, [9])
+    assert await store.hit([("llm:a", 1, 10)], WINDOW) == (True, [10])
+
+
+@pytest.mark.asyncio
+async def test_charges_are_all_or_nothing(store, clock):
+    assert await store.hit([("requests:a", 1, 10), ("llm:a", 8, 10)], WINDOW) == (True, [1, 8])
+    assert await store.hit([("requests:a", 1, 10), ("llm:a", 8, 10)], WINDOW) == (False, [1, 8])
+    assert await store.hit([("requests:a", 1, 10)], WINDOW) == (True, [2])
+
+
+@pytest.mark.asyncio
+async def test_clients_are_counted_apart(store, clock):
+    assert await store.hit([("requests:a", 2, 2)], WINDOW) == (True, [2])
+    assert await store.hit([("requests:b", 2, 2)], WINDOW) == (True, [2])
+
+
+@pytest.mark.asyncio
+async def test_previous_window_weighs_by_its_overlap(store, clock):
+    assert await store.hit([("requests:a", 10, 10)], WINDOW) == (True, [10])
+    clock[0] = T0 + WINDOW - 0.001
+    assert await store.hit([("requests:a", 1, 10)], WINDOW) == (False, [10])
+
+    clock[0] = T0 + WINDOW + WINDOW / 2  # half of the full window still overlaps
+    assert await store.hit([("requests:a", 1, 10)], WINDOW) == (True, [6])
+    clock[0] = T0 + WINDOW + WINDOW * 0.9
+    assert await store.hit([("requests:a", 1, 10)], WINDOW) == (True, [3])
+
+
+@pytest.mark.asyncio
+async def test_counts_expire_after_two_windows(store, clock):
+    assert await store.hit([("requests:a", 10, 10)], WINDOW) == (True, [10])
+    clock[0] = T0 + 2 * WINDOW
+    assert await store.hit([("requests:a", 1, 10)], WINDOW) == (True, [1])
+
+
+# ── Shared memory ─────────────────────────────────────────────
+
+def _hammer(path: str, hits: int) -> None:
+    store = SharedMemoryRateLimitStore(path, 64)
+    for _ in range(hits):
+        asyncio.run(store.hit([("requests:shared", 1, 1_000_000)], WINDOW))
+
+
+@pytest.mark.asyncio
+async def test_shm_counts_every_hit_across_processes(tmp_path, clock):
+    path = str(tmp_path / "rl")
+    ctx = multiprocessing.get_context("fork")  # children inherit the frozen clock
+    workers = [ctx.Process(target=_hammer, args=(path, 200)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+
+    store = SharedMemoryRateLimitStore(path, 64)
+    assert await store.hit([("requests:shared", 1, 1_000_000)], WINDOW) == (True, [801])
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_shm_fails_open_when_the_table_is_full(tmp_path, clock):
+    store = SharedMemoryRateLimitStore(str(tmp_path / "rl"), 4)
+    for key in "abcd":
+        assert await store.hit([(key, 1, 1)], WINDOW) == (True, [1])
+    assert await store.hit([("e", 5, 1)], WINDOW) == (True, [0])
+    # Stale slots are reclaimed once their windows have passed
+    clock[0] = T0 + 2 * WINDOW
+    assert await store.hit([("e", 1, 1)], WINDOW) == (True, [1])
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_shm_waits_for_the_lock_without_blocking_the_loop(tmp_path, clock):
+    path = str(tmp_path / "rl")
+    store = SharedMemoryRateLimitStore(path, 64)
+    other = os.open(path, os.O_RDWR)  # another worker's open file, so its flock conflicts
+    fcntl.flock(other, fcntl.LOCK_EX)
+    try:
+        hit = asyncio.ensure_future(store.hit([("a", 1, 10)], WINDOW))
+        await asyncio.sleep(0.02)  # the loop keeps running while the hit waits
+        assert not hit.done()
+    finally:
+        fcntl.flock(other, fcntl.LOCK_UN)
+        os.close(other)
+    assert await asyncio.wait_for(hit, 1) == (True, [1])
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_shm_gives_up_on_a_lock_that_is_never_released(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(rate_limit_store, "_LOCK_ATTEMPTS", 5)
+    path = str(tmp_path / "rl")
+    store = SharedMemoryRateLimitStore(path, 64)
+    other = os.open(path, os.O_RDWR)
+    fcntl.flock(other, fcntl.LOCK_EX)
+    try:
+        with pytest.raises(TimeoutError):
+            await store.hit([("a", 1, 10)], WINDOW)
+    finally:
+        os.close(other)
+    await store.close()
+
+
+# ── Redis ─────────────────────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_redis_cancelled_command_does_not_leak_its_reply(clock):
+    redis = FakeRedis()
+    store = RedisRateLimitStore(await redis.start())
+    await store.hit([("warm", 1, 10)], WINDOW)
+
+    redis.delay = 0.2
+    first = asyncio.ensure_future(store.hit([("a", 1, 10)], WINDOW))
+    await asyncio.sleep(0.05)
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert await store.hit([("b", 2, 10)], WINDOW) == (True, [2])
+    await store.close()
+    await redis.stop()
+
+
+@pytest.mark.asyncio
+async def test_redis_times_out_when_blackholed(clock):
+    redis = FakeRedis(stall=True)
+    store = RedisRateLimitStore(await redis.start(), timeout=0.1)
+    with pytest.raises(asyncio.TimeoutError):
+        await store.hit([("a", 1, 10)], WINDOW)
+    assert store._writer is None
+    await redis.stop()
+
+
+@pytest.mark.asyncio
+async def test_redis_auth_error_drops_the_connection(clock):
+    redis = FakeRedis(password="secret")
+    url = await redis.start()
+    store = RedisRateLimitStore(url.replace("secret", "wrong"))
+    with pytest.raises(RuntimeError, match="WRONGPASS"):
+        await store.hit([("a", 1, 10)], WINDOW)
+    assert store._writer is None
+    assert "EVAL" not in redis.commands
+    await redis.stop()
+
+
+def test_encode_round_trips():
+    async def decode(data: bytes):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        return await _read_reply(reader)
+
+    assert asyncio.run(decode(_encode(("EVAL", "return 1", "0")))) == [b"EVAL", b"return 1", b"0"]
+
+
+# ── Middleware ────────────────────────────────────────────────
+
+def _app(store) -> TestClient:
+    app = Starlette(routes=[Route("/", lambda request: PlainTextResponse("ok"))])
+    app.add_middleware(RateLimitMiddleware, limit=2, store=store)
+    return TestClient(app)
+
+
+def test_rejects_over_the_limit(monkeypatch):
+    monkeypatch.setattr(rate_limit_store, "_windows", {})
+    client = _app(MemoryRateLimitStore())
+    assert [client.get("/").status_code for _ in range(3)] == [200, 200, 429]
+
+
+def test_store_outage_fails_open():
+    # Nothing listens on port 1
+    client = _app(RedisRateLimitStore("redis://127.0.0.1:1/0", timeout=0.1))
+    responses = [client.get("/") for _ in range(5)]
+    assert [r.status_code for r in responses] == [200] * 5
+    assert "X-RateLimit-Remaining" not in responses[0].headers
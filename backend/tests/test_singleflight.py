@@ -0,0 +1,111 @@
+"""Single-flight — concurrent callers with one key share a single call."""
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+class Work:
+    """A call that blocks until released, counting how often it starts."""
+
+    def __init__(self, result="result", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flights, work = SingleFlight("test"), Work()
+    callers = [asyncio.ensure_future(flights.do("k", work)) for _ in range(5)]
+    await _settle()
+    work.release.set()
+    assert await asyncio.gather(*callers) == ["result"] * 5
+    assert work.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_different_keys_do_not_share():
+    flights, work = SingleFlight("test"), Work()
+    callers = [asyncio.ensure_future(flights.do(key, work)) for key in ("a", "b")]
+    await _settle()
+    work.release.set()
+    await asyncio.gather(*callers)
+    assert work.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_a_cancelled_waiter_does_not_cancel_the_others():
+    flights, work = SingleFlight("test"), Work()
+    leaving = asyncio.ensure_future(flights.do("k", work))
+    staying = [asyncio.ensure_future(flights.do("k", work)) for _ in range(2)]
+    await _settle()
+
+    leaving.cancel()
+    await _settle()
+    assert leaving.cancelled()
+    assert not work.cancelled
+
+    work.release.set()
+    assert await asyncio.gather(*staying) == ["result"] * 2
+    assert work.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_the_call_is_cancelled_once_every_waiter_has_gone():
+    flights, work = SingleFlight("test"), Work()
+    callers = [asyncio.ensure_future(flights.do("k", work)) for _ in range(2)]
+    await _settle()
+    for caller in callers:
+        caller.cancel()
+    await _settle()
+    assert work.cancelled
+
+    # The key is free again: a new caller starts a fresh call
+    retry = Work("second")
+    caller = asyncio.ensure_future(flights.do("k", retry))
+    await _settle()
+    retry.release.set()
+    assert await caller == "second"
+
+
+@pytest.mark.asyncio
+async def test_an_error_reaches_every_waiter():
+    flights, work = SingleFlight("test"), Work(error=ValueError("provider down"))
+    callers = [asyncio.ensure_future(flights.do("k", work)) for _ in range(3)]
+    await _settle()
+    work.release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert [type(r) for r in results] == [ValueError] * 3
+    assert all(str(r) == "provider down" for r in results)
+    assert work.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_the_key_is_free_once_the_call_finishes():
+    flights = SingleFlight("test")
+    first, second = Work("first"), Work("second")
+    first.release.set()
+    second.release.set()
+    assert await flights.do("k", first) == "first"
+    assert await flights.do("k", second) == "second"
+    assert (first.calls, second.calls) == (1, 1)
@@ -0,0 +1,34 @@
+"""W3C traceparent parsing — a malformed header starts a new trace instead of failing the request."""
+import pytest
+
+from services.tracing import parse_traceparent
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.mark.parametrize("flags, sampled", [("01", True), ("00", False), ("03", True)])
+def test_parses_a_valid_header(flags, sampled):
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-{flags}") == (TRACE_ID, PARENT_ID, sampled)
+
+
+def test_future_versions_may_append_fields():
+    assert parse_traceparent(f"01-{TRACE_ID}-{PARENT_ID}-01-extra") == (TRACE_ID, PARENT_ID, True)
+
+
+@pytest.mark.parametrize("header", [
+    "",
+    "garbage",
+    f"00-{TRACE_ID}-{PARENT_ID}-zz",
+    f"00-{TRACE_ID}-{PARENT_ID}-1",
+    f"00-{'x' * 32}-{PARENT_ID}-01",
+    f"00-{TRACE_ID}-{'g' * 16}-01",
+    f"00-{TRACE_ID.upper()}-{PARENT_ID}-01",
+    f"00-{'0' * 32}-{PARENT_ID}-01",
+    f"00-{TRACE_ID}-{'0' * 16}-01",
+    f"00-{TRACE_ID}-{PARENT_ID}-01-extra",
+    f"ff-{TRACE_ID}-{PARENT_ID}-01",
+    f"0x-{TRACE_ID}-{PARENT_ID}-01",
+])
+def test_rejects_a_malformed_header(header):
+    assert parse_traceparent(header) is None